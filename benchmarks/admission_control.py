@@ -0,0 +1,55 @@
+"""
+Ограничение нагрузки (AdmissionMiddleware): стоимость отказа.
+
+Запуск из корня навыка:
+    python -m benchmarks.admission_control [-n 1000]
+
+Медиана времени обработки новой сессии: принятой и отклонённой при достигнутом пределе сессий.
+Проверки приоритета начатых сессий и предела сессий - в tests/test_admission.py.
+"""
+import argparse
+import asyncio
+import time
+import statistics
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher, admission
+from config import Config, AdmissionConfig
+from benchmarks.common import load_resources, make_update
+
+SKILL_ID = "benchmark"
+
+def set_limits(**limits):
+    config = Config()
+    Config.publish(config.model_copy(update={ "admission": AdmissionConfig(**limits) }))
+
+async def feed(skill: Skill, session_id: str, message_id: int, **update) -> tuple[str, float]:
+    start = time.perf_counter()
+    result = await dispatcher.feed_webhook_update(skill, make_update(session_id, message_id, user_id=session_id, **update))
+    return result.response.text, (time.perf_counter() - start) * 1e6
+
+def measure_cost(skill: Skill, number: int):
+    dispatcher.fsm.storage.storage.clear()
+    set_limits(max_sessions=1)
+
+    async def run(prefix: str) -> list[float]:
+        return [(await feed(skill, f"{prefix}-{index}", 0, new=True))[1] for index in range(number)]
+
+    admission.sweep(dispatcher.fsm.storage)
+    shed = asyncio.run(run("shed"))
+    set_limits()
+    admission.sweep(dispatcher.fsm.storage)
+    served = asyncio.run(run("served"))
+    print(f"новая сессия: принята {statistics.median(served):8.1f} us, отклонена {statistics.median(shed):8.1f} us (медиана)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=1000, help="Количество принятых и отклонённых запросов")
+    args = parser.parse_args()
+
+    config = load_resources()
+    skill = Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+
+    measure_cost(skill, args.number)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Холодный запуск: время импорта точки входа в новом процессе интерпретатора.
+
+Запуск из корня навыка:
+    python -m benchmarks.cold_start [-n 10] [--module yandex_function] [--top 15]
+
+Каждый прогон - отдельный процесс, который импортирует модуль (по умолчанию yandex_function,
+точку входа облачной функции) и сообщает время импорта и полное время процесса. Отдельный
+прогон под python -X importtime даёт профиль импорта: модули с наибольшим собственным временем
+и модули навыка с наибольшим временем вместе с зависимостями. Импортированные модули, которых
+не должно быть у точки входа (EXCLUDED), печатаются отдельно; проверка - в tests/test_cold_start.py.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from abspath import abs_path
+
+# стек генерации звуков и pandas нужны только при сборке звуков
+BUILD_TIME = ("chordgen", "numpy", "pydub", "fluidsynth", "pandas")
+# модули, которые не должна импортировать точка входа: сервер наблюдает за файлами, облачная функция - нет
+EXCLUDED = { "yandex_function": BUILD_TIME + ("watchdog", "filewatcher") }
+
+def run(module: str, *options: str) -> tuple[str, str, float]:
+    """Импортирует module в новом процессе; возвращает stdout, stderr и полное время процесса."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *options, "-c", code], cwd=abs_path("."), env=os.environ,
+                            capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr, time.perf_counter() - start
+
+def import_profile(module: str) -> list[tuple[str, int, int]]:
+    """Профиль импорта: (модуль, собственное время, время с зависимостями) в мкс."""
+    _, stderr, _ = run(module, "-X", "importtime")
+    profile = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        profile.append((name.strip(), int(own), int(cumulative)))
+    return profile
+
+def project_modules() -> set[str]:
+    """Имена модулей навыка верхнего уровня (файлы и пакеты в корне)."""
+    root = abs_path(".")
+    return { os.path.splitext(name)[0] for name in os.listdir(root)
+             if name.endswith(".py") or os.path.isfile(os.path.join(root, name, "__init__.py")) }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Количество запусков")
+    parser.add_argument("--module", default="yandex_function", help="Импортируемый модуль")
+    parser.add_argument("--top", type=int, default=15, help="Количество модулей в профиле импорта")
+    args = parser.parse_args()
+
+    profile = import_profile(args.module)
+    imported = { name for name, *_ in profile }
+    excluded = EXCLUDED.get(args.module, BUILD_TIME)
+    unexpected = sorted(name for name in imported if name.split(".")[0] in excluded)
+
+    print(f"профиль импорта {args.module}: {len(profile)} модулей")
+    if unexpected:
+        print(f"лишние модули: {', '.join(unexpected)}")
+    print("собственное время:")
+    for name, own, cumulative in sorted(profile, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<50} {own / 1000:8.1f} ms   с зависимостями {cumulative / 1000:8.1f} ms")
+
+    project = project_modules()
+    print("модули навыка с зависимостями:")
+    own_modules = [item for item in profile if item[0].split(".")[0] in project]
+    for name, own, cumulative in sorted(own_modules, key=lambda item: item[2], reverse=True)[:args.top]:
+        print(f"  {name:<50} {cumulative / 1000:8.1f} ms   собственное {own / 1000:8.1f} ms")
+
+    imports, processes = [], []
+    for _ in range(args.runs):
+        stdout, _, process = run(args.module)
+        imports.append(float(stdout.splitlines()[-1]) * 1000)
+        processes.append(process * 1000)
+
+    print(f"импорт {args.module:<34} median {statistics.median(imports):8.1f} ms   min {min(imports):8.1f} ms")
+    print(f"{'процесс целиком':<41} median {statistics.median(processes):8.1f} ms   min {min(processes):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import time
+import statistics
+from collections.abc import Callable
+from config import Config
+from voicemenu import VoiceMenu
+from engine.maindb import MainDB
+from abspath import abs_path
+
+def load_resources():
+    """Загружает конфигурацию, голосовое меню и базу трезвучий так же, как сервер при запуске."""
+    config = Config.load_default()
+    VoiceMenu.load(abs_path(config.data.voice_menu))
+    MainDB.load()
+    return config
+
+def measure(func: Callable[[], object], repeat: int = 5, number: int = 1000) -> list[float]:
+    """Возвращает время одного вызова func (в микросекундах) для каждого из repeat прогонов."""
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        results.append((time.perf_counter() - start) / number * 1e6)
+    return results
+
+def report(name: str, timings: list[float]):
+    print(f"{name:<40} min {min(timings):10.2f} us   median {statistics.median(timings):10.2f} us")
+
+def make_update(session_id: str, message_id: int,
+                new: bool = False,
+                command: str = "",
+                intents: dict = None,
+                entities: list = None,
+                payload: dict = None,
+                user_id: str = "benchmark-user",
+                skill_id: str = "benchmark") -> dict:
+    """Собирает JSON-запрос Алисы: текстовое сообщение или, если задан payload, нажатие кнопки."""
+    nlu = { "tokens": command.split(), "entities": entities or [], "intents": intents or {} }
+    request = { "type": "ButtonPressed", "payload": payload, "nlu": nlu } if payload is not None \
+        else { "type": "SimpleUtterance", "command": command, "original_utterance": command,
+               "nlu": nlu, "markup": { "dangerous_context": False } }
+
+    return {
+        "meta": { "locale": "ru-RU", "timezone": "UTC", "client_id": "benchmark", "interfaces": { "screen": {} } },
+        "session": { "message_id": message_id, "session_id": session_id, "skill_id": skill_id, "new": new,
+                     "application": { "application_id": user_id }, "user": { "user_id": user_id } },
+        "request": request,
+        "version": "1.0"
+    }
+
+def number_entity(value: int) -> list:
+    return [{ "type": "YANDEX.NUMBER", "tokens": { "start": 0, "end": 1 }, "value": value }]
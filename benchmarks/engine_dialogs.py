@@ -0,0 +1,200 @@
+"""
+Движок без HTTP и диспетчера: полные диалоги AliceEngine по сценарию.
+
+Запуск из корня навыка:
+    python -m benchmarks.engine_dialogs [-r 30] [--json result.json] [--compare baseline.json]
+
+Сценарий проходит все режимы: начало сессии, меню, демонстрация, каждый уровень тренировки
+и полный экзамен. Реплики пользователя - объекты Message и TextButton, собранные из запросов
+Алисы так же, как их строит aliceio: выбор режима голосом (menu_select) и кнопками, ответы
+числом, кнопками и повторы. Как и в обработчиках, за каждым вызовом движка следует
+create_response.
+
+Случайные выборки зафиксированы (seed сессии, ход начинается с begin_turn и завершается end_turn, как в обработчиках), поэтому
+каждый прогон повторяет один и тот же диалог (проверяется в tests/test_engine_dialogs.py). Для каждого метода - get_reply, process_user_reply,
+process_button_pressed, process_back_action, create_response - печатается медиана по прогонам
+медианного времени вызова и минимум. Отдельный прогон под tracemalloc даёт память на ход
+(вызов движка и create_response): пиковый объём выделенной памяти и количество блоков,
+оставшихся после хода. С --json итог сохраняется, с --compare печатается изменение
+относительно сохранённого итога (для времени - по минимуму, он меньше зависит от фоновой нагрузки).
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from aliceio.types import Update
+from engine.alice.alice_engine import AliceEngine
+from benchmarks.common import load_resources, make_update, number_entity
+from myconstants import *
+
+SKILL_ID = "benchmark"
+SEED = 1
+ANSWERS = 8 # ответов на уровнях без завершения (демонстрация, тренировка)
+
+class Dialog:
+    """Собирает Message и TextButton с последовательными message_id одной сессии."""
+    def __init__(self):
+        self.__message_id = 0
+
+    def __update(self, **fields) -> Update:
+        update = Update.model_validate(make_update("benchmark-session", self.__message_id, skill_id=SKILL_ID, **fields))
+        self.__message_id += 1
+        return update
+
+    def say(self, command: str, intents: dict = None, entities: list = None):
+        return self.__update(command=command, intents=intents, entities=entities).message
+
+    def number(self, value: int):
+        return self.say(str(value), entities=number_entity(value))
+
+    def press(self, **payload):
+        return self.__update(payload=payload).button_pressed
+
+
+def script(engine: AliceEngine, rnd: random.Random) -> Iterator[tuple[str, Callable[[], tuple[str, str]]]]:
+    """Ходы диалога: (метод движка, вызов). Ходы строятся по мере прохождения, по состоянию движка."""
+    dialog = Dialog()
+
+    def answers(values: tuple[int, ...], count: int, first: int = 0):
+        for index in range(first, first + count):
+            value = rnd.choice(values)
+            match index % 4:
+                case 0 | 2:
+                    yield "process_user_reply", lambda message=dialog.number(value): engine.process_user_reply(message)
+                case 1:
+                    yield "process_button_pressed", lambda button=dialog.press(value=value): engine.process_button_pressed(button)
+                case 3:
+                    yield "get_reply", engine.get_reply # повтор
+
+    yield "get_reply", engine.get_reply
+
+    # меню голосом и демонстрация
+    yield "process_user_reply", lambda message=dialog.say("демонстрация"): engine.process_user_reply(message, "демонстрация")
+    yield from answers((1, 2), ANSWERS)
+    yield "process_back_action", engine.process_back_action
+
+    # тренировка: меню уровней кнопкой, уровни - голосом
+    for level, values in ((LevelId.MISSED_NOTE, (1, 2, 3)), (LevelId.PRIMA_LOCATION, (0, 1, 2)), (LevelId.CADENCE, (1, 2, 3))):
+        yield "process_button_pressed", lambda button=dialog.press(set_mode=GameMode.TRAIN_MENU): engine.process_button_pressed(button)
+        yield "process_user_reply", lambda message=dialog.number(level): engine.process_user_reply(message)
+        yield from answers(values, ANSWERS)
+        yield "process_back_action", engine.process_back_action
+        yield "process_back_action", engine.process_back_action
+
+    # полный экзамен
+    yield "process_user_reply", lambda message=dialog.say("экзамен"): engine.process_user_reply(message, "экзамен")
+    index = 0
+    while engine.mode == GameMode.EXAM:
+        yield from answers((1, 2, 3), 1, index)
+        index += 1
+
+
+def play(on_turn: Callable[[str, Callable, Callable], None]):
+    """Проходит сценарий; on_turn(метод, вызов движка, create_response) выполняет ход."""
+    engine = AliceEngine(SKILL_ID, seed=SEED)
+    engine.mode = GameMode.INIT
+    reply = None
+
+    for name, call in script(engine, random.Random(SEED)):
+        def turn(call=call):
+            nonlocal reply
+            engine.begin_turn()
+            reply = call()
+            engine.end_turn()
+        on_turn(name, turn, lambda: engine.create_response(*reply))
+
+    assert engine.mode == GameMode.MENU, engine.mode # экзамен завершён, движок в меню
+
+
+def measure_latency(repeat: int) -> dict[str, list[float]]:
+    """Медианное время вызова (мкс) по методам в каждом из repeat прогонов."""
+    runs = dict[str, list[float]]()
+
+    for _ in range(repeat):
+        calls = dict[str, list[float]]()
+
+        def on_turn(name: str, turn: Callable, respond: Callable):
+            start = time.perf_counter()
+            turn()
+            middle = time.perf_counter()
+            respond()
+            end = time.perf_counter()
+            calls.setdefault(name, []).append((middle - start) * 1e6)
+            calls.setdefault("create_response", []).append((end - middle) * 1e6)
+
+        gc.collect()
+        play(on_turn)
+        for name, timings in calls.items():
+            runs.setdefault(name, []).append(statistics.median(timings))
+
+    return runs
+
+def measure_memory() -> tuple[int, float, float]:
+    """Количество ходов, средний пиковый объём выделенной памяти (байт) и оставшихся блоков на ход."""
+    peaks, blocks = [], []
+
+    def on_turn(_, turn: Callable, respond: Callable):
+        before = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        turn()
+        respond()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - start)
+        blocks.append(sys.getallocatedblocks() - before)
+
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        play(on_turn)
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return len(peaks), statistics.mean(peaks), statistics.mean(blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--repeat", type=int, default=30, help="Количество прогонов сценария")
+    parser.add_argument("--json", help="Файл для итогов в формате JSON")
+    parser.add_argument("--compare", help="Итоги предыдущего запуска (--json) для сравнения")
+    args = parser.parse_args()
+
+    load_resources()
+    measure_latency(3) # прогрев
+    runs = measure_latency(args.repeat)
+    turns, peak, blocks = measure_memory()
+
+    summary = { name: { "median": statistics.median(timings), "min": min(timings) } for name, timings in runs.items() }
+    summary["turn_peak_bytes"] = peak
+    summary["turn_blocks"] = blocks
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding=UTF8) as file:
+            baseline = json.load(file)
+
+    def change(name: str, value: float, key: str = None) -> str:
+        if baseline is None or name not in baseline:
+            return ""
+        previous = baseline[name][key] if key else baseline[name]
+        return f"   {(value / previous - 1) * 100:+6.1f}%" if previous else ""
+
+    print(f"ходов в сценарии: {turns}, прогонов: {args.repeat}")
+    for name, result in summary.items():
+        if isinstance(result, dict):
+            print(f"{name:<40} median {result['median']:10.2f} us   min {result['min']:10.2f} us{change(name, result['min'], 'min')}")
+    print(f"{'память на ход: пик':<40} {peak:10.0f} B{change('turn_peak_bytes', peak)}")
+    print(f"{'память на ход: оставшиеся блоки':<40} {blocks:10.1f}{change('turn_blocks', blocks)}")
+
+    if args.json:
+        with open(args.json, "w", encoding=UTF8) as file:
+            json.dump(summary, file, ensure_ascii=False, indent=4)
+
+if __name__ == "__main__":
+    main()
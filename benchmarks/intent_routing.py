@@ -0,0 +1,79 @@
+"""
+Стоимость выбора обработчика сообщения: таблица IntentRouter против цепочки magic-фильтров aliceio.
+
+Запуск из корня навыка:
+    python -m benchmarks.intent_routing
+
+Цепочка фильтров воспроизводит регистрацию обработчиков в alice_handlers до перехода на IntentRouter.
+"""
+import asyncio
+import time
+import statistics
+from aliceio import F
+from aliceio.types import Update
+from aliceio.dispatcher.event.handler import HandlerObject, FilterObject
+from engine.alice.alice_intents import IntentRouter
+from benchmarks.common import make_update, number_entity
+
+FILTER_CHAIN = (
+    ("start_session", (F.session.new,)),
+    ("menu_open", (F.nlu.intents["menu_open"],)),
+    ("menu_select", (F.nlu.intents["menu_select"], F.nlu.intents["menu_select"]["slots"]["mode"]["value"].as_("mode"))),
+    ("back", (F.nlu.intents["back"],)),
+    ("stats", (F.nlu.intents["stats"],)),
+    ("rules", (F.nlu.intents["rules"],)),
+    ("finish", (F.nlu.intents["finish"],)),
+    ("hamster", (F.nlu.intents["hamster"],)),
+    ("default", ()),
+)
+
+MESSAGES = {
+    "новая сессия": make_update("s", 0, new=True),
+    "menu_select": make_update("s", 1, command="экзамен", intents={ "menu_select": { "slots": { "mode": { "type": "YANDEX.STRING", "value": "экзамен" } } } }),
+    "stats": make_update("s", 2, command="статистика", intents={ "stats": { "slots": {} } }),
+    "hamster": make_update("s", 3, command="стань хомяком", intents={ "hamster": { "slots": {} } }),
+    "ответ числом": make_update("s", 4, command="2", entities=number_entity(2)),
+    "повтор": make_update("s", 5, command="повтори", intents={ "YANDEX.REPEAT": { "slots": {} } }),
+}
+
+async def route_by_filters(handlers: list[HandlerObject], message) -> str:
+    for handler in handlers:
+        passed, _ = await handler.check(message)
+        if passed:
+            return handler.callback()
+
+async def measure_async(func, message, repeat: int = 5, number: int = 2000) -> list[float]:
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func(message)
+        results.append((time.perf_counter() - start) / number * 1e6)
+    return results
+
+async def main():
+    handlers = [HandlerObject(callback=lambda name=name: name, filters=[FilterObject(f) for f in filters])
+                for name, filters in FILTER_CHAIN]
+
+    router = IntentRouter()
+    router.new_session(lambda: "start_session")
+    for name, filters in FILTER_CHAIN[1:-1]:
+        router.intent(name, *(("mode",) if name == "menu_select" else ()))(lambda name=name: name)
+    router.default(lambda: "default")
+
+    async def route_by_table(message):
+        return router.resolve(message)[0]()
+
+    print(f"{'сообщение':<16} {'фильтры, us':>12} {'таблица, us':>12}")
+    for title, payload in MESSAGES.items():
+        message = Update.model_validate(payload).message
+        by_filters = await route_by_filters(handlers, message)
+        by_table = await route_by_table(message)
+        assert by_filters == by_table, f"{title}: {by_filters} != {by_table}"
+
+        filters_time = statistics.median(await measure_async(lambda m: route_by_filters(handlers, m), message))
+        table_time = statistics.median(await measure_async(route_by_table, message))
+        print(f"{title:<16} {filters_time:12.2f} {table_time:12.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Стоимость метрик: обновление рядов и промежуточный обработчик MetricsMiddleware.
+
+Запуск из корня навыка:
+    python -m benchmarks.metrics_overhead [-n 2000]
+
+Измеряется стоимость обновления счётчика и гистограммы, стоимость промежуточного обработчика
+метрик отдельно (вызов с обработчиком-заглушкой) и процессорное время обработки запроса
+диспетчером с промежуточным обработчиком метрик и без него. Разброс последнего сравнения
+больше стоимости самих метрик, поэтому она оценивается по отдельному замеру.
+Проверки выгрузки - в tests/test_metrics.py.
+"""
+import argparse
+import asyncio
+import random
+import time
+import statistics
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_metrics import MetricsMiddleware, set_handler, set_mode
+from metrics import metrics
+from benchmarks.common import load_resources, measure, report, make_update
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+def play(skill: Skill, session_id: str, count: int, timings: list[float] = None) -> int:
+    """Проигрывает count запросов демонстрации и возвращает их количество."""
+    rnd = random.Random(1)
+    sent = 0
+
+    async def run():
+        nonlocal sent
+        async def request(update: dict):
+            nonlocal sent
+            update = make_update(session_id, sent, **update)
+            sent += 1
+            start = time.process_time()
+            await dispatcher.feed_webhook_update(skill, update)
+            if timings is not None:
+                timings.append((time.process_time() - start) * 1e6)
+
+        await request({ "new": True })
+        while sent < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    asyncio.run(run())
+    return sent
+
+def measure_middleware(number: int) -> float:
+    """Стоимость MetricsMiddleware на запрос, в микросекундах: разница с вызовом обработчика напрямую."""
+    middleware = MetricsMiddleware()
+
+    async def handler(event, data):
+        set_handler("benchmark")
+        set_mode(GameMode.DEMO)
+
+    async def run() -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            await handler(None, None)
+        direct = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(number):
+            await middleware(handler, None, {})
+        return (time.perf_counter() - start - direct) / number * 1e6
+
+    return min(asyncio.run(run()) for _ in range(5))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Количество запросов в одном прогоне")
+    args = parser.parse_args()
+
+    config = load_resources()
+    skill = Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+
+    counter = metrics.requests.labels("benchmark", "demo")
+    histogram = metrics.request_seconds.labels("benchmark", "demo")
+    report("счётчик: inc", measure(counter.inc, number=args.number * 10))
+    report("гистограмма: observe", measure(lambda: histogram.observe(0.003), number=args.number * 10))
+    report("счётчик: labels + inc", measure(lambda: metrics.requests.labels("benchmark", "demo").inc(), number=args.number * 10))
+    print(f"{'промежуточный обработчик метрик':<40} {measure_middleware(args.number * 10):10.2f} us на запрос")
+
+    # прогрев не учитывается, а прогоны с метриками и без чередуются по схеме ABBA,
+    # чтобы ни прогрев, ни дрейф за время замера не попадали в разницу
+    play(skill, "warmup", args.number)
+    outer = dispatcher.update.outer_middleware
+    middlewares = list(outer)
+    timings = { True: [], False: [] }
+    for round in range(8):
+        enabled = round % 4 in (0, 3)
+        for middleware in list(outer):
+            outer.unregister(middleware)
+        for middleware in middlewares:
+            if enabled or not isinstance(middleware, MetricsMiddleware):
+                outer(middleware)
+        play(skill, f"session-{round}", args.number, timings[enabled])
+
+    for enabled, name in ((True, "запрос: с метриками"), (False, "запрос: без метрик")):
+        print(f"{name:<40} median {statistics.median(timings[enabled]):10.2f} us   mean {statistics.mean(timings[enabled]):10.2f} us")
+    difference = statistics.median(timings[True]) - statistics.median(timings[False])
+    print(f"{'разница медиан (с шумом прогонов)':<40} {difference:10.2f} us   {difference / statistics.median(timings[False]) * 100:+.1f}%")
+
+if __name__ == "__main__":
+    main()
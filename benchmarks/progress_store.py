@@ -0,0 +1,62 @@
+"""
+Хранилище прогресса пользователей (ProgressDB): стоимость ответа и записи.
+
+Запуск из корня навыка:
+    python -m benchmarks.progress_store [-u 2000] [-a 20]
+
+Измеряется ответ на пути запроса (add_answer), обращение к кэшу (get) и запись пачки изменений
+u пользователей по a ответов.
+Проверки сохранения прогресса между сессиями и фоновой записи - в tests/test_progress_store.py.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from engine.maindb import MainDB
+from engine.progressdb import ProgressDB
+from benchmarks.common import load_resources, measure, report
+from myconstants import *
+
+def measure_cost(file_name: str, users: int, answers: int):
+    db = ProgressDB()
+    db.open(file_name, max_users=users)
+    progresses = [db.get(f"user-{index}") for index in range(users)]
+    db.flush()
+
+    rnd = random.Random(1)
+    noteseq_ids = [noteseq.id for noteseq in MainDB()]
+    progress = progresses[0]
+    report("add_answer", measure(lambda: progress.add_answer(LevelId.CADENCE, rnd.random() < 0.7, (rnd.choice(noteseq_ids),))))
+    report("get (в кэше)", measure(lambda: db.get("user-1")))
+    db.flush()
+
+    timings = []
+    for _ in range(3):
+        for progress in progresses:
+            for _ in range(answers):
+                progress.add_answer(rnd.choice((LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE)),
+                                    rnd.random() < 0.7, (rnd.choice(noteseq_ids),))
+        start = time.perf_counter()
+        db.flush()
+        timings.append(time.perf_counter() - start)
+    db.close()
+
+    batch = statistics.median(timings)
+    print(f"запись пачки: {users} пользователей по {answers} ответов - {batch * 1000:.1f} ms "
+          f"({batch / (users * answers) * 1e6:.2f} us на ответ)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-u", "--users", type=int, default=2000, help="Количество пользователей в пачке записи")
+    parser.add_argument("-a", "--answers", type=int, default=20, help="Количество ответов пользователя в пачке")
+    args = parser.parse_args()
+
+    load_resources()
+    folder = tempfile.mkdtemp(prefix="meldict-progress-")
+
+    measure_cost(os.path.join(folder, "cost.sqlite3"), args.users, args.answers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Сборка текста и TTS ответа: format_text и format_tts.
+
+Запуск из корня навыка:
+    python -m benchmarks.reply_format [-n 2000] [--dialogs 20]
+
+Записываются вызовы во время прохождения экзаменов, и на самых длинных ответах сравнивается
+время сборки текущей реализации и прежней, основанной на конкатенации строк (её копия -
+методы ConcatEngine ниже); обе реализации вызываются как методы движка. Правила склейки
+проверяются тестами tests/test_reply_format.py.
+"""
+import argparse
+import random
+from collections.abc import Iterable
+from types import SimpleNamespace
+from engine.alice.alice_engine import AliceEngine
+from engine.musicnotesequence import MusicNoteSequence
+from benchmarks.common import load_resources, measure, report
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+def audio_tag(file_name: str) -> str:
+    return f'<speaker audio="dialogs-upload/{SKILL_ID}/{file_name}.opus">'
+
+
+class ConcatEngine(AliceEngine):
+    """Движок с прежними реализациями format_text и format_tts, основанными на конкатенации строк."""
+    def format_text(self, *args, sep = " ") -> str:
+        return self.__format_text(False, *args, sep=sep)
+
+    def __format_text(self, new_line: bool, *args, sep = " ") -> str:
+        text = ""
+
+        for value in args:
+            if value is None:
+                continue
+            if isinstance(value, str):
+                pass # pass required
+            elif isinstance(value, Iterable):
+                value = self.__format_text(new_line, *value)
+            else:
+                value = str(value)
+
+            if len(value) == 0:
+                continue
+
+            if not new_line and len(sep) > 0 and len(text) > 0 and value[0].isalnum():
+                text += sep
+
+            text += value
+            new_line = value[-1] == "\n"
+
+        return text
+
+    def format_tts(self, *args, sep = " ") -> str:
+        return self.__format_tts(False, False, *args, sep=sep)[0]
+
+    def __format_tts(self, new_line: bool, prev_tag: bool, *args, sep = " ") -> tuple[str, bool]:
+        tts = ""
+        for value in args:
+            tag = False
+
+            if value is None:
+                continue
+            if isinstance(value, str):
+                pass # pass required
+            elif isinstance(value, MusicNoteSequence):
+                value = self.get_audio_tag(value.file_name)
+                tag = True
+            elif isinstance(value, Iterable):
+                value, tag = self.__format_tts(new_line, prev_tag, *value)
+            else:
+                value = str(value)
+
+            if len(value) == 0:
+                continue
+
+            if not new_line and not tag and len(sep) > 0 and len(tts) > 0 and value[0].isalnum():
+                tts += sep
+
+            tts += value
+            new_line = new_line if tag else value[-1] == "\n"
+            prev_tag = tag
+
+        return tts, prev_tag
+
+    def get_audio_tag(self, nsf: str | MusicNoteSequence) -> str:
+        return audio_tag(nsf.file_name if isinstance(nsf, MusicNoteSequence) else nsf)
+
+
+def freeze(args: Iterable) -> tuple:
+    """Превращает вложенные генераторы в кортежи, чтобы аргументы можно было передавать повторно."""
+    return tuple(value if value is None or isinstance(value, (str, MusicNoteSequence)) or not isinstance(value, Iterable)
+                 else freeze(value) for value in args)
+
+
+class RecordingEngine(AliceEngine):
+    """Движок, запоминающий аргументы всех вызовов format_text и format_tts."""
+    def __init__(self, skill_id: str):
+        super().__init__(skill_id, seed=1)
+        self.text_calls = list[tuple[tuple, str]]()
+        self.tts_calls = list[tuple[tuple, str]]()
+
+    def format_text(self, *args, sep = " ") -> str:
+        args = freeze(args)
+        self.text_calls.append((args, sep))
+        return super().format_text(*args, sep=sep)
+
+    def format_tts(self, *args, sep = " ") -> str:
+        args = freeze(args)
+        self.tts_calls.append((args, sep))
+        return super().format_tts(*args, sep=sep)
+
+    def get_audio_tag(self, nsf: str | MusicNoteSequence) -> str:
+        return audio_tag(nsf.file_name if isinstance(nsf, MusicNoteSequence) else nsf)
+
+
+def play_exam(engine: RecordingEngine, rnd: random.Random):
+    engine.mode = GameMode.INIT
+    engine.get_reply()
+    engine.process_button_pressed(SimpleNamespace(payload={ "set_mode": GameMode.EXAM }))
+    while engine.mode == GameMode.EXAM:
+        engine.process_button_pressed(SimpleNamespace(payload={ "value": rnd.randint(0, 3) }))
+    engine.get_stats_reply()
+
+
+def new_text(engine: AliceEngine, args: tuple, sep: str) -> str:
+    return AliceEngine.format_text(engine, *args, sep=sep) # без записи вызова
+
+def new_tts(engine: AliceEngine, args: tuple, sep: str) -> str:
+    return AliceEngine.format_tts(engine, *args, sep=sep)
+
+def old_text(engine: ConcatEngine, args: tuple, sep: str) -> str:
+    return engine.format_text(*args, sep=sep)
+
+def old_tts(engine: ConcatEngine, args: tuple, sep: str) -> str:
+    return engine.format_tts(*args, sep=sep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Количество вызовов в одном прогоне")
+    parser.add_argument("--dialogs", type=int, default=20, help="Количество записываемых экзаменов")
+    args = parser.parse_args()
+
+    load_resources()
+
+    rnd = random.Random(1)
+    engine = RecordingEngine(SKILL_ID)
+    for _ in range(args.dialogs):
+        play_exam(engine, rnd)
+
+    # самые длинные ответы - начало экзамена (правила и первое задание) и его завершение
+    longest_text = max(engine.text_calls, key=lambda call: len(new_text(engine, *call)))
+    longest_tts = max(engine.tts_calls, key=lambda call: len(new_tts(engine, *call)))
+
+    concat = ConcatEngine(SKILL_ID)
+
+    text_args, text_sep = longest_text
+    tts_args, tts_sep = longest_tts
+    print(f"самый длинный текст: {len(new_text(engine, text_args, text_sep))} символов, "
+          f"TTS: {len(new_tts(engine, tts_args, tts_sep))} символов")
+
+    report("format_text: конкатенация", measure(lambda: old_text(concat, text_args, text_sep), number=args.number))
+    report("format_text: список фрагментов", measure(lambda: new_text(engine, text_args, text_sep), number=args.number))
+    report("format_tts: конкатенация", measure(lambda: old_tts(concat, tts_args, tts_sep), number=args.number))
+    report("format_tts: список фрагментов", measure(lambda: new_tts(engine, tts_args, tts_sep), number=args.number))
+
+if __name__ == "__main__":
+    main()
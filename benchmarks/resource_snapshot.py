@@ -0,0 +1,145 @@
+"""
+Реестр поколений ресурсов: время запроса при перезагрузках и стоимость чтения синглтонов.
+
+Запуск из корня навыка:
+    python -m benchmarks.resource_snapshot [-c 50] [-n 20000]
+
+1. Нагрузка: c одновременных сессий играют демонстрацию через диспетчер, без перезагрузок
+   и пока отдельный поток непрерывно публикует новые поколения конфигурации, голосового меню
+   и базы трезвучий (Reloader), как при частых перезагрузках файлов. Печатаются медиана
+   и 99-й процентиль времени запроса.
+2. Конкуренция потоков: 1-8 потоков читают три синглтона; для сравнения те же потоки
+   читают синглтоны прежней реализации, которая брала общую блокировку при каждом обращении.
+
+Проверки согласованности поколений в запросе - в tests/test_resource_snapshot.py.
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import statistics
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from engine.maindb import MainDB
+from config import Config
+from voicemenu import VoiceMenu
+from benchmarks.common import load_resources, make_update
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+class Reloader:
+    """Поток, публикующий копии ресурсов новыми поколениями, пока не остановлен."""
+    def __init__(self):
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.published = 0
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.__stop.set()
+        self.__thread.join()
+
+    def __run(self):
+        config, vm = Config(), VoiceMenu()
+        while not self.__stop.is_set():
+            Config.publish(config.model_copy())
+            VoiceMenu.publish(vm.model_copy())
+            if self.published % 50 == 49:
+                MainDB.load()
+            self.published += 1
+            time.sleep(0.0005)
+
+def play(skill: Skill, concurrency: int, count: int) -> list[float]:
+    """Играет демонстрацию в concurrency сессиях; возвращает время (мкс) каждого из count запросов."""
+    timings = []
+
+    async def session(index: int):
+        rnd = random.Random(index)
+        message_id = 0
+
+        async def request(update: dict):
+            nonlocal message_id
+            update = make_update(f"session-{index}", message_id, **update)
+            message_id += 1
+            start = time.perf_counter()
+            await dispatcher.feed_webhook_update(skill, update)
+            timings.append((time.perf_counter() - start) * 1e6)
+
+        await request({ "new": True })
+        while len(timings) < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    async def run():
+        await asyncio.gather(*(session(index) for index in range(concurrency)))
+
+    asyncio.run(run())
+    return timings
+
+def report_load(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{name:<40} median {statistics.median(timings):10.2f} us   p99 {p99:10.2f} us   ({len(timings)} запросов)")
+
+class PreviousSingletonMeta(type):
+    """SingletonMeta до реестра поколений ресурсов."""
+    _instance = None
+    _rlock = threading.RLock()
+
+    def __call__(self, *args, new: bool = False, **kwargs):
+        with self._rlock:
+            if self._instance is None or new or args or kwargs:
+                self._instance = super().__call__(*args, **kwargs)
+            return self._instance
+
+class PreviousConfig(metaclass=PreviousSingletonMeta): pass
+class PreviousVoiceMenu(metaclass=PreviousSingletonMeta): pass
+class PreviousMainDB(metaclass=PreviousSingletonMeta): pass
+
+def contention(threads: int, number: int, previous: bool) -> float:
+    """Возвращает количество обращений к трём синглтонам в секунду из threads потоков."""
+    barrier = threading.Barrier(threads + 1)
+    config, vm, main_db = (PreviousConfig, PreviousVoiceMenu, PreviousMainDB) if previous else (Config, VoiceMenu, MainDB)
+
+    def read():
+        barrier.wait()
+        for _ in range(number):
+            config(); vm(); main_db()
+
+    workers = [threading.Thread(target=read) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return threads * number / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="Количество одновременных сессий")
+    parser.add_argument("-n", "--number", type=int, default=20000, help="Количество чтений в одном потоке")
+    args = parser.parse_args()
+
+    config = load_resources()
+    skill = Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+
+    play(skill, args.concurrency, 2000) # прогрев
+    report_load("запрос: без перезагрузок", play(skill, args.concurrency, 5000))
+    with Reloader():
+        report_load("запрос: с перезагрузками", play(skill, args.concurrency, 5000))
+
+    for threads in (1, 2, 4, 8):
+        # берётся лучший из трёх прогонов: на загруженной машине разброс велик
+        current = max(contention(threads, args.number, previous=False) for _ in range(3))
+        previous = max(contention(threads, args.number, previous=True) for _ in range(3))
+        print(f"потоков {threads}: реестр {current / 1e6:6.2f} млн/с, прежний синглтон {previous / 1e6:6.2f} млн/с")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Бюджет времени ответа (ResponseBudget): стоимость обёртки.
+
+Запуск из корня навыка:
+    python -m benchmarks.response_budget [-n 2000]
+
+Сравнивается время вызова пустого обработчика с обёрткой ResponseBudget и без неё. Резервный
+ответ, его исключение из кэша повторов и учёт в метриках проверяются тестами
+tests/test_response_budget.py.
+"""
+import argparse
+import asyncio
+import time
+from engine.alice.alice_budget import ResponseBudget
+from benchmarks.common import report
+
+def measure_cost(number: int):
+    budget = ResponseBudget(1.0)
+
+    async def handler():
+        return None
+
+    wrapped = budget(handler)
+
+    async def run(func) -> list[float]:
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(number):
+                await func()
+            timings.append((time.perf_counter() - start) / number * 1e6)
+        return timings
+
+    report("пустой обработчик", asyncio.run(run(handler)))
+    report("пустой обработчик + ResponseBudget", asyncio.run(run(wrapped)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Количество вызовов в одном прогоне")
+    args = parser.parse_args()
+
+    measure_cost(args.number)
+
+if __name__ == "__main__":
+    main()
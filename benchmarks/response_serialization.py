@@ -0,0 +1,115 @@
+"""
+Сериализация ответа навыка: модели pydantic против FastResponse (response.fast_json).
+
+Запуск из корня навыка:
+    python -m benchmarks.response_serialization [-n 2000]
+
+Сравнивается время построения и сериализации самого длинного ответа сценария диалога и
+процессорное время обработки одного запроса через диспетчер. Совпадение тела ответа
+с ответом pydantic проверяется тестами tests/test_response_serialization.py.
+"""
+import argparse
+import asyncio
+import random
+import time
+import statistics
+from aliceio import Skill
+from aliceio.types import TextButton
+from engine.alice.alice_engine import AliceEngine
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_response import FastAiohttpRequestHandler, create_alice_response
+from config import Config
+from benchmarks.common import load_resources, measure, report, make_update
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+def scripted_replies(rnd: random.Random) -> list[tuple[str, str, tuple, bool]]:
+    """Текст, TTS, кнопки и признак завершения сессии для ответов в сценарии диалога."""
+    engine = AliceEngine(SKILL_ID)
+    engine.mode = GameMode.INIT
+    replies = []
+
+    def add(reply: tuple[str, str], end_session: bool = False):
+        text, tts = reply
+        buttons = None if end_session else tuple(engine.get_buttons())
+        replies.append((text, engine.format_tts(engine.get_hamster_tag(), tts, sep=""), buttons, end_session))
+
+    def press(**payload):
+        add(engine.process_button_pressed(TextButton(title="", payload=payload)))
+
+    add(engine.get_reply())
+    press(help=True)
+    for mode in (GameMode.DEMO, GameMode.EXAM):
+        press(set_mode=mode)
+        while engine.mode == mode:
+            press(value=rnd.randint(0, 3))
+        add(engine.get_stats_reply())
+
+    engine.hamster = True
+    press(set_mode=GameMode.TRAIN_MENU)
+    for level_id in (LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE):
+        press(set_level=level_id)
+        for _ in range(3):
+            press(value=rnd.randint(0, 3))
+        add(engine.process_back_action())
+
+    add(("До свидания", "до свидания"), end_session=True)
+    return replies
+
+def measure_requests(skill: Skill, fast_json: bool, count: int) -> list[float]:
+    """Процессорное время (мкс) обработки запросов от разбора JSON до тела ответа."""
+    Config().response.fast_json = fast_json
+    handler = FastAiohttpRequestHandler(dispatcher=dispatcher, skill=skill)
+    rnd = random.Random(1)
+    session_id = f"session-{fast_json}"
+    timings = []
+
+    async def run():
+        message_id = 0
+        async def request(update: dict):
+            nonlocal message_id
+            update = make_update(session_id, message_id, **update)
+            message_id += 1
+            start = time.process_time()
+            result = await dispatcher.feed_webhook_update(skill, update)
+            handler._build_web_response(result)
+            timings.append((time.process_time() - start) * 1e6)
+
+        await request({ "new": True })
+        while len(timings) < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    asyncio.run(run())
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Количество ответов и запросов в одном прогоне")
+    args = parser.parse_args()
+
+    config = load_resources()
+    skill = Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+    rnd = random.Random(0)
+
+    replies = scripted_replies(rnd)
+
+    # самый длинный ответ сценария
+    text, tts, buttons, end_session = max(replies, key=lambda reply: len(reply[0]) + len(reply[1] or ""))
+    handler = FastAiohttpRequestHandler(dispatcher=dispatcher, skill=skill)
+
+    def build(fast_json: bool):
+        Config().response.fast_json = fast_json
+        return lambda: handler._build_json_response(create_alice_response(text, tts, buttons, end_session))
+
+    report("ответ: pydantic", measure(build(False), number=args.number))
+    report("ответ: FastResponse", measure(build(True), number=args.number))
+
+    for fast_json, name in ((False, "запрос: pydantic"), (True, "запрос: FastResponse")):
+        timings = measure_requests(skill, fast_json, args.number)
+        print(f"{name:<40} median {statistics.median(timings):10.2f} us   mean {statistics.mean(timings):10.2f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Стоимость создания и объём памяти одной простаивающей сессии.
+
+Запуск из корня навыка:
+    python -m benchmarks.session_footprint [-n 10000]
+
+Для сравнения дополнительно измеряется "жадная" сессия, в которой сразу создаются
+все уровни, как это делал MelDictEngine до перехода на ленивое создание уровней.
+"""
+import argparse
+import gc
+import tracemalloc
+from engine.alice.alice_engine import AliceEngine
+from engine.levels.demo_level import DemoLevel
+from engine.levels.missed_note_level import MissedNoteLevel
+from engine.levels.prima_location_level import PrimaLocationLevel
+from engine.levels.cadence_level import CadenceLevel
+from engine.levels.exam_level import ExamLevel
+from benchmarks.common import load_resources, measure, report
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+def create_session() -> AliceEngine:
+    engine = AliceEngine(SKILL_ID)
+    engine.mode = GameMode.INIT
+    return engine
+
+def create_eager_session() -> tuple:
+    engine = create_session()
+    return engine, (DemoLevel(engine), MissedNoteLevel(engine), PrimaLocationLevel(engine),
+                    CadenceLevel(engine), ExamLevel(engine))
+
+def footprint(factory, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    sessions = [factory() for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return size / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--sessions", type=int, default=10000, help="Количество сессий")
+    args = parser.parse_args()
+
+    load_resources()
+
+    report("создание ленивой сессии", measure(create_session))
+    report("создание жадной сессии", measure(create_eager_session))
+
+    print(f"{'память ленивой сессии':<40} {footprint(create_session, args.sessions):10.0f} B")
+    print(f"{'память жадной сессии':<40} {footprint(create_eager_session, args.sessions):10.0f} B")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Сохранение и восстановление таблицы сессий при перезапуске сервера.
+
+Запуск из корня навыка:
+    python -m benchmarks.session_persistence [-n 20000]
+
+Создаются n сессий в разных состояниях: меню, демонстрация, тренировка на каждом уровне
+и экзамен с частью ответов; часть сессий простаивает дольше SESSION_TTL. Таблица
+сохраняется в файл и восстанавливается в новое хранилище. Печатается время сохранения
+и восстановления и размер файла на сессию.
+Проверки восстановленного состояния и файлов прежнего запуска - в tests/test_session_persistence.py.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from aliceio.fsm.storage.base import StorageKey
+from aliceio.fsm.storage.memory import MemoryStorage
+from engine.alice.alice_engine import AliceEngine
+from engine.alice.alice_sessions import SESSION_TTL, dump_sessions, restore_sessions
+from benchmarks.common import load_resources
+from myconstants import *
+
+SKILL_ID = "benchmark"
+UNIQUE = 500 # различных состояний: создание сессии дорогое, остальные сессии их повторяют
+
+def button(**payload):
+    return SimpleNamespace(payload=payload)
+
+def create_session(rnd: random.Random) -> AliceEngine:
+    """Сессия в случайном состоянии: выбирается режим и даётся случайное количество ответов."""
+    engine = AliceEngine(SKILL_ID, seed=rnd.getrandbits(63))
+    engine.mode = GameMode.INIT
+    engine.get_reply()
+    engine.hamster = rnd.random() < 0.1
+
+    match rnd.randrange(4):
+        case 0:
+            return engine
+        case 1:
+            engine.process_button_pressed(button(set_mode=GameMode.DEMO))
+            values = (1, 2)
+        case 2:
+            engine.process_button_pressed(button(set_mode=GameMode.TRAIN_MENU))
+            level_id = rnd.choice((LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE))
+            engine.process_button_pressed(button(set_level=level_id))
+            values = (0, 1, 2) if level_id == LevelId.PRIMA_LOCATION else (1, 2, 3)
+        case 3:
+            engine.process_button_pressed(button(set_mode=GameMode.EXAM))
+            values = (1, 2, 3)
+
+    for _ in range(rnd.randrange(12)):
+        engine.process_button_pressed(button(value=rnd.choice(values)))
+    return engine
+
+def create_storage(count: int) -> tuple[MemoryStorage, int]:
+    """Хранилище с count сессиями; возвращает его и количество непросроченных сессий."""
+    rnd = random.Random(1)
+    storage = MemoryStorage()
+    now = time.time()
+    alive = 0
+    engines = [create_session(rnd) for _ in range(min(count, UNIQUE))]
+
+    for index in range(count):
+        # время простоя не близко к SESSION_TTL: сессия не должна истечь за время проверки
+        expired = rnd.random() < 0.1
+        idle = rnd.uniform(SESSION_TTL + 60, SESSION_TTL * 2) if expired else rnd.uniform(0, SESSION_TTL - 60)
+        alive += not expired
+        key = StorageKey(skill_id=SKILL_ID, user_id=f"user-{index // 2}", session_id=None, application_id=f"app-{index // 2}")
+        # по две сессии на пользователя, как после повторного входа в навык
+        storage.storage[key].data[f"session-{index}"] = (engines[index % len(engines)], now - idle)
+
+    return storage, alive
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--sessions", type=int, default=20000, help="Количество сессий")
+    args = parser.parse_args()
+
+    load_resources()
+    storage, alive = create_storage(args.sessions)
+    file_name = os.path.join(tempfile.mkdtemp(prefix="meldict-sessions-"), "sessions.json")
+
+    start = time.perf_counter()
+    dumped = dump_sessions(storage, file_name)
+    dump_time = time.perf_counter() - start
+
+    restored_storage = MemoryStorage()
+    start = time.perf_counter()
+    restored = restore_sessions(restored_storage, file_name)
+    restore_time = time.perf_counter() - start
+
+    size = os.path.getsize(file_name)
+    print(f"сессий: {args.sessions}, сохранено {dumped}, восстановлено {restored}, просроченных отброшено {args.sessions - alive}")
+    print(f"сохранение      {dump_time * 1000:10.1f} ms   ({dump_time / dumped * 1e6:.1f} us на сессию)")
+    print(f"восстановление  {restore_time * 1000:10.1f} ms   ({restore_time / restored * 1e6:.1f} us на сессию)")
+    print(f"размер файла    {size / 1024:10.1f} KiB  ({size / dumped:.0f} байт на сессию)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Трассировка запросов: стоимость на запрос.
+
+Запуск из корня навыка:
+    python -m benchmarks.tracing_overhead [-n 2000]
+
+Сначала измеряется процессорное время запроса без трассировки (этапы не обёрнуты).
+Затем трассировка включается с записью во временный файл: измеряется время запроса при
+доле трассируемых запросов 0 (стоимость обёрток) и 1, и размер файла трасс на запрос.
+Проверки файла трасс - в tests/test_tracing.py.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import statistics
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_tracing import install_tracing
+from benchmarks.common import load_resources, make_update
+from myconstants import *
+
+SKILL_ID = "benchmark"
+
+def play(skill: Skill, session_id: str, count: int) -> list[float]:
+    """Проигрывает count запросов демонстрации; возвращает процессорное время (мкс) каждого."""
+    rnd = random.Random(1)
+    timings = []
+
+    async def run():
+        async def request(update: dict):
+            update = make_update(session_id, len(timings), **update)
+            start = time.process_time()
+            await dispatcher.feed_webhook_update(skill, update)
+            timings.append((time.process_time() - start) * 1e6)
+
+        await request({ "new": True })
+        while len(timings) < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    asyncio.run(run())
+    return timings
+
+def play_rounds(skill: Skill, name: str, count: int, rounds: int = 3) -> list[float]:
+    """Повторяет прогон rounds раз и печатает лучшую медиану: на загруженной машине разброс велик."""
+    runs = [play(skill, f"{name}-{round}", count) for round in range(rounds)]
+    medians = [statistics.median(timings) for timings in runs]
+    print(f"{name:<40} median {min(medians):10.2f} us   (прогоны: {', '.join(f'{m:.0f}' for m in medians)})")
+    return runs[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Количество запросов в одном прогоне")
+    args = parser.parse_args()
+
+    config = load_resources()
+    skill = Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+    play(skill, "warmup", args.number) # прогрев
+
+    play_rounds(skill, "запрос: трассировка выключена", args.number)
+
+    folder = tempfile.mkdtemp(prefix="meldict-trace-")
+    config.tracing.file = os.path.join(folder, "trace.json")
+    config.tracing.max_bytes = 1024 * 1024 * 1024
+    tracer = install_tracing(dispatcher)
+
+    config.tracing.sample_rate = 0.0
+    play_rounds(skill, "запрос: доля трассировки 0", args.number)
+
+    config.tracing.sample_rate = 1.0
+    timings = play_rounds(skill, "запрос: доля трассировки 1", args.number, rounds=1)
+
+    tracer.close() # дожидается записи очереди
+    print(f"размер файла трасс: {os.path.getsize(tracer.file) / len(timings):.0f} байт на запрос")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Нагрузочный тест HTTP-сервера навыка: воспроизведение запросов Алисы с заданной частотой.
+
+Запуск из корня навыка:
+    python -m benchmarks.webhook_load --start [-r 100] [-d 30] [-s 50]
+    python -m benchmarks.webhook_load --url http://127.0.0.1:5000/ --pid 12345
+    python -m benchmarks.webhook_load --start --replay dialogs.jsonl --max-error-rate 0 --max-p99 500
+
+С --start сервер (main.py с текущим config.json) запускается отдельным процессом, тест
+начинается после ответа обработчика готовности, а по окончании сервер останавливается по SIGTERM.
+Без --start запросы отправляются уже запущенному серверу (адрес из config.json или --url);
+память сервера измеряется, если указан --pid. Сеть, кроме локального соединения, не нужна.
+
+Каждая из s виртуальных сессий отправляет запросы по очереди, следующий - после ответа на
+предыдущий, с последовательными message_id: начало сессии, выбор режима голосом (menu_select)
+или кнопкой, выбор уровня тренировки, ответы числом и кнопками, повторы, возврат в меню.
+Закончив диалог, сессия начинает новый с новым session_id. С --replay вместо синтетических
+диалогов воспроизводятся записанные запросы (JSON Lines, по запросу Алисы в строке): запросы
+группируются по session_id, и каждая виртуальная сессия воспроизводит одну записанную под своим
+session_id и user_id и идентификатором навыка из config.json.
+
+Общая частота запросов ограничена r в секунду. Время ответа отсчитывается от момента, когда
+запрос должен был быть отправлен по расписанию, поэтому задержка сервера не прячется за
+уменьшением частоты. Ошибка - ответ не 200, ответ без текста, ошибка соединения или ответ
+"что-то пошло не так"; отказы при перегрузке (admission) считаются отдельно.
+
+Каждые --interval секунд печатаются частота, 99-й процентиль и память сервера (RSS процесса и его
+рабочих процессов), в конце - итог. С --max-error-rate и --max-p99 код возврата 1, если предел
+превышен; с --json итог сохраняется в файл для сравнения между коммитами.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import aiohttp
+from collections.abc import Iterator
+from config import Config
+from abspath import abs_path
+from benchmarks.common import make_update, number_entity
+from myconstants import *
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def process_rss(pid: int) -> int:
+    """RSS процесса и его дочерних процессов (рабочих процессов супервизора) в байтах; None вне Linux."""
+    def rss(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/statm") as file:
+                return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+    if not os.path.isdir("/proc"):
+        return None
+
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task") if os.path.isdir(f"/proc/{pid}/task") else ():
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as file:
+                children.extend(int(child) for child in file.read().split())
+        except OSError:
+            pass
+    return rss(pid) + sum(rss(child) for child in children)
+
+def phrases(name: str) -> set[str]:
+    """Тексты реплики основного уровня голосового меню."""
+    with open(abs_path(Config().data.voice_menu), "r", encoding=UTF8) as file:
+        return { item["text"] for item in json.load(file)["root"].get(name, ()) }
+
+
+def synthetic_dialog(rnd: random.Random) -> Iterator[dict]:
+    """Поля запросов (аргументы make_update) одного диалога: выбор режима и 5-20 ответов."""
+    yield { "new": True }
+
+    mode = rnd.choice((GameMode.DEMO, GameMode.TRAIN_MENU, GameMode.EXAM))
+    if rnd.random() < 0.5:
+        word = { GameMode.DEMO: "демонстрация", GameMode.TRAIN_MENU: "тренировка", GameMode.EXAM: "экзамен" }[mode]
+        yield { "command": word, "intents": { "menu_select": { "slots": { "mode": { "type": "YANDEX.STRING", "value": word } } } } }
+    else:
+        yield { "payload": { "set_mode": mode } }
+
+    values = (1, 2)
+    if mode == GameMode.TRAIN_MENU:
+        level = rnd.choice((LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE))
+        yield { "command": str(level), "entities": number_entity(level) } if rnd.random() < 0.5 \
+            else { "payload": { "set_level": level } }
+        values = (0, 1, 2) if level == LevelId.PRIMA_LOCATION else (1, 2, 3)
+    elif mode == GameMode.EXAM:
+        values = (1, 2, 3)
+
+    for _ in range(rnd.randint(5, 20)):
+        value = rnd.choice(values)
+        match rnd.random():
+            case x if x < 0.1:
+                yield { "command": "повтори", "intents": { "YANDEX.REPEAT": { "slots": {} } } }
+            case x if x < 0.55:
+                yield { "command": str(value), "entities": number_entity(value) }
+            case _:
+                yield { "payload": { "value": value } }
+
+    yield { "command": "назад", "intents": { "back": { "slots": {} } } }
+
+
+def load_recorded(file_name: str) -> list[list[dict]]:
+    """Записанные запросы, сгруппированные по session_id в порядке message_id."""
+    sessions = dict[str, list[dict]]()
+    with open(file_name, "r", encoding=UTF8) as file:
+        for line in file:
+            if line.strip():
+                update = json.loads(line)
+                sessions.setdefault(update["session"]["session_id"], []).append(update)
+    return [sorted(updates, key=lambda update: update["session"]["message_id"]) for updates in sessions.values()]
+
+def recorded_dialog(updates: list[dict], session_id: str, skill_id: str) -> Iterator[dict]:
+    """Записанный диалог под новыми session_id и user_id, с последовательными message_id."""
+    for message_id, update in enumerate(updates):
+        update = json.loads(json.dumps(update))
+        session = update["session"]
+        session.update(session_id=session_id, message_id=message_id, skill_id=skill_id)
+        session.setdefault("application", {})["application_id"] = session_id
+        if session.get("user"):
+            session["user"]["user_id"] = session_id
+        yield update
+
+
+class Pacer:
+    """Выдаёт моменты отправки запросов с общей частотой rate в секунду."""
+    def __init__(self, rate: float):
+        assert rate > 0
+        self.__interval = 1 / rate
+        self.__next = time.perf_counter()
+
+    async def wait(self) -> float:
+        """Ждёт очередного момента отправки и возвращает его."""
+        scheduled = self.__next = max(self.__next + self.__interval, time.perf_counter() - 1.0) # без очереди длиннее секунды
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return scheduled
+
+
+class Results:
+    def __init__(self):
+        self.latencies = list[float]() # мс
+        self.errors = 0
+        self.shed = 0
+        self.statuses = dict[str, int]()
+        self.dialogs = 0
+
+    def add(self, latency: float, status: str):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.errors += status not in ("ok", "shed")
+        self.shed += status == "shed"
+
+
+class LoadTest:
+    def __init__(self, url: str, rate: float, sessions: int, duration: float, recorded: list[list[dict]] = None, seed: int = 1):
+        self.__url = url
+        self.__pacer = Pacer(rate)
+        self.__sessions = sessions
+        self.__duration = duration
+        self.__recorded = recorded
+        self.__seed = seed
+        self.__skill_id = Config().skill.id # сервер отвечает 406 на запросы другому навыку
+        self.__dialogs = 0
+        self.__failed = phrases("something_went_wrong")
+        self.__shed = phrases("try_later") | phrases("too_slow")
+        self.__deadline = None
+        self.total = Results()
+        self.interval = Results()
+
+    def __next_dialog(self) -> Iterator[dict]:
+        index = self.__dialogs
+        self.__dialogs += 1
+        self.total.dialogs += 1
+        session_id = f"load-{self.__seed}-{index}"
+
+        if self.__recorded:
+            return recorded_dialog(self.__recorded[index % len(self.__recorded)], session_id, self.__skill_id)
+        return (make_update(session_id, message_id, user_id=session_id, skill_id=self.__skill_id, **fields)
+                for message_id, fields in enumerate(synthetic_dialog(random.Random(self.__seed * 1000003 + index))))
+
+    async def __request(self, http: aiohttp.ClientSession, update: dict) -> str:
+        try:
+            async with http.post(self.__url, json=update) as response:
+                if response.status != 200:
+                    return f"http {response.status}"
+                text = (await response.json()).get("response", {}).get("text")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return type(e).__name__
+
+        if not text:
+            return "empty"
+        if text in self.__failed:
+            return "failed"
+        return "shed" if text in self.__shed else "ok"
+
+    async def __session(self, http: aiohttp.ClientSession):
+        while time.perf_counter() < self.__deadline:
+            for update in self.__next_dialog():
+                scheduled = await self.__pacer.wait()
+                if scheduled >= self.__deadline:
+                    return
+                status = await self.__request(http, update)
+                latency = (time.perf_counter() - scheduled) * 1000
+                self.total.add(latency, status)
+                self.interval.add(latency, status)
+
+    async def run(self):
+        self.__deadline = time.perf_counter() + self.__duration
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=self.__sessions)) as http:
+            await asyncio.gather(*(self.__session(http) for _ in range(self.__sessions)))
+
+
+async def report_progress(test: LoadTest, pid: int, interval: float, rss: list[int]):
+    started = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        results, test.interval = test.interval, Results()
+        memory = process_rss(pid) if pid else None
+        if memory is not None:
+            rss.append(memory)
+        print(f"{time.perf_counter() - started:6.0f} s  {len(results.latencies) / interval:8.1f} req/s  "
+              f"p99 {percentile(results.latencies, 0.99):8.1f} ms  ошибок {results.errors:5}  отказов {results.shed:5}"
+              + (f"  RSS {memory / 2**20:7.1f} MiB" if memory is not None else ""), flush=True)
+
+
+def start_server() -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, abs_path("main.py")], cwd=abs_path("."),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    """Ждёт ответа 200 обработчика готовности (или любого ответа сервера, если он выключен)."""
+    config = Config().readiness
+    url = base_url + config.path if config.enabled else base_url
+    deadline = time.perf_counter() + timeout
+
+    async with aiohttp.ClientSession() as http:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Сервер завершился с кодом {server.returncode}")
+            try:
+                async with http.get(url) as response:
+                    if response.status == 200 or not config.enabled:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("Сервер не стал готов к приёму запросов")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--rate", type=float, default=100, help="Частота запросов в секунду")
+    parser.add_argument("-d", "--duration", type=float, default=30, help="Длительность теста в секундах")
+    parser.add_argument("-s", "--sessions", type=int, default=50, help="Количество одновременных сессий")
+    parser.add_argument("--url", help="Адрес обработчика запросов; по умолчанию из config.json")
+    parser.add_argument("--start", action="store_true", help="Запустить сервер main.py на время теста")
+    parser.add_argument("--pid", type=int, help="Процесс уже запущенного сервера, для измерения памяти")
+    parser.add_argument("--replay", help="Файл записанных запросов Алисы (JSON Lines)")
+    parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора синтетических диалогов")
+    parser.add_argument("--interval", type=float, default=5, help="Интервал промежуточных итогов в секундах")
+    parser.add_argument("--max-error-rate", type=float, help="Допустимая доля ошибок, для CI")
+    parser.add_argument("--max-p99", type=float, help="Допустимый 99-й процентиль в мс, для CI")
+    parser.add_argument("--json", help="Файл для итогов в формате JSON")
+    args = parser.parse_args()
+
+    config = Config.load_default()
+    network = config.network
+    base_url = f"http{'s' if network.ssl.enabled else ''}://{network.ip}:{network.port}"
+    url = args.url or f"{base_url}/{network.path}"
+    recorded = load_recorded(args.replay) if args.replay else None
+
+    server = None
+    pid = args.pid
+    if args.start:
+        if config.data.upload_websounds:
+            print("Внимание: data.upload_websounds включено, сервер будет обращаться к Алисе")
+        server = start_server()
+        pid = server.pid
+
+    rss = list[int]()
+    try:
+        if server:
+            await wait_ready(base_url, server)
+
+        test = LoadTest(url, args.rate, args.sessions, args.duration, recorded, args.seed)
+        progress = asyncio.create_task(report_progress(test, pid, args.interval, rss))
+        start = time.perf_counter()
+        await test.run()
+        elapsed = time.perf_counter() - start
+        progress.cancel()
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            server.wait(Config().network.shutdown_timeout + 10)
+
+    results = test.total
+    count = len(results.latencies)
+    summary = {
+        "requests": count,
+        "dialogs": results.dialogs,
+        "throughput": count / elapsed,
+        "p50": percentile(results.latencies, 0.5),
+        "p95": percentile(results.latencies, 0.95),
+        "p99": percentile(results.latencies, 0.99),
+        "error_rate": results.errors / count if count else 0.0,
+        "shed_rate": results.shed / count if count else 0.0,
+        "statuses": results.statuses,
+        "rss_mib": [round(value / 2**20, 1) for value in rss],
+    }
+
+    print(f"запросов {count}, диалогов {results.dialogs}, {summary['throughput']:.1f} req/s (цель {args.rate:g})")
+    print(f"время ответа: p50 {summary['p50']:.1f} ms, p95 {summary['p95']:.1f} ms, p99 {summary['p99']:.1f} ms")
+    print(f"ошибок {summary['error_rate'] * 100:.2f}%, отказов при перегрузке {summary['shed_rate'] * 100:.2f}%, ответы: {results.statuses}")
+    if rss:
+        print(f"RSS сервера: в начале {rss[0] / 2**20:.1f} MiB, максимум {max(rss) / 2**20:.1f} MiB, в конце {rss[-1] / 2**20:.1f} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding=UTF8) as file:
+            json.dump(summary, file, ensure_ascii=False, indent=4)
+
+    failed = []
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        failed.append(f"доля ошибок {summary['error_rate']:.4f} больше {args.max_error_rate}")
+    if args.max_p99 is not None and summary["p99"] > args.max_p99:
+        failed.append(f"p99 {summary['p99']:.1f} ms больше {args.max_p99} ms")
+    if failed:
+        print("Тест не пройден: " + "; ".join(failed))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,7 +4,6 @@ from typing import ClassVar
 from pydantic import BaseModel, Field
 from myconstants import *
 from singleton import BaseModelSingletonMeta
-from filewatcher import *
 from abspath import abs_path
 
 # Pydantic модели конфигов
@@ -18,6 +17,8 @@ class NetworkConfig(BaseModel):
     port: int = Field(5000, description="Номер порта")
     path: str = Field("/meldict", description="URL путь")
     ssl: SSLConfig = Field(default_factory=SSLConfig, description="Настройки SSL")
+    workers: int = Field(1, ge=1, description="Количество рабочих процессов сервера; больше 1 - запуск под супервизором")
+    shutdown_timeout: float = Field(10.0, description="Время в секундах на завершение обработки запросов при остановке сервера")
 
 class DataConfig(BaseModel):
     upload_websounds: bool = Field(False, description="Флаг, указывающий на необходимость генерации и загрузки звуков в облачное хранилище навыка при запуске сервера")
@@ -32,6 +33,61 @@ class SkillConfig(BaseModel):
     id: str = Field("", description="Идентификатор навыка")
     oauth_token: str = Field("", description="OAuth токен для навыка")
 
+class ResponseConfig(BaseModel):
+    time_budget: float = Field(3.0, description="Бюджет времени на обработку запроса в секундах, после которого возвращается резервный ответ")
+    fast_json: bool = Field(False, description="Сериализовать ответы напрямую в JSON, без построения моделей pydantic")
+
+class MetricsConfig(BaseModel):
+    enabled: bool = Field(False, description="Включить HTTP-обработчик метрик в текстовом формате Prometheus")
+    path: str = Field("/metrics", description="URL путь обработчика метрик")
+
+class TracingConfig(BaseModel):
+    enabled: bool = Field(False, description="Включить выборочную трассировку запросов (применяется при запуске)")
+    sample_rate: float = Field(0.01, ge=0, le=1, description="Доля трассируемых запросов")
+    file: str = Field("logs/trace.json", description="Файл трасс в формате Chrome trace-event")
+    max_bytes: int = Field(10 * 1024 * 1024, description="Размер файла трасс, после которого начинается новый файл")
+    backup_count: int = Field(3, description="Количество хранимых предыдущих файлов трасс")
+
+class ProfilerConfig(BaseModel):
+    enabled: bool = Field(False, description="Разрешить запуск профилирования по сигналу SIGUSR1 и через обработчик path")
+    token: str = Field("", description="Токен администратора для обработчика профилирования; пустой - обработчик не добавляется")
+    path: str = Field("/admin/profile", description="URL путь обработчика профилирования")
+    seconds: float = Field(30.0, description="Длительность профилирования по умолчанию в секундах")
+    max_seconds: float = Field(300.0, description="Максимальная длительность профилирования в секундах")
+    interval: float = Field(0.005, gt=0, description="Интервал между выборками стека в секундах")
+    folder: str = Field("logs/profiles", description="Папка для файлов профилей")
+
+class StallWatcherConfig(BaseModel):
+    enabled: bool = Field(False, description="Включить обнаружение блокировок цикла событий")
+    threshold: float = Field(0.1, gt=0, description="Длительность блокировки в секундах, после которой записывается стек")
+    interval: float = Field(0.05, gt=0, description="Интервал отметок цикла событий в секундах")
+
+class SessionsConfig(BaseModel):
+    persist: bool = Field(True, description="Сохранять сессии при остановке сервера и восстанавливать их при запуске")
+    file: str = Field("data/sessions.json", description="Файл сохранённых сессий; рабочие процессы добавляют к имени свой номер")
+
+class ProgressConfig(BaseModel):
+    enabled: bool = Field(True, description="Сохранять прогресс пользователей (экзамены, точность по уровням, ошибки) в базе SQLite")
+    file: str = Field("data/progress.sqlite3", description="Файл базы прогресса пользователей")
+    flush_interval: float = Field(5.0, gt=0, description="Интервал записи накопленных изменений прогресса в базу в секундах")
+    max_users: int = Field(10000, ge=1, description="Количество пользователей, прогресс которых хранится в памяти процесса")
+
+class AdmissionConfig(BaseModel):
+    enabled: bool = Field(True, description="Отклонять запросы при перегрузке заранее построенным ответом")
+    max_requests: int = Field(64, ge=1, description="Количество запросов в обработке, начиная с которого отклоняются все запросы")
+    max_new_requests: int = Field(48, ge=0, description="Количество запросов в обработке, начиная с которого отклоняются новые сессии")
+    max_sessions: int = Field(50000, ge=1, description="Количество сессий в памяти процесса, начиная с которого отклоняются новые сессии")
+    sweep_interval: float = Field(60.0, gt=0, description="Интервал удаления неактивных сессий в секундах")
+
+class ReadinessConfig(BaseModel):
+    enabled: bool = Field(True, description="Включить HTTP-обработчик готовности сервера")
+    path: str = Field("/ready", description="URL путь обработчика готовности: 200 - готов, 503 - ещё запускается")
+
+class LoggingConfig(BaseModel):
+    queue_size: int = Field(10000, ge=0, description="Размер очереди записей лога; 0 - без ограничения")
+    block: bool = Field(False, description="При переполнении очереди ждать места (до block_timeout секунд), а не отбрасывать запись")
+    block_timeout: float = Field(1.0, gt=0, description="Максимальное ожидание места в очереди в секундах")
+
 class DebugConfig(BaseModel):
     enabled: bool = Field(False, description="Включить или отключить режим отладки уровней")
 
@@ -44,6 +100,16 @@ class Config(BaseModel, metaclass=BaseModelSingletonMeta):
     network: NetworkConfig = Field(description="Настройки сети")
     data: DataConfig = Field(description="Настройки данных")
     skill: SkillConfig = Field(description="Информация о навыке Алисы")
+    response: ResponseConfig = Field(default_factory=ResponseConfig, description="Настройки ответа на запросы")
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig, description="Настройки метрик")
+    tracing: TracingConfig = Field(default_factory=TracingConfig, description="Настройки трассировки запросов")
+    profiler: ProfilerConfig = Field(default_factory=ProfilerConfig, description="Настройки профилирования")
+    sessions: SessionsConfig = Field(default_factory=SessionsConfig, description="Настройки сохранения сессий при перезапуске")
+    progress: ProgressConfig = Field(default_factory=ProgressConfig, description="Настройки хранения прогресса пользователей")
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig, description="Настройки ограничения нагрузки")
+    readiness: ReadinessConfig = Field(default_factory=ReadinessConfig, description="Настройки обработчика готовности")
+    logging: LoggingConfig = Field(default_factory=LoggingConfig, description="Настройки очереди лога (применяются при запуске)")
+    stall_watcher: StallWatcherConfig = Field(default_factory=StallWatcherConfig, description="Настройки обнаружения блокировок цикла событий")
     debug: DebugConfig = Field(description="Настройки отладки")
 
     @property
@@ -63,8 +129,9 @@ class Config(BaseModel, metaclass=BaseModelSingletonMeta):
             with open(config_file, "r", encoding=UTF8) as file:
                 config_data = json.load(file)
 
-            instance = self(**config_data)
+            instance = self.create(**config_data)
             instance.__file = config_file
+            self.publish(instance)
             logging.info("Конфигурация загружена")
 
             return instance
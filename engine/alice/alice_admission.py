@@ -0,0 +1,108 @@
+import time
+import logging
+from collections.abc import Awaitable
+from typing import Any, Callable
+from aliceio.dispatcher.middlewares.base import BaseMiddleware
+from aliceio.fsm.context import FSMContext
+from aliceio.fsm.storage.memory import MemoryStorage
+from aliceio.types import AliceResponse, Response, TimeoutUpdate, Update
+from engine.alice.alice_metrics import set_handler
+from engine.alice.alice_sessions import sweep_sessions
+from metrics import metrics
+from config import Config
+from voicemenu import VoiceMenu
+
+class AdmissionMiddleware(BaseMiddleware[Update]):
+    """
+    Ограничение нагрузки: количество одновременно обрабатываемых запросов и сессий в памяти.
+
+    Запросы начатых сессий принимаются, пока в обработке меньше admission.max_requests запросов.
+    Новые сессии (и запросы неизвестных сессий, для которых будет создан движок) принимаются,
+    пока в обработке меньше admission.max_new_requests запросов и в памяти меньше
+    admission.max_sessions сессий: при перегрузке сначала отказывают новым пользователям,
+    а начатые диалоги и экзамены продолжаются. Отклонённый запрос не доходит до движка и получает
+    заранее построенный ответ: новая сессия - "попробуй позже" с завершением сессии,
+    начатая - просьбу повторить.
+
+    Раз в admission.sweep_interval секунд (и не чаще раза в секунду, когда достигнут предел сессий)
+    из хранилища удаляются неактивные сессии всех пользователей.
+    """
+    def __init__(self):
+        self.__inflight = 0
+        self.__sessions = 0 # точно после очистки, между очистками - с учётом принятых новых сессий
+        self.__swept = None # время последней очистки
+        self.__replies = dict[str, AliceResponse]()
+        self.__replies_vm: VoiceMenu = None
+
+    @property
+    def inflight(self) -> int: return self.__inflight
+
+    @property
+    def sessions(self) -> int: return self.__sessions
+
+    def reply(self, name: str) -> AliceResponse:
+        """Заранее построенный ответ отклонённому запросу; перестраивается при перезагрузке голосового меню."""
+        vm = VoiceMenu()
+        if vm is not self.__replies_vm:
+            self.__replies = dict()
+            self.__replies_vm = vm
+
+        response = self.__replies.get(name)
+        if response is None:
+            text, tts = getattr(vm.root, name)()
+            response = AliceResponse(response=Response(text=text, tts=tts, end_session=name == "try_later"))
+            self.__replies[name] = response
+        return response
+
+    def sweep(self, storage: MemoryStorage):
+        alive, evicted = sweep_sessions(storage)
+        self.__sessions = alive
+        self.__swept = time.monotonic()
+        metrics.sessions_evicted.inc(evicted)
+        metrics.sessions_active.set(alive)
+        if evicted > 0:
+            logging.info(f"Удалено неактивных сессий: {evicted}, в памяти: {alive}")
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, TimeoutUpdate):
+            return await handler(event, data)
+
+        config = Config().admission
+        storage = data.get("fsm_storage")
+        if isinstance(storage, MemoryStorage):
+            elapsed = time.monotonic() - self.__swept if self.__swept is not None else None
+            if elapsed is None or elapsed >= config.sweep_interval or (self.__sessions >= config.max_sessions and elapsed >= 1.0):
+                self.sweep(storage)
+
+        state: FSMContext = data.get("state")
+        started = not event.session.new and state is not None and await state.get_value(event.session.session_id) is not None
+
+        if config.enabled:
+            reason = None
+            if self.__inflight >= config.max_requests:
+                reason = "requests"
+            elif not started and self.__inflight >= config.max_new_requests:
+                reason = "new_requests"
+            elif not started and self.__sessions >= config.max_sessions:
+                reason = "sessions"
+
+            if reason:
+                metrics.admission_shed.labels(reason, "started" if started else "new").inc()
+                set_handler("shed")
+                return self.reply("too_slow" if started else "try_later")
+
+        if not started:
+            self.__sessions += 1 # метрика sessions_active меняется при создании сессии (get_engine)
+
+        self.__inflight += 1
+        metrics.requests_inflight.set(self.__inflight)
+        try:
+            return await handler(event, data)
+        finally:
+            self.__inflight -= 1
+            metrics.requests_inflight.set(self.__inflight)
@@ -0,0 +1,79 @@
+import asyncio
+import functools
+import logging
+import time
+from collections.abc import Callable, Awaitable
+from typing import Any
+from aliceio.types import AliceResponse, Response
+from config import Config
+from voicemenu import VoiceMenu
+from resources import registry
+from metrics import metrics
+from engine.alice.alice_metrics import request_labels
+
+class ResponseBudget:
+    """
+    Декоратор обработчиков, ограничивающий время ответа.
+
+    Если обработчик не успел ответить за отведённый бюджет, он отменяется и возвращается заранее
+    построенный резервный ответ. Обработчик можно прервать только в точке ожидания, а все ожидания
+    (хранилище сессий в get_engine) выполняются до изменения движка, поэтому отменённый обработчик
+    не меняет сессию: пользователь не услышал ответ, и следующий ход судится по прежнему заданию.
+    Бюджет применяется один раз на запрос (route_message и button_pressed_handler). Время, превышения
+    и резервные ответы учитываются в метриках meldict_handler_seconds, meldict_handler_overruns и
+    meldict_handler_fallbacks по обработчику, выбранному для запроса. Бюджет берётся из Config().response.time_budget,
+    если не задан явно.
+    """
+    def __init__(self, budget: float = None):
+        self.__budget = budget
+        self.__fallback: AliceResponse = None
+        self.__fallback_vm: VoiceMenu = None
+
+    @property
+    def budget(self) -> float:
+        return self.__budget if self.__budget is not None else Config().response.time_budget
+
+    @property
+    def fallback(self) -> AliceResponse:
+        # берётся последнее опубликованное голосовое меню, а не захваченное запросом, который не успел ответить
+        vm = registry.current.get(VoiceMenu)
+        if self.__fallback is None or vm is not self.__fallback_vm:
+            text, tts = vm.root.too_slow() if vm else ("", "")
+            self.__fallback = AliceResponse(response=Response(text=text, tts=tts, end_session=False))
+            self.__fallback_vm = vm
+        return self.__fallback
+
+    def is_fallback(self, response: Any) -> bool:
+        """Является ли response резервным ответом, который вернул этот декоратор."""
+        return response is not None and response is self.__fallback
+
+    def __call__(self, handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            budget = self.budget
+            start = time.perf_counter()
+            try:
+                # по таймауту обработчик отменяется; если он успел завершиться, возвращается его ответ
+                response = await asyncio.wait_for(handler(*args, **kwargs), budget)
+            except TimeoutError:
+                name = self.__handler_name(handler)
+                metrics.handler_seconds.labels(name).observe(time.perf_counter() - start)
+                metrics.handler_fallbacks.labels(name).inc()
+                logging.warning(f"Обработчик {name} не уложился в {budget * 1000:.0f} мс и отменён, отправлен резервный ответ")
+                return self.fallback
+
+            duration = time.perf_counter() - start
+            name = self.__handler_name(handler)
+            metrics.handler_seconds.labels(name).observe(duration)
+            if duration > budget:
+                metrics.handler_overruns.labels(name).inc()
+                logging.warning(f"Обработчик {name} превысил бюджет времени: {duration * 1000:.0f} мс")
+            return response
+
+        return wrapper
+
+    @staticmethod
+    def __handler_name(handler: Callable) -> str:
+        # обработчик, выбранный для запроса (set_handler), виден и после задачи wait_for
+        labels = request_labels.get(None)
+        return labels.handler if labels is not None and labels.handler != "none" else handler.__name__
@@ -1,16 +1,30 @@
 from typing import Iterable
-from aliceio.types import AliceResponse, Response, Message, TextButton
+from aliceio.types import Message, TextButton
 from engine.alice.alice_websounds import AliceWebSounds
+from engine.alice.alice_response import create_alice_response
+from engine.buttonsets import ButtonSets
 from engine.musicnotesequence import MusicNoteSequence
 from engine.meldictengine import MelDictEngine
 from engine.levels.base_level import MelDictLevelBase
-from myfilters import CmdFilter
+from myfilters import CmdTable
 from myconstants import *
 from voicemenu import VoiceMenu
 
 class AliceEngine(MelDictEngine):
-    def __init__(self, skill_id):
-        super().__init__(skill_id)
+    # выбор режима в основном меню по слоту mode интента menu_select
+    _menu_commands = CmdTable(
+        (GameMode.DEMO, ("демо", "продемонстрир")),
+        (GameMode.TRAIN_MENU, ("трениро", "потренир")),
+        (GameMode.EXAM, "экзамен"))
+
+    # выбор уровня в меню тренировки
+    _train_menu_commands = CmdTable(
+        (LevelId.MISSED_NOTE, ("пропущенн", "1"), ("нет", "не")),
+        (LevelId.PRIMA_LOCATION, ("тоник", "2"), ("нет", "не", "тонир", "тонал")),
+        (LevelId.CADENCE, ("каденци", "3"), ("нет", "не")))
+
+    def __init__(self, skill_id, seed: int = None):
+        super().__init__(skill_id, seed)
 
         self.__hamster = False
 
@@ -19,6 +33,13 @@ class AliceEngine(MelDictEngine):
     @hamster.setter
     def hamster(self, value: bool): self.__hamster = value
 
+    def dump_state(self) -> list:
+        return super().dump_state() + [self.__hamster]
+
+    def load_state(self, state: list):
+        super().load_state(state)
+        self.__hamster = state[5]
+
     def _is_help_button(self, button: TextButton) -> bool:
         return button and button.payload and button.payload.get("help", False) == True
 
@@ -39,40 +60,31 @@ class AliceEngine(MelDictEngine):
 
     def get_buttons(self) -> Iterable[TextButton]:
         level = None
-        vm = VoiceMenu()
+        buttons = ButtonSets.of(VoiceMenu())
         back_mode = GameMode.MENU
-        set_mode_key = "set_mode"
 
         match self.mode:
-            case GameMode.DEMO:
-                level = self._demo_level
+            case GameMode.DEMO | GameMode.EXAM:
+                level = self._current_level
             case GameMode.TRAIN:
                 level = self._current_level
                 back_mode = GameMode.TRAIN_MENU
-            case GameMode.EXAM:
-                level = self._exam
 
             case GameMode.MENU | GameMode.INIT:
                 back_mode = None
-                yield TextButton(title=vm.levels.demo.name.text, payload={ set_mode_key: GameMode.DEMO })
-                yield TextButton(title=vm.main_menu.train_menu.button, payload={ set_mode_key: GameMode.TRAIN_MENU })
-                yield TextButton(title=vm.levels.exam.name.text, payload={ set_mode_key: GameMode.EXAM })
+                yield from buttons.main_menu
 
             case GameMode.TRAIN_MENU:
-                set_level_key = "set_level"
-                yield TextButton(title=vm.levels.missed_note.name.text, payload={ set_level_key: self._missed_note_level.id })
-                yield TextButton(title=vm.levels.prima_location.name.text, payload={ set_level_key: self._prima_loc_level.id })
-                yield TextButton(title=vm.levels.cadence.name.text, payload={ set_level_key: self._cadence_level.id })
+                yield from buttons.train_menu
 
         if level and not level.finished:
-            for btn in level.get_buttons():
-                yield btn
-            yield TextButton(title=vm.root.repeat_buttons().text, payload={ "repeat": True })
+            yield from level.get_buttons()
+            yield buttons.repeat(self.rng)
         elif not level:
-            yield TextButton(title=vm.main_menu.rules.button, payload={ "help": True })
+            yield buttons.help
 
         if back_mode is not None:
-            yield TextButton(title=vm.root.back_buttons().text, payload={ set_mode_key: back_mode })
+            yield buttons.back(back_mode, self.rng)
 
     def process_user_reply(self, message: Message = None, mode_str: str = None) -> tuple[str, str]:
         self._assert_mode()
@@ -81,21 +93,11 @@ class AliceEngine(MelDictEngine):
 
         match self.mode:
             case GameMode.MENU:
-                if mode_str:
-                    if CmdFilter.passed(mode_str, ("демо", "продемонстрир")):
-                        new_mode = GameMode.DEMO
-                    elif CmdFilter.passed(mode_str, ("трениро", "потренир")):
-                        new_mode = GameMode.TRAIN_MENU
-                    elif CmdFilter.passed(mode_str, "экзамен"):
-                        new_mode = GameMode.EXAM
+                new_mode = AliceEngine._menu_commands.select(mode_str)
 
             case GameMode.TRAIN_MENU:
-                if CmdFilter.passed(message.command, ("пропущенн", "1"), exclude=("нет", "не", )):
-                    new_level_id = self._missed_note_level.id
-                elif CmdFilter.passed(message.command, ("тоник", "2"), exclude=("нет", "не", "тонир", "тонал")):
-                    new_level_id = self._prima_loc_level.id
-                elif message and CmdFilter.passed(message.command, ("каденци", "3"), exclude=("нет", "не", )):
-                    new_level_id = self._cadence_level.id
+                if message:
+                    new_level_id = AliceEngine._train_menu_commands.select(message.command)
 
         return self.__process_action(
             new_mode=new_mode,
@@ -137,28 +139,18 @@ class AliceEngine(MelDictEngine):
                 if new_mode: # нажата кнопка назад из меню тренировки
                     return self.get_reply()
 
-            case GameMode.DEMO: level = self._demo_level
-            case GameMode.TRAIN: level = self._current_level
-            case GameMode.EXAM: level = self._exam
+            case GameMode.DEMO | GameMode.TRAIN | GameMode.EXAM:
+                level = self._current_level
 
             case GameMode.TRAIN_MENU:
-                if new_level_id == self._missed_note_level.id:
-                    level = self._missed_note_level
-                elif new_level_id == self._prima_loc_level.id:
-                    level = self._prima_loc_level
-                elif new_level_id == self._cadence_level.id:
-                    level = self._cadence_level
-                elif new_mode: # нажата кнопка назад из уровня
+                level = self.select_train_level(new_level_id)
+                if level is None and new_mode: # нажата кнопка назад из уровня
                     return self.get_reply()
 
-                if level:
-                    self.mode = GameMode.TRAIN
-                    self._current_level = level
-
         text = tts = None
 
         if level is None:
-            text, tts = VoiceMenu().root.dont_understand()
+            text, tts = VoiceMenu().root.dont_understand(self.rng)
             return text, tts
 
         if new_level_id or new_mode: # уровень только что выбран
@@ -174,9 +166,9 @@ class AliceEngine(MelDictEngine):
 
             match self.mode:
                 case GameMode.DEMO | GameMode.TRAIN:
-                    complete_text, complete_tts = vm.root.level_complete()
+                    complete_text, complete_tts = vm.root.level_complete(self.rng)
                 case GameMode.EXAM:
-                    complete_text, complete_tts = vm.root.exam_complete()
+                    complete_text, complete_tts = vm.root.exam_complete(self.rng)
                     stat_text, stat_tts = level.get_stats_reply()
 
             self.mode = GameMode.MENU
@@ -187,17 +179,12 @@ class AliceEngine(MelDictEngine):
         return text, tts
 
     def get_audio_tag(self, nsf: str | MusicNoteSequence) -> str:
-        cloud_id = AliceWebSounds().get_cloud_id(nsf)
-        return f'<speaker audio="dialogs-upload/{self.skill_id}/{cloud_id}.opus">' if cloud_id else ""
+        return AliceWebSounds().get_audio_tag(nsf, self.skill_id)
 
     def get_hamster_tag(self) -> str:
         return "<speaker effect=\"hamster\">" if self.hamster else None
 
     def create_response(self, text: str, tts: str, end_session: bool = False):
-        buttons = None if end_session else list(self.get_buttons())
-
-        return AliceResponse(
-            response=Response(text=text,
-                              tts=self.format_tts(self.get_hamster_tag(), tts, sep=""),
-                              end_session=end_session,
-                              buttons=buttons))
\ No newline at end of file
+        buttons = None if end_session else tuple(self.get_buttons())
+        tts = self.format_tts(self.get_hamster_tag(), tts, sep="")
+        return create_alice_response(text, tts, buttons, end_session)
\ No newline at end of file
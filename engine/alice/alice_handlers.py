@@ -2,11 +2,23 @@ import threading
 import logging
 import time
 import traceback as tb
-from aliceio import Dispatcher, F, Skill
+from aliceio import Dispatcher, Skill
 from aliceio.fsm.context import FSMContext
-from aliceio.types import AliceResponse, Response, ErrorEvent, Message, TextButton
+from aliceio.types import AliceResponse, ErrorEvent, Message, TextButton
 from engine.alice.alice_engine import AliceEngine
 from engine.alice.alice_websounds import AliceWebSounds
+from engine.alice.alice_replay_cache import ReplayCacheMiddleware
+from engine.alice.alice_budget import ResponseBudget
+from engine.alice.alice_intents import IntentRouter
+from engine.alice.alice_response import FastResponse, FastResponseConvertMiddleware, create_alice_response
+from engine.alice.alice_metrics import MetricsMiddleware, set_handler, set_mode
+from engine.alice.alice_snapshot import SnapshotMiddleware
+from engine.alice.alice_admission import AdmissionMiddleware
+from engine.alice.alice_sessions import SESSION_TTL
+from engine.buttonsets import ButtonSets
+from engine.progressdb import progress_db
+from metrics import metrics
+from startup import startup
 from config import Config
 from voicemenu import VoiceMenu
 from myconstants import *
@@ -14,6 +26,30 @@ from myconstants import *
 dispatcher = Dispatcher()
 rlock = threading.RLock()
 
+# запрос обрабатывается с одним поколением конфигурации, голосового меню и баз, захваченным на входе
+dispatcher.update.outer_middleware(SnapshotMiddleware())
+
+# ответы FastResponse (response.fast_json) передаются обработчику запросов без преобразования в AliceResponse
+FastResponseConvertMiddleware.install(dispatcher)
+
+# количество и время обработки запросов по обработчикам и режимам игры, включая повторы из кэша
+dispatcher.update.outer_middleware(MetricsMiddleware())
+
+# ограничение количества запросов в обработке и сессий в памяти, начатые сессии в приоритете
+admission = AdmissionMiddleware()
+dispatcher.update.outer_middleware(admission)
+
+# ограничение времени ответа: один раз на запрос, для сообщений (route_message) и нажатий кнопок
+response_budget = ResponseBudget()
+
+# повторные запросы платформы (после таймаута) не должны заново обрабатываться движком;
+# резервный ответ по бюджету времени не сохраняется
+replay_cache = ReplayCacheMiddleware(budget=response_budget)
+dispatcher.update.outer_middleware(replay_cache)
+
+# таблица обработчиков сообщений по интентам, заменяет цепочку magic-фильтров
+intents = IntentRouter()
+
 def format_error(text: str, e: Exception) -> str:
     if Config().debug.enabled:
         debug = "\n".join(tb.format_exception(e))
@@ -23,9 +59,15 @@ def format_error(text: str, e: Exception) -> str:
 
     return text
 
-def create_response(text: str, tts: str, engine: AliceEngine, end_session: bool = False) -> AliceResponse:
+def create_response(text: str, tts: str, engine: AliceEngine, end_session: bool = False) -> AliceResponse | FastResponse:
+    if engine:
+        set_mode(engine.mode)
+        # ответ отправляется: ResponseBudget возвращает ответ завершившегося обработчика, а повторы
+        # и отклонённые запросы до обработчика не доходят
+        engine.end_turn()
+
     return engine.create_response(text, tts, end_session) if engine \
-        else AliceResponse(response=Response(text=text, tts=tts, end_session=end_session))
+        else create_alice_response(text, tts, end_session=end_session)
 
 async def get_engine(skill_id: str, session_id: str, state: FSMContext, force_create: bool = False) -> AliceEngine:
         engine = None
@@ -33,30 +75,42 @@ async def get_engine(skill_id: str, session_id: str, state: FSMContext, force_cr
         if force_create:
             engine = AliceEngine(skill_id)
             engine.mode = GameMode.INIT
+            logging.debug(f"Новая сессия {session_id}: seed {engine.seed}")
 
+            created = await state.get_value(session_id) is None # повторный запрос новой сессии заменяет её движок
             session_data = await state.update_data({ session_id: (engine, time.time()) })
             now = time.time()
             remove = list()
 
             for key, value in session_data.items():
-                if key != session_id and now - value[1] >= 600: # последняя активность 10 минут назад и более
+                if key != session_id and now - value[1] >= SESSION_TTL: # последняя активность 10 минут назад и более
                   remove.append(key)
 
-            with rlock:
-                for key in remove:
-                    session_data.pop(key)
+            if remove:
+                with rlock:
+                    for key in remove:
+                        session_data.pop(key)
+                await state.set_data(session_data) # хранилище возвращает копию данных
+
+            metrics.sessions_evicted.inc(len(remove))
+            metrics.sessions_active.inc(int(created) - len(remove))
         else:
-            session_data = await state.get_data()
-            v = session_data.get(session_id)
+            v = await state.get_value(session_id)
             if v:
                 engine = v[0]
-                with rlock: session_data[session_id] = (engine, time.time()) # сброс времени последней активности
+                await state.update_data({ session_id: (engine, time.time()) }) # сброс времени последней активности
 
+        # все ожидания выше: обработчик, отменённый ResponseBudget, не доходит до изменения движка
+        if engine:
+            if engine.progress is None: # новая или восстановленная после перезапуска сессия
+                engine.progress = progress_db.get(state.key.user_id)
+            engine.begin_turn()
         return engine
 
 
 @dispatcher.error()
 async def error_handler(event: ErrorEvent):
+    set_handler("error_handler")
     logging.error(event.update, exc_info=event.exception)
     text, tts = VoiceMenu().root.something_went_wrong()
     text = format_error(text, event.exception)
@@ -64,24 +118,50 @@ async def error_handler(event: ErrorEvent):
     return create_response(text, tts, None)
 
 
+async def upload_websounds(skill: Skill):
+    """
+    Загружает звуки в навык и сохраняет базу их облачных идентификаторов. Новую базу
+    подхватывает наблюдатель файлов (см. main.start_watchers).
+    """
+    status = await skill.status()
+
+    if status.images.quota.total > 0 and status.sounds.quota.total > 0:
+        img_used = status.images.quota.used / status.images.quota.total * 100
+        snd_used = status.sounds.quota.used / status.sounds.quota.total * 100
+        logging.info(f"Квоты Алисы: использовано {img_used:.1f}% изображений, {snd_used:.1f}% звуков")
+    await AliceWebSounds.upload_websounds(skill)
+
+
+def warm_up(skill_id: str):
+    """
+    Подготовка до приёма запросов: построение кнопок и тегов <speaker> всех звуков. База облачных
+    идентификаторов звуков загружается при запуске (main) до fork рабочих процессов, а шаблоны
+    реплик разбираются при загрузке голосового меню.
+    """
+    ButtonSets.of(VoiceMenu())
+    AliceWebSounds().audio_tags(skill_id)
+
+
+# сервер готов, когда выполнен прогрев и загружена база облачных идентификаторов звуков
+# (если звуки генерируются и загружаются при запуске, до этого ответы остались бы без звука);
+# база прошлого запуска годится: прежние звуки удаляются только после загрузки новых и сохранения их базы
+startup.add_check("warmup", lambda: "warmup" in startup.phases)
+startup.add_check("websounds", lambda: AliceWebSounds().loaded or not Config().data.upload_websounds)
+
+
 @dispatcher.startup()
 async def on_startup(skill: Skill, dispatcher: Dispatcher) -> None:
+    # выполняется до того, как сервер начинает принимать соединения
     try:
-        if Config().data.upload_websounds == True:
-            status = await skill.status()
-
-            if status.images.quota.total > 0 and status.sounds.quota.total > 0:
-                img_used = status.images.quota.used / status.images.quota.total * 100
-                snd_used = status.sounds.quota.used / status.sounds.quota.total * 100
-                logging.info(f"Квоты Алисы: использовано {img_used:.1f}% изображений, {snd_used:.1f}% звуков")
-            await AliceWebSounds.upload_websounds(skill)
-
-        # загрузка базы облачных идентификаторов звуков
-        AliceWebSounds.load()
+        with startup.phase("warmup"):
+            warm_up(skill.id)
     except Exception as e:
         logging.error("Ошибка во время запуска навыка", exc_info=e)
 
-@dispatcher.message(F.session.new)
+    if not startup.ready():
+        logging.info("Сервер принимает запросы, но ещё не готов: ожидается база облачных идентификаторов звуков")
+
+@intents.new_session
 async def start_session(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -97,7 +177,7 @@ async def start_session(message: Message, state: FSMContext) -> AliceResponse:
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["menu_open"])
+@intents.intent("menu_open")
 async def menu_message_handler(message: Message, state: FSMContext, engine: AliceEngine = None) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -117,7 +197,7 @@ async def menu_message_handler(message: Message, state: FSMContext, engine: Alic
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["menu_select"], F.nlu.intents["menu_select"]["slots"]["mode"]["value"].as_("mode"))
+@intents.intent("menu_select", "mode")
 async def mode_message_handler(message: Message, state: FSMContext, mode: str) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -136,7 +216,7 @@ async def mode_message_handler(message: Message, state: FSMContext, mode: str) -
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["back"])
+@intents.intent("back")
 async def back_message_handler(message: Message, state: FSMContext, engine: AliceEngine = None) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -155,7 +235,7 @@ async def back_message_handler(message: Message, state: FSMContext, engine: Alic
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["stats"])
+@intents.intent("stats")
 async def stats_message_handler(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -174,7 +254,7 @@ async def stats_message_handler(message: Message, state: FSMContext) -> AliceRes
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["rules"])
+@intents.intent("rules")
 async def rules_message_handler(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -193,7 +273,7 @@ async def rules_message_handler(message: Message, state: FSMContext) -> AliceRes
     return create_response(text, tts, engine)
 
 
-@dispatcher.message(F.nlu.intents["finish"])
+@intents.intent("finish")
 async def finish_message_handler(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -203,7 +283,7 @@ async def finish_message_handler(message: Message, state: FSMContext) -> AliceRe
         if engine and engine.mode > GameMode.MENU:
             return await back_message_handler(message, state, engine=engine)
 
-        text, tts = VoiceMenu().root.byebye()
+        text, tts = VoiceMenu().root.byebye(engine.rng if engine else None)
     except Exception as e:
         logging.error(message, exc_info=e)
         text, tts = VoiceMenu().root.something_went_wrong()
@@ -212,7 +292,7 @@ async def finish_message_handler(message: Message, state: FSMContext) -> AliceRe
     return create_response(text, tts, engine, end_session=True)
 
 
-@dispatcher.message(F.nlu.intents["hamster"])
+@intents.intent("hamster")
 async def hamster_handler(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -224,7 +304,7 @@ async def hamster_handler(message: Message, state: FSMContext) -> AliceResponse:
 
         slots = message.nlu.intents["hamster"].get("slots")
         engine.hamster = slots.get("not") is None if slots else True
-        text, tts = VoiceMenu().root.hamster_on() if engine.hamster else VoiceMenu().root.hamster_off()
+        text, tts = VoiceMenu().root.hamster_on(engine.rng) if engine.hamster else VoiceMenu().root.hamster_off(engine.rng)
     except Exception as e:
         logging.error(message, exc_info=e)
         text, tts = VoiceMenu().root.something_went_wrong()
@@ -233,7 +313,7 @@ async def hamster_handler(message: Message, state: FSMContext) -> AliceResponse:
     return create_response(text, tts, engine)
 
 
-@dispatcher.message()
+@intents.default
 async def message_handler(message: Message, state: FSMContext) -> AliceResponse:
     text = tts = ""
     engine = None
@@ -254,8 +334,18 @@ async def message_handler(message: Message, state: FSMContext) -> AliceResponse:
     return create_response(text, tts, engine)
 
 
+@dispatcher.message()
+@response_budget
+async def route_message(message: Message, state: FSMContext) -> AliceResponse:
+    handler, slots = intents.resolve(message)
+    set_handler(handler.__name__)
+    return await handler(message, state, **slots)
+
+
 @dispatcher.button_pressed()
+@response_budget
 async def button_pressed_handler(button: TextButton, state: FSMContext) -> AliceResponse:
+    set_handler("button_pressed_handler")
     text = tts = ""
     engine = None
 
@@ -263,9 +353,9 @@ async def button_pressed_handler(button: TextButton, state: FSMContext) -> Alice
         engine = await get_engine(button.skill.id, button.session.session_id, state)
         if engine is None: # сообщение пришло без создания сессии
             engine = await get_engine(button.skill.id, button.session.session_id, state, True)
-            return engine.get_reply()
-
-        text, tts = engine.process_button_pressed(button)
+            text, tts = engine.get_reply()
+        else:
+            text, tts = engine.process_button_pressed(button)
     except Exception as e:
         logging.error(button, exc_info=e)
         text, tts = VoiceMenu().root.something_went_wrong()
@@ -0,0 +1,79 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+from aliceio.types import Message
+
+Handler = Callable[..., Awaitable[Any]]
+
+class IntentRouter:
+    """
+    Таблица маршрутизации сообщений по интентам.
+
+    Вместо последовательной проверки magic-фильтров aliceio обработчик выбирается за один проход
+    по ключам message.nlu.intents: каждый ключ ищется в словаре маршрутов, и из найденных
+    берётся маршрут, зарегистрированный раньше других, для которого нашлись все обязательные слоты.
+    Значения слотов передаются в обработчик именованными аргументами.
+    """
+    def __init__(self):
+        self.__routes = dict[str, tuple[int, Handler, tuple[str, ...]]]()
+        self.__new_session: Handler = None
+        self.__default: Handler = None
+
+    def new_session(self, handler: Handler) -> Handler:
+        """Регистрирует обработчик первого сообщения сессии."""
+        self.__new_session = handler
+        return handler
+
+    def intent(self, name: str, *slots: str) -> Callable[[Handler], Handler]:
+        """Регистрирует обработчик интента; slots - обязательные слоты интента."""
+        assert name and name not in self.__routes
+
+        def decorator(handler: Handler) -> Handler:
+            self.__routes[name] = (len(self.__routes), handler, slots)
+            return handler
+
+        return decorator
+
+    def default(self, handler: Handler) -> Handler:
+        """Регистрирует обработчик сообщений без распознанных интентов."""
+        self.__default = handler
+        return handler
+
+    def resolve(self, message: Message) -> tuple[Handler, dict[str, Any]]:
+        """Возвращает обработчик сообщения и извлечённые значения слотов."""
+        if message.session.new and self.__new_session:
+            return self.__new_session, {}
+
+        intents = message.nlu.intents if message.nlu else None
+        priority = handler = values = None
+
+        if intents:
+            for name, intent in intents.items():
+                route = self.__routes.get(name)
+                if route is None or (priority is not None and route[0] >= priority):
+                    continue
+
+                route_values = IntentRouter.__extract_slots(intent, route[2])
+                if route_values is not None:
+                    priority, handler, _ = route
+                    values = route_values
+
+        return (handler, values) if handler else (self.__default, {})
+
+    @staticmethod
+    def __extract_slots(intent: dict[str, Any], slots: tuple[str, ...]) -> dict[str, Any]:
+        if not slots:
+            return {}
+
+        intent_slots = intent.get("slots") if isinstance(intent, dict) else None
+        if not intent_slots:
+            return None
+
+        values = dict[str, Any]()
+        for slot in slots:
+            value = intent_slots.get(slot)
+            value = value.get("value") if isinstance(value, dict) else None
+            if value is None:
+                return None
+            values[slot] = value
+
+        return values
@@ -0,0 +1,56 @@
+import time
+from contextvars import ContextVar
+from collections.abc import Awaitable
+from typing import Any, Callable
+from aliceio.dispatcher.middlewares.base import BaseMiddleware
+from aliceio.types import Update
+from metrics import metrics, MODE_NAMES
+
+class RequestLabels:
+    """Метки запроса, которые становятся известны только во время его обработки."""
+    __slots__ = ("handler", "mode")
+
+    def __init__(self):
+        self.handler = "none"
+        self.mode = "none"
+
+
+request_labels = ContextVar[RequestLabels]("request_labels")
+
+def set_handler(name: str):
+    """Запоминает обработчик текущего запроса. Учитывается первый выбранный обработчик."""
+    labels = request_labels.get(None)
+    if labels is not None and labels.handler == "none":
+        labels.handler = name
+
+def set_mode(mode: int):
+    """Запоминает режим игры, в котором построен ответ на текущий запрос."""
+    labels = request_labels.get(None)
+    if labels is not None:
+        labels.mode = MODE_NAMES.get(mode, "unknown")
+
+
+class MetricsMiddleware(BaseMiddleware[Update]):
+    """
+    Учитывает количество и время обработки запросов по обработчику и режиму игры.
+
+    Обработчик и режим записываются в RequestLabels во время обработки (set_handler, set_mode):
+    объект общий для задач, запущенных из запроса, поэтому метки видны и после ResponseBudget.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        labels = RequestLabels()
+        token = request_labels.set(labels)
+        start = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.perf_counter() - start
+            request_labels.reset(token)
+            metrics.requests.labels(labels.handler, labels.mode).inc()
+            metrics.request_seconds.labels(labels.handler, labels.mode).observe(duration)
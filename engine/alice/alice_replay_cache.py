@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from collections.abc import Awaitable
+from typing import Any, Callable
+from aliceio.dispatcher.middlewares.base import BaseMiddleware
+from aliceio.types import TimeoutUpdate, Update
+from engine.alice.alice_metrics import set_handler
+from engine.alice.alice_budget import ResponseBudget
+
+class ReplayCacheMiddleware(BaseMiddleware[Update]):
+    """
+    Возвращает ранее построенный ответ на запрос, повторно присланный платформой.
+
+    Запросы различаются по паре (session_id, message_id). Повтор, пришедший пока исходный
+    запрос ещё обрабатывается, дожидается его ответа, а не запускает движок второй раз.
+    Резервный ответ budget не сохраняется: обработчик отменён и сессию не изменил,
+    поэтому повтор после него обрабатывается заново.
+    """
+    def __init__(self, max_size: int = 1024, budget: ResponseBudget = None):
+        assert max_size > 0
+        self.__max_size = max_size
+        self.__budget = budget
+        self.__responses = OrderedDict[tuple[str, int], asyncio.Future]()
+        self.__hits = 0
+
+    @property
+    def hits(self) -> int: return self.__hits
+
+    def __len__(self):
+        return len(self.__responses)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, TimeoutUpdate): # ответ по таймауту не кэшируется
+            return await handler(event, data)
+
+        key = (event.session.session_id, event.session.message_id)
+        future = self.__responses.get(key)
+
+        if future is not None:
+            self.__responses.move_to_end(key)
+            self.__hits += 1
+            set_handler("replay")
+            logging.info(f"Повторный запрос session_id={key[0]}, message_id={key[1]}: возвращается сохранённый ответ")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.__responses[key] = future
+        if len(self.__responses) > self.__max_size:
+            self.__responses.popitem(last=False)
+
+        try:
+            response = await handler(event, data)
+        except BaseException as e:
+            # неудачный ответ не сохраняем, чтобы повтор обработался заново
+            if self.__responses.get(key) is future:
+                self.__responses.pop(key)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception() # исключение получено, asyncio не будет о нём предупреждать
+            raise
+
+        if self.__budget is not None and self.__budget.is_fallback(response) and self.__responses.get(key) is future:
+            self.__responses.pop(key)
+        future.set_result(response) # одновременные повторы получают тот же ответ
+        return response
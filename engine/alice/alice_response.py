@@ -0,0 +1,140 @@
+import json
+from collections.abc import Iterable
+from typing import Any, Optional
+from aiohttp import JsonPayload
+from aliceio import Dispatcher
+from aliceio.dispatcher.middlewares.response_convert import ResponseConvertMiddleware
+from aliceio.types import AliceResponse, Response, TextButton
+from aliceio.types.base import AliceObject
+from aliceio.utils.funcs import prepare_value
+from aliceio.webhook.aiohttp_server import OneSkillAiohttpRequestHandler
+from aliceio.webhook.yandex_functions import OneSkillYandexFunctionsRequestHandler
+from engine.buttonsets import FrozenTextButton
+from config import Config
+
+class FastResponse:
+    """
+    Ответ навыка, который сериализуется без построения и валидации моделей pydantic.
+
+    JSON собирается из текста, TTS и заранее сериализованных кнопок FrozenTextButton и побайтно
+    совпадает с тем, что aliceio строит из AliceResponse с теми же полями (порядок ключей,
+    null для незаданных полей, экранирование json.dumps). Отправлять такой ответ умеют только
+    обработчики запросов FastAiohttpRequestHandler и FastYandexFunctionsRequestHandler.
+
+    Валидация pydantic при этом пропускается: типы полей не проверяются и не приводятся, а длина
+    text и tts (ограничение платформы - 1024 символа) не проверяется. Корректность значений
+    обеспечивает вызывающий код, как и при AliceResponse, который эти ограничения тоже не проверяет.
+    """
+    __slots__ = ("__text", "__tts", "__buttons", "__end_session")
+
+    def __init__(self, text: str, tts: str = None, buttons: Iterable[TextButton] = None, end_session: bool = False):
+        self.__text = text
+        self.__tts = tts
+        self.__buttons = tuple(buttons) if buttons is not None else None
+        self.__end_session = end_session == True
+
+    @property
+    def text(self) -> str: return self.__text
+
+    @property
+    def tts(self) -> str: return self.__tts
+
+    @property
+    def buttons(self) -> tuple[TextButton, ...]: return self.__buttons
+
+    @property
+    def end_session(self) -> bool: return self.__end_session
+
+    def to_model(self) -> AliceResponse:
+        return AliceResponse(response=Response(text=self.__text, tts=self.__tts, end_session=self.__end_session,
+                                               buttons=list(self.__buttons) if self.__buttons is not None else None))
+
+    def to_json(self) -> str:
+        """Возвращает то же, что json.dumps(prepare_value(AliceResponse)) в aiohttp-обработчике aliceio."""
+        buttons = "null" if self.__buttons is None \
+            else f"[{', '.join(FastResponse.__button_json(button) for button in self.__buttons)}]"
+
+        return f'{{"response": {{"text": {json.dumps(self.__text)}, "tts": {json.dumps(self.__tts)}, ' \
+               f'"card": null, "buttons": {buttons}, "directives": null, "show_item_meta": null, ' \
+               f'"should_listen": null, "end_session": {"true" if self.__end_session else "false"}}}, ' \
+               f'"session_state": null, "user_state_update": null, "application_state": null, ' \
+               f'"analytics": null, "version": "1.0"}}'
+
+    def to_dict(self) -> dict[str, Any]:
+        """Возвращает то же, что prepare_value(AliceResponse.model_dump()) в обработчике Яндекс Функции."""
+        buttons = None if self.__buttons is None \
+            else [FastResponse.__button_dict(button) for button in self.__buttons]
+
+        return {
+            "response": {
+                "text": self.__text,
+                "tts": self.__tts,
+                "card": None,
+                "buttons": buttons,
+                "directives": None,
+                "show_item_meta": None,
+                "should_listen": None,
+                "end_session": self.__end_session
+            },
+            "session_state": None,
+            "user_state_update": None,
+            "application_state": None,
+            "analytics": None,
+            "version": "1.0"
+        }
+
+    @staticmethod
+    def __button_json(button: TextButton) -> str:
+        return button.response_json if isinstance(button, FrozenTextButton) \
+            else json.dumps(FastResponse.__button_dict(button))
+
+    @staticmethod
+    def __button_dict(button: TextButton) -> dict[str, Any]:
+        return button.response_dict if isinstance(button, FrozenTextButton) \
+            else prepare_value(button.model_dump(warnings=False), files={})
+
+
+def create_alice_response(text: str, tts: str = None, buttons: Iterable[TextButton] = None,
+                          end_session: bool = False) -> AliceResponse | FastResponse:
+    """Создаёт ответ навыка: FastResponse, если включена быстрая сериализация (response.fast_json), иначе AliceResponse."""
+    if Config().response.fast_json:
+        return FastResponse(text, tts, buttons, end_session)
+
+    return AliceResponse(response=Response(text=text, tts=tts, end_session=end_session,
+                                           buttons=list(buttons) if buttons is not None else None))
+
+
+class FastResponseConvertMiddleware(ResponseConvertMiddleware):
+    """Преобразователь результата обработчиков aliceio, пропускающий FastResponse без изменений."""
+    @staticmethod
+    async def convert_response(value: Any) -> Optional[AliceResponse | FastResponse]:
+        if isinstance(value, FastResponse):
+            return value
+        return await ResponseConvertMiddleware.convert_response(value)
+
+    @staticmethod
+    def install(dispatcher: Dispatcher):
+        """Заменяет ResponseConvertMiddleware диспетчера, сохраняя порядок промежуточных обработчиков."""
+        middlewares = list(dispatcher.update.outer_middleware)
+        for middleware in middlewares:
+            dispatcher.update.outer_middleware.unregister(middleware)
+
+        for middleware in middlewares:
+            dispatcher.update.outer_middleware(FastResponseConvertMiddleware()
+                                               if type(middleware) is ResponseConvertMiddleware else middleware)
+
+
+class FastAiohttpRequestHandler(OneSkillAiohttpRequestHandler):
+    """Обработчик запросов aiohttp, отправляющий FastResponse без моделей pydantic."""
+    def _build_json_response(self, result: Optional[AliceObject | FastResponse]) -> JsonPayload:
+        if isinstance(result, FastResponse):
+            return JsonPayload(value=result, dumps=FastResponse.to_json)
+        return super()._build_json_response(result)
+
+
+class FastYandexFunctionsRequestHandler(OneSkillYandexFunctionsRequestHandler):
+    """Обработчик запросов Яндекс Функции, отправляющий FastResponse без моделей pydantic."""
+    def _build_response(self, result: Optional[AliceObject | FastResponse]) -> Optional[dict[str, Any]]:
+        if isinstance(result, FastResponse):
+            return result.to_dict()
+        return super()._build_response(result)
@@ -0,0 +1,183 @@
+import os
+import glob
+import json
+import time
+import logging
+from collections.abc import Callable
+from aiohttp import web
+from aliceio.fsm.storage.base import StorageKey
+from aliceio.fsm.storage.memory import MemoryStorage
+from engine.alice.alice_engine import AliceEngine
+from metrics import metrics
+from myconstants import *
+
+SESSION_TTL = 600 # сессия удаляется через 10 минут без активности
+FORMAT_VERSION = 2
+
+def dump_sessions(storage: MemoryStorage, file_name: str) -> int:
+    """
+    Сохраняет таблицу сессий в компактный JSON и возвращает количество сохранённых сессий.
+
+    Запись хранилища FSM - ключ, состояние и сессии [session_id, время последней активности,
+    skill_id, состояние движка]. Время сохраняется абсолютным, поэтому после восстановления
+    сессия удаляется по неактивности тогда же, когда была бы удалена без перезапуска.
+    Файл записывается во временный и заменяет прежний целиком.
+    """
+    now = time.time()
+    records = []
+    count = 0
+
+    for key, record in list(storage.storage.items()):
+        sessions = [[session_id, last_active, engine.skill_id, engine.dump_state()]
+                    for session_id, (engine, last_active) in list(record.data.items())
+                    if isinstance(engine, AliceEngine) and now - last_active < SESSION_TTL]
+        if sessions:
+            records.append([key.skill_id, key.user_id, key.session_id, key.application_id, key.destiny, record.state, sessions])
+            count += len(sessions)
+
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    temp_name = f"{file_name}.tmp"
+    with open(temp_name, "w", encoding=UTF8) as file:
+        json.dump({ "version": FORMAT_VERSION, "saved": now, "records": records }, file, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_name, file_name)
+    return count
+
+
+def restore_sessions(storage: MemoryStorage, file_name: str, owns: Callable[[str], bool] = None) -> int:
+    """
+    Восстанавливает сессии, сохранённые dump_sessions, и возвращает количество добавленных сессий.
+    Сессии, простаивающие дольше SESSION_TTL, и сессии, для которых owns(session_id) ложно,
+    пропускаются. Сессия, которая уже есть в хранилище с тем же или более поздним временем
+    активности (например, из более нового файла), не заменяется. Сессия, которую не удалось
+    восстановить, пропускается с предупреждением.
+    """
+    with open(file_name, "r", encoding=UTF8) as file:
+        data = json.load(file)
+
+    if data.get("version") != FORMAT_VERSION:
+        logging.warning(f"Файл сессий {file_name} другой версии, сессии не восстановлены")
+        return 0
+
+    now = time.time()
+    count = 0
+
+    for skill_id, user_id, key_session_id, application_id, destiny, state, sessions in data["records"]:
+        key = StorageKey(skill_id=skill_id, user_id=user_id, session_id=key_session_id, application_id=application_id, destiny=destiny)
+        record = storage.storage.get(key)
+        existing = record.data if record is not None else {}
+        restored = dict()
+
+        for session_id, last_active, engine_skill_id, engine_state in sessions:
+            if now - last_active >= SESSION_TTL or (owns is not None and not owns(session_id)):
+                continue
+
+            current = existing.get(session_id)
+            if current is not None and current[1] >= last_active:
+                continue
+
+            try:
+                engine = AliceEngine(engine_skill_id)
+                engine.load_state(engine_state)
+            except Exception as e:
+                logging.warning(f"Сессия {session_id} не восстановлена", exc_info=e)
+                continue
+
+            restored[session_id] = (engine, last_active)
+
+        if restored:
+            count += sum(session_id not in existing for session_id in restored)
+            record = storage.storage[key]
+            record.data.update(restored)
+            record.state = record.state or state
+
+    return count
+
+
+def sweep_sessions(storage: MemoryStorage) -> tuple[int, int]:
+    """
+    Удаляет сессии всех пользователей, простаивающие SESSION_TTL и дольше, и опустевшие записи
+    хранилища. Возвращает количество оставшихся и удалённых сессий.
+    """
+    now = time.time()
+    alive = evicted = 0
+
+    for key, record in list(storage.storage.items()):
+        expired = [session_id for session_id, (_, last_active) in list(record.data.items()) if now - last_active >= SESSION_TTL]
+        for session_id in expired:
+            record.data.pop(session_id, None)
+
+        evicted += len(expired)
+        alive += len(record.data)
+        if not record.data and record.state is None:
+            storage.storage.pop(key, None)
+
+    return alive, evicted
+
+
+def session_files(file_name: str) -> list[str]:
+    """Файл сессий и файлы сессий рабочих процессов (имя.номер.расширение), от новых к старым."""
+    def modified(name: str) -> float:
+        try:
+            return os.path.getmtime(name)
+        except FileNotFoundError: # просроченный файл удалён другим рабочим процессом
+            return 0.0
+
+    stem, ext = os.path.splitext(file_name)
+    return sorted(glob.glob(f"{glob.escape(stem)}*{ext}"), key=modified, reverse=True)
+
+
+def worker_session_file(file_name: str, index: int) -> str:
+    stem, ext = os.path.splitext(file_name)
+    return f"{stem}.{index}{ext}"
+
+
+def install_session_persistence(app: web.Application, storage: MemoryStorage, file_name: str,
+                                worker: int = None, owns: Callable[[str], bool] = None):
+    """
+    Восстанавливает сессии при запуске приложения, до приёма запросов, и сохраняет их при остановке -
+    после того, как обработаны запросы, принятые до остановки.
+
+    Сессии восстанавливаются из всех файлов session_files(file_name), в том числе сохранённых
+    рабочими процессами при другом их количестве; owns отбирает сессии этого процесса. Файлы
+    читаются от новых к старым, и сессия из более старого файла не заменяет уже восстановленную,
+    поэтому оставшийся от прежних запусков файл не возвращает устаревшее состояние.
+    Рабочий процесс worker сохраняет свои сессии в отдельный файл worker_session_file.
+
+    Прочитанные файлы удаляются, если в них не осталось непросроченных сессий, а в режиме одного
+    процесса - все, кроме собственного: их сессии теперь в памяти и будут сохранены в dump_file.
+    Файлы рабочих процессов нужны всем процессам, поэтому при запуске нескольких процессов
+    чужой файл удаляется только после того, как все его сессии просрочены.
+    """
+    dump_file = file_name if worker is None else worker_session_file(file_name, worker)
+
+    def consumed(name: str):
+        expired = time.time() - os.path.getmtime(name) >= SESSION_TTL
+        if name != dump_file and (worker is None or expired):
+            os.remove(name)
+
+    async def on_startup(_):
+        count = 0
+        start = time.perf_counter()
+        for name in session_files(file_name):
+            try:
+                count += restore_sessions(storage, name, owns)
+                consumed(name)
+            except FileNotFoundError: # просроченный файл удалён другим рабочим процессом
+                continue
+            except Exception as e:
+                logging.error(f"Ошибка восстановления сессий из {name}", exc_info=e)
+
+        if count > 0:
+            metrics.sessions_active.set(sum(len(record.data) for record in storage.storage.values()))
+            logging.info(f"Восстановлено сессий: {count} за {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    async def on_cleanup(_):
+        try:
+            start = time.perf_counter()
+            count = dump_sessions(storage, dump_file)
+            logging.info(f"Сохранено сессий: {count} за {(time.perf_counter() - start) * 1000:.0f} мс в {dump_file}")
+        except Exception as e:
+            logging.error(f"Ошибка сохранения сессий в {dump_file}", exc_info=e)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
@@ -0,0 +1,25 @@
+from collections.abc import Awaitable
+from typing import Any, Callable
+from aliceio.dispatcher.middlewares.base import BaseMiddleware
+from aliceio.types import Update
+from resources import registry, pinned_snapshot
+
+class SnapshotMiddleware(BaseMiddleware[Update]):
+    """
+    Захватывает текущее поколение ресурсов на входе запроса.
+
+    Config(), VoiceMenu(), MainDB() и AliceWebSounds() до конца запроса (в том числе в задачах,
+    запущенных из него) возвращают экземпляры этого поколения, даже если во время обработки
+    какой-то файл перезагрузился: ответ не смешивает старую и новую версии.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        token = pinned_snapshot.set(registry.current)
+        try:
+            return await handler(event, data)
+        finally:
+            pinned_snapshot.reset(token)
@@ -0,0 +1,85 @@
+import os
+import time
+from collections.abc import Awaitable
+from typing import Any, Callable
+from aliceio import Dispatcher
+from aliceio.dispatcher.middlewares.base import BaseMiddleware
+from aliceio.types import Update
+from tracing import Tracer, current_trace
+from config import Config
+from voicemenu import Format
+from engine.maindb import MainDB
+from engine.alice.alice_engine import AliceEngine
+import engine.alice.alice_handlers as alice_handlers
+from abspath import abs_path
+
+# этапы обработки запроса, которые записываются в трассу
+TRACED = (
+    (alice_handlers, "get_engine"),
+    (AliceEngine, "get_reply"),
+    (AliceEngine, "get_stats_reply"),
+    (AliceEngine, "get_rules_reply"),
+    (AliceEngine, "process_user_reply"),
+    (AliceEngine, "process_button_pressed"),
+    (AliceEngine, "process_back_action"),
+    (MainDB, "rnd"),
+    (Format, "format"),
+    (AliceEngine, "format_text"),
+    (AliceEngine, "format_tts"),
+    (AliceEngine, "get_buttons"),
+    (AliceEngine, "create_response"),
+)
+
+class TracingMiddleware(BaseMiddleware[Update]):
+    """Начинает трассу для выбранных запросов и записывает её в файл после ответа."""
+    def __init__(self, tracer: Tracer):
+        assert tracer
+        self.__tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        trace = self.__tracer.sample(Config().tracing.sample_rate)
+        if trace is None:
+            return await handler(event, data)
+
+        token = current_trace.set(trace)
+        start = time.perf_counter_ns()
+        try:
+            return await handler(event, data)
+        finally:
+            current_trace.reset(token)
+            session = event.session
+            trace.add("request", start, time.perf_counter_ns(),
+                      { "event": event.event_type, "session_id": session.session_id if session else None,
+                        "message_id": session.message_id if session else None })
+            self.__tracer.write(trace)
+
+
+def install_tracing(dispatcher: Dispatcher) -> Tracer:
+    """
+    Включает трассировку: оборачивает этапы TRACED и добавляет TracingMiddleware в диспетчер первым,
+    чтобы интервал запроса включал все остальные промежуточные обработчики.
+    """
+    config = Config().tracing
+    file_name = abs_path(config.file)
+    if Config().network.workers > 1: # у каждого рабочего процесса свой файл, иначе ротация не согласована
+        root, ext = os.path.splitext(file_name)
+        file_name = f"{root}.{os.getpid()}{ext}"
+
+    tracer = Tracer(file_name, config.max_bytes, config.backup_count, Config().logging.queue_size)
+
+    for owner, attr in TRACED:
+        Tracer.instrument(owner, attr)
+
+    middlewares = list(dispatcher.update.outer_middleware)
+    for middleware in middlewares:
+        dispatcher.update.outer_middleware.unregister(middleware)
+
+    dispatcher.update.outer_middleware(TracingMiddleware(tracer))
+    for middleware in middlewares:
+        dispatcher.update.outer_middleware(middleware)
+    return tracer
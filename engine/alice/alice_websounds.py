@@ -1,22 +1,44 @@
 import os
+import csv
+import asyncio
 import logging
-import pandas as pd
 from aliceio.types import FSInputFile
 from aliceio import Skill
 from engine.musicnotesequence import MusicNoteSequence
+from engine.maindb import read_csv
 from singleton import SingletonMeta
 from config import Config
-from chordgen import OPUS_EXT
+from metrics import metrics, Timer
 from myconstants import *
 from abspath import abs_path
 
+# задержка удаления прежних звуков после сохранения новой базы: наблюдатели файлов перезагружают её
+# с задержкой 0,5 с, а запросы, захватившие прежнее поколение ресурсов, успевают завершиться
+RELEASE_DELAY = 10.0
+
 class AliceWebSounds(metaclass=SingletonMeta):
     def __init__(self):
         self.__websounds = dict[str, str]()
+        self.__tags = dict[str, dict[str, str]]() # skill_id: файл звука: тег
+        self.__loaded = False
+
+    @property
+    def loaded(self) -> bool: return self.__loaded
 
     def get_cloud_id(self, nsf: str | MusicNoteSequence):
         return self.__websounds.get(nsf.file_name if isinstance(nsf, MusicNoteSequence) else nsf)
 
+    def audio_tags(self, skill_id: str) -> dict[str, str]:
+        """Теги <speaker> всех загруженных звуков навыка; строятся один раз на экземпляр базы."""
+        tags = self.__tags.get(skill_id)
+        if tags is None:
+            tags = self.__tags[skill_id] = { file_name: f'<speaker audio="dialogs-upload/{skill_id}/{cloud_id}.opus">'
+                                             for file_name, cloud_id in self.__websounds.items() }
+        return tags
+
+    def get_audio_tag(self, nsf: str | MusicNoteSequence, skill_id: str) -> str:
+        return self.audio_tags(skill_id).get(nsf.file_name if isinstance(nsf, MusicNoteSequence) else nsf, "")
+
     @classmethod
     def load(self):
         try:
@@ -26,8 +48,10 @@ class AliceWebSounds(metaclass=SingletonMeta):
 
             logging.info(f"Загрузка базы облачных идентификаторов звуков")
 
-            df = pd.read_csv(config.data.websounds_db, sep=SEP, encoding=UTF8, index_col="file_name")
-            self().__websounds = df.cloud_id.dropna().to_dict()
+            instance = self.create()
+            instance.__websounds = { row["file_name"]: row["cloud_id"] for row in read_csv(config.data.websounds_db) if row["cloud_id"] }
+            instance.__loaded = True
+            self.publish(instance)
 
             logging.info(f"База облачных идентификаторов звуков загружена")
         except Exception as e:
@@ -35,41 +59,45 @@ class AliceWebSounds(metaclass=SingletonMeta):
             raise e
 
     @staticmethod
-    async def upload_websounds(skill: Skill):
-        # удаляем все ранее загруженные звуки
-        logging.info("Получение списка ранее загруженных в навык звуков и их удаление")
-        pre_sounds = await skill.get_sounds()
-        count = 0
-
-        for web_sound in pre_sounds.sounds:
-            try:
-                await skill.delete_sound(web_sound.id)
-                count += 1
-                logging.info(f"Звук удалён: id={web_sound.id}")
-            except Exception as e:
-                logging.error(f"Ошибка удаления звука {web_sound.id}.", exc_info=e)
-                continue
+    async def upload_websounds(skill: Skill, release_delay: float = RELEASE_DELAY):
+        """
+        Загружает звуки в навык и сохраняет базу их облачных идентификаторов. Ранее загруженные
+        звуки удаляются только после сохранения новой базы и ещё через release_delay секунд: пока
+        новую базу не подхватили наблюдатели файлов всех процессов, ответы ссылаются на прежние звуки.
+        Звук, который не удалось загрузить, остаётся в базе с прежним идентификатором и не удаляется.
+        """
+        config = Config()
+        previous = dict[str, str]()
+        if os.path.isfile(config.data.websounds_db):
+            previous = { row["file_name"]: row["cloud_id"] for row in read_csv(config.data.websounds_db) if row["cloud_id"] }
 
-        logging.info(f"Всего звуков удалено: {count}")
+        logging.info("Получение списка ранее загруженных в навык звуков")
+        pre_sounds = await skill.get_sounds()
 
-        websounds = pd.DataFrame(columns=["file_name", "cloud_id"])
+        websounds = list[tuple[str, str]]()
         count = 0
 
         # загружаем все звуки из папки sounds
         logging.info(f"Загрузка звуков в облачное хранилище навыка")
-        config = Config()
 
         websounds_folder = abs_path(config.data.websounds_folder)
         for f in filter(lambda f: f.endswith(OPUS_EXT), os.listdir(websounds_folder)):
+            file_name = f.split(".")[0]
             try:
                 sound_file = os.path.join(websounds_folder, f)
                 fsfile = FSInputFile(sound_file)
-                result = await skill.upload_sound(fsfile)
+                with Timer(metrics.job_seconds.labels("upload")):
+                    result = await skill.upload_sound(fsfile)
+                metrics.jobs.labels("upload", "ok").inc()
                 count += 1
-                websounds.loc[len(websounds)] = [f.split(".")[0], result.sound.id]
+                websounds.append((file_name, result.sound.id))
                 logging.info(f"Звук загружен: {f}, id={result.sound.id}")
             except Exception as e:
+                metrics.jobs.labels("upload", "error").inc()
                 logging.warning(f"Ошибка загрузки звука {f}.", exc_info=e)
+                if file_name in previous:
+                    websounds.append((file_name, previous[file_name]))
+                    logging.warning(f"Для звука {f} остаётся прежний id={previous[file_name]}")
                 continue
 
         logging.info(f"Всего звуков загружено: {count}")
@@ -78,7 +106,33 @@ class AliceWebSounds(metaclass=SingletonMeta):
         # создаём папку для сохранения базы облачных идентификаторов звуков
         os.makedirs(os.path.dirname(config.data.websounds_db), exist_ok=True)
 
-        # сохраняем файл базы облачных идентификаторов звуков
-        websounds.to_csv(config.data.websounds_db, sep=SEP, encoding=UTF8, index=False)
+        # сохраняем файл базы облачных идентификаторов звуков: наблюдатель файлов видит только готовый файл
+        temp_file = f"{config.data.websounds_db}.tmp"
+        with open(temp_file, "w", encoding=UTF8, newline="") as file:
+            writer = csv.writer(file, delimiter=SEP, lineterminator="\n")
+            writer.writerow(("file_name", "cloud_id"))
+            writer.writerows(websounds)
+        os.replace(temp_file, config.data.websounds_db)
+
+        logging.info(f"База облачных идентификаторов звуков сохранена {config.data.websounds_db}")
+
+        # удаляем ранее загруженные звуки, когда новая база подхвачена
+        kept = { cloud_id for _, cloud_id in websounds }
+        stale = [web_sound for web_sound in pre_sounds.sounds if web_sound.id not in kept]
+        if not stale:
+            return
 
-        logging.info(f"База облачных идентификаторов звуков сохранена {config.data.websounds_db}")
\ No newline at end of file
+        logging.info(f"Удаление ранее загруженных звуков через {release_delay:.0f} с")
+        await asyncio.sleep(release_delay)
+        count = 0
+
+        for web_sound in stale:
+            try:
+                await skill.delete_sound(web_sound.id)
+                count += 1
+                logging.info(f"Звук удалён: id={web_sound.id}")
+            except Exception as e:
+                logging.error(f"Ошибка удаления звука {web_sound.id}.", exc_info=e)
+                continue
+
+        logging.info(f"Всего звуков удалено: {count}")
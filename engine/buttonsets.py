@@ -0,0 +1,128 @@
+import random
+import json
+from collections.abc import Hashable
+from typing import Any
+from pydantic import ConfigDict, PrivateAttr
+from aliceio.types import TextButton
+from aliceio.utils.funcs import prepare_value
+from voicemenu import VoiceMenu, RandomCollection
+from myconstants import *
+
+class FrozenTextButton(TextButton):
+    """Неизменяемая кнопка: один экземпляр отправляется в ответах всех сессий."""
+    model_config = ConfigDict(frozen=True)
+    _dump: dict[str, Any] = PrivateAttr(default=None)
+    _json: str = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        super().model_post_init(__context)
+        # так же, как кнопку сериализует aliceio: prepare_value(model_dump()) и json.dumps
+        self._dump = prepare_value(self.model_dump(warnings=False), files={})
+        self._json = json.dumps(self._dump)
+
+    @property
+    def response_dict(self) -> dict[str, Any]:
+        """Словарь кнопки для ответа Яндекс Функции. Общий для всех ответов, не изменять."""
+        return self._dump
+
+    @property
+    def response_json(self) -> str:
+        """JSON кнопки, совпадающий с тем, что строит aiohttp-обработчик aliceio."""
+        return self._json
+
+
+def variants(collection: RandomCollection) -> list:
+    """
+    Варианты, из которых строятся кнопки. Для пустой коллекции - элемент по умолчанию, который
+    вернёт rnd() (DEFAULT коллекции), а если его нет - пустой список.
+    """
+    result = collection.variants()
+    if len(result) > 0:
+        return result
+
+    default = collection.rnd()
+    return [default] if default is not None else []
+
+
+class ButtonSets:
+    """
+    Наборы кнопок, построенные для одной редакции голосового меню.
+
+    Заголовки кнопок зависят только от голосового меню, режима и уровня, поэтому кнопки
+    создаются один раз и переиспользуются во всех ответах. Для случайных вариантов заголовков
+    построен каждый вариант, а выбирается он так же случайно, как раньше выбирался заголовок.
+    После перезагрузки голосового меню наборы строятся заново.
+    """
+    __current: "ButtonSets" = None
+
+    def __init__(self, vm: VoiceMenu):
+        assert vm
+        self.__vm = vm
+        set_mode_key = "set_mode"
+        set_level_key = "set_level"
+
+        self.__main_menu = (
+            FrozenTextButton(title=vm.levels.demo.name.text, payload={ set_mode_key: GameMode.DEMO }),
+            FrozenTextButton(title=vm.main_menu.train_menu.button, payload={ set_mode_key: GameMode.TRAIN_MENU }),
+            FrozenTextButton(title=vm.levels.exam.name.text, payload={ set_mode_key: GameMode.EXAM }))
+
+        self.__train_menu = (
+            FrozenTextButton(title=vm.levels.missed_note.name.text, payload={ set_level_key: LevelId.MISSED_NOTE }),
+            FrozenTextButton(title=vm.levels.prima_location.name.text, payload={ set_level_key: LevelId.PRIMA_LOCATION }),
+            FrozenTextButton(title=vm.levels.cadence.name.text, payload={ set_level_key: LevelId.CADENCE }))
+
+        self.__help = FrozenTextButton(title=vm.main_menu.rules.button, payload={ "help": True })
+
+        self.__repeat = tuple(FrozenTextButton(title=variant.text, payload={ "repeat": True })
+                              for variant in variants(vm.root.repeat_buttons))
+
+        self.__back = { mode: tuple(FrozenTextButton(title=variant.text, payload={ set_mode_key: mode })
+                                    for variant in variants(vm.root.back_buttons))
+                        for mode in (GameMode.MENU, GameMode.TRAIN_MENU) }
+
+        # кнопки ответов уровней: { id уровня: { (вариант заголовка, ключ набора): кнопки } }
+        self.__answers = dict[int, dict[tuple[int, Hashable], tuple[TextButton, ...]]]()
+
+    @property
+    def voice_menu(self) -> VoiceMenu: return self.__vm
+
+    @property
+    def main_menu(self) -> tuple[TextButton, ...]: return self.__main_menu
+
+    @property
+    def train_menu(self) -> tuple[TextButton, ...]: return self.__train_menu
+
+    @property
+    def help(self) -> TextButton: return self.__help
+
+    def repeat(self, rng: random.Random = None) -> TextButton:
+        return self.__repeat[self.__vm.root.repeat_buttons.rnd_index(rng)]
+
+    def back(self, mode: int, rng: random.Random = None) -> TextButton:
+        return self.__back[mode][self.__vm.root.back_buttons.rnd_index(rng)]
+
+    def answers(self, level, rng: random.Random = None) -> tuple[TextButton, ...]:
+        """
+        Возвращает кнопки ответов уровня level для случайного варианта заголовка.
+
+        При первом обращении к уровню строятся наборы для всех вариантов заголовка и всех ключей
+        level._button_keys: заголовки должны зависеть только от варианта и ключа. Если у уровня нет
+        вариантов заголовка, кнопки строятся по варианту по умолчанию, а без него кнопок нет.
+        """
+        level_answers = level.game_level.answers
+        sets = self.__answers.get(level.id)
+        if sets is None:
+            sets = { (index, key): tuple(level._create_answer_buttons(answer, key))
+                     for index, answer in enumerate(variants(level_answers))
+                     for key in level._button_keys }
+            self.__answers[level.id] = sets
+
+        return sets.get((level_answers.rnd_index(rng), level._button_key), ())
+
+    @staticmethod
+    def of(vm: VoiceMenu) -> "ButtonSets":
+        """Возвращает наборы кнопок для голосового меню vm, строя их при первом обращении."""
+        current = ButtonSets.__current
+        if current is None or current.voice_menu is not vm:
+            current = ButtonSets.__current = ButtonSets(vm)
+        return current
@@ -1,10 +1,14 @@
+import random
 import threading
 from aliceio.types import Message, TextButton
 from aliceio.types.number_entity import NumberEntity
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import Callable, Iterable
 from engine.meldictenginebase import MelDictEngineBase
-from voicemenu import VoiceMenu, GameLevel
+from engine.musicnotesequence import MusicNoteSequence
+from engine.maindb import MainDB
+from engine.buttonsets import ButtonSets, FrozenTextButton
+from voicemenu import VoiceMenu, GameLevel, FormatButton
 from myconstants import *
 
 class NoReplyError(ValueError):
@@ -13,6 +17,8 @@ class NoReplyError(ValueError):
 
 class MelDictLevelBase(ABC):
     MAX_TASK_COUNT = 9
+    # значения, от которых кроме варианта заголовка зависят кнопки ответов (см. _button_key)
+    _button_keys: tuple = (None,)
     _rlock: threading.RLock
 
     def __init__(self, engine: MelDictEngineBase, first_run: bool = True):
@@ -42,6 +48,9 @@ class MelDictLevelBase(ABC):
     @property
     def engine(self): return self.__engine
 
+    @property
+    def rng(self) -> random.Random: return self.__engine.rng
+
     @property
     def show_right(self): return self.__show_right
     @show_right.setter
@@ -75,6 +84,36 @@ class MelDictLevelBase(ABC):
             self.__correct_score = self.__incorrect_score = 0
             self._reset_secrets()
 
+    def dump_state(self) -> list:
+        """Состояние уровня для сохранения сессии: только числа, строки и списки."""
+        return [self._first_run, self.__show_right, self.__correct_score, self.__incorrect_score, self._dump_secrets()]
+
+    def load_state(self, state: list):
+        """Восстанавливает состояние, сохранённое dump_state."""
+        self._first_run, self.__show_right, self.__correct_score, self.__incorrect_score, secrets = state
+        if secrets is None or not self._load_secrets(secrets):
+            self._reset_secrets() # загаданного нет в базе: будет загадано новое задание
+
+    def _dump_secrets(self) -> list:
+        return None
+
+    def _load_secrets(self, secrets: list) -> bool:
+        """Восстанавливает загаданное задание; False, если его нельзя восстановить."""
+        return True
+
+    def _draw(self, predicate: Callable[[MusicNoteSequence], bool]) -> MusicNoteSequence:
+        return self.__engine.draw(predicate, self.id)
+
+    @staticmethod
+    def _noteseq_ids(*noteseqs: MusicNoteSequence) -> list[str]:
+        return None if any(noteseq is None for noteseq in noteseqs) else [noteseq.id for noteseq in noteseqs]
+
+    @staticmethod
+    def _noteseqs(ids: list[str]) -> list[MusicNoteSequence]:
+        main_db = MainDB()
+        noteseqs = [main_db.get(id) for id in ids]
+        return None if any(noteseq is None for noteseq in noteseqs) else noteseqs
+
     def get_stats_reply(self, format_name: bool = True) -> tuple[str, str]:
         mode_reply = "На уровне «{0}» отвечено" if format_name else ""
         correct_reply = "на {0} {1} правильно".format(self.correct_score, MelDictLevelBase._decline_question(self.correct_score))
@@ -102,12 +141,26 @@ class MelDictLevelBase(ABC):
     def process_user_reply(self, message: Message = None, button: TextButton = None) -> tuple[str, str]:
         assert message or button
         with self._rlock:
-            return self._process_user_reply(message, button) if not self.finished else (None, None)
+            if self.finished:
+                return None, None
+
+            # задание сбрасывается при ответе: его последовательности нужны до ответа
+            noteseqs = self._task_noteseqs()
+            correct, incorrect = self.correct_score, self.incorrect_score
+            reply = self._process_user_reply(message, button)
+
+            if self.correct_score > correct or self.incorrect_score > incorrect:
+                self.engine.record_answer(self.id, self.correct_score > correct, noteseqs)
+            return reply
 
     @abstractmethod
     def _process_user_reply(self, message: Message, button: TextButton) -> tuple[str, str]:
         pass
 
+    def _task_noteseqs(self) -> tuple[MusicNoteSequence, ...]:
+        """Последовательности текущего задания, которым засчитывается ошибка при неправильном ответе."""
+        return ()
+
     def _select_start_reply(self, self_game_level: GameLevel = None) -> tuple[str, str]:
         self_game_level = self_game_level if self_game_level else self.game_level
 
@@ -125,13 +178,20 @@ class MelDictLevelBase(ABC):
         pass
 
     def get_buttons(self) -> Iterable[TextButton]:
-        pass
+        return ButtonSets.of(VoiceMenu()).answers(self, self.rng) if not self.finished else ()
+
+    @property
+    def _button_key(self): return None
+
+    def _create_answer_buttons(self, answer: FormatButton, key) -> Iterable[TextButton]:
+        """Создаёт кнопки ответов для варианта заголовка answer; результат кэшируется в ButtonSets."""
+        return ()
 
     def _create_button(self, title: str, value: str | int) -> TextButton:
         if not isinstance(value, str) and not isinstance(value, int):
             return None
 
-        return TextButton(title=title if isinstance(title, str) and title != "" \
+        return FrozenTextButton(title=title if isinstance(title, str) and title != "" \
                           else str(value), payload={ "value": value })
 
     def _get_last_number(self, message: Message, button: TextButton) -> int:
@@ -151,11 +211,11 @@ class MelDictLevelBase(ABC):
         return None
 
     def _format_correct(self, text: str = "", tts: str = "") -> tuple[str, str]: # text, tts
-        right_text, right_tts = VoiceMenu().root.rights()
+        right_text, right_tts = VoiceMenu().root.rights(self.rng)
         return self.engine.format_text(right_text, text), self.engine.format_tts(right_tts, tts)
 
     def _format_incorrect(self, text: str = "", tts: str = "") -> tuple[str, str]: # text, tts
-        wrong_text, wrong_tts = VoiceMenu().root.wrongs()
+        wrong_text, wrong_tts = VoiceMenu().root.wrongs(self.rng)
         return self.engine.format_text(wrong_text, text), self.engine.format_tts(wrong_tts, tts)
 
     @staticmethod
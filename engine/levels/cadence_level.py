@@ -1,12 +1,10 @@
-import random as rnd
 from aliceio.types import Message, TextButton
 from typing import Iterable
 from engine.levels.base_level import MelDictLevelBase, NoReplyError
 from engine.musicnotesequence import MusicNoteSequence
 from engine.meldictenginebase import MelDictEngineBase
-from engine.maindb import MainDB
 from config import Config
-from voicemenu import VoiceMenu, GameLevel
+from voicemenu import VoiceMenu, GameLevel, FormatButton
 from myconstants import *
 
 class CadenceLevel(MelDictLevelBase):
@@ -16,7 +14,7 @@ class CadenceLevel(MelDictLevelBase):
         self.__guessed_index = 0
 
     @property
-    def id(self) -> int: return 3
+    def id(self) -> int: return LevelId.CADENCE
 
     @property
     def game_level(self) -> GameLevel: return VoiceMenu().levels.cadence
@@ -25,21 +23,32 @@ class CadenceLevel(MelDictLevelBase):
         self.__cadence = None
         self.__guessed_index = 0
 
-    def get_buttons(self) -> Iterable[TextButton]:
-        if not self.finished:
-            answer = self.game_level.answers()
-            if answer:
-                title = answer.btn(item_number = 1, chord_pos = 0)
-                yield self._create_button(title, 1)
-                title = answer.btn(item_number = 2, chord_pos = 1)
-                yield self._create_button(title, 2)
-                title = answer.btn(item_number = 3, chord_pos = 2)
-                yield self._create_button(title, 3)
+    def _dump_secrets(self) -> list:
+        ids = self._noteseq_ids(*self.__cadence) if self.__cadence else None
+        return [self.__guessed_index, *ids] if ids else None
+
+    def _task_noteseqs(self) -> tuple[MusicNoteSequence, ...]:
+        return (self.__cadence[self.__guessed_index],) if self.__cadence else ()
+
+    def _load_secrets(self, secrets: list) -> bool:
+        noteseqs = self._noteseqs(secrets[1:])
+        if noteseqs:
+            self.__guessed_index = secrets[0]
+            self.__cadence = noteseqs
+        return noteseqs is not None
+
+    def _create_answer_buttons(self, answer: FormatButton, _) -> Iterable[TextButton]:
+        title = answer.btn(item_number = 1, chord_pos = 0)
+        yield self._create_button(title, 1)
+        title = answer.btn(item_number = 2, chord_pos = 1)
+        yield self._create_button(title, 2)
+        title = answer.btn(item_number = 3, chord_pos = 2)
+        yield self._create_button(title, 3)
 
     def __format_what(self, noteseq: MusicNoteSequence) -> tuple[str, str]:
         text = tts = None
         if self.show_right:
-            what = self.game_level.whats()
+            what = self.game_level.whats(self.rng)
             text, tts = what(
                 neuter=noteseq.name.endswith('е'),
                 chord_name=lambda s: (noteseq.tts_name if s else noteseq.name).lower())
@@ -53,7 +62,7 @@ class CadenceLevel(MelDictLevelBase):
         text = tts = None
         if self.show_right:
             what_text, what_tts = self.__format_what(cadence[guessed_index])
-            answer = self.game_level.answers()
+            answer = self.game_level.answers(self.rng)
             text, tts = answer(chord_pos=guessed_index)
             text = self.engine.format_text(text, what_text)
             tts = self.engine.format_tts(tts, what_tts)
@@ -77,30 +86,29 @@ class CadenceLevel(MelDictLevelBase):
         guessed_index = self.__guessed_index
 
         if cadence is None:
-            maj = bool(rnd.getrandbits(1))
-            main_db = MainDB()
+            maj = bool(self.rng.getrandbits(1))
 
-            tns = main_db.rnd(
+            tns = self._draw(
                 lambda ns: ns.is_tonic and ns.is_tonality_maj == maj and ns.is_vertical)
             if tns is None: raise NoReplyError(f"Не удалось выбрать тонику: {'maj' if maj else 'min'}, arp")
 
-            sdns = main_db.rnd(
+            sdns = self._draw(
                 lambda ns: ns.is_subdominant and ns.is_tonality_maj == maj and ns.is_vertical)
             if sdns is None: raise NoReplyError(f"Не удалось найти субдоминанту: {'maj' if maj else 'min'}, arp")
 
-            dns = main_db.rnd(
+            dns = self._draw(
                 lambda ns: ns.is_dominant and ns.is_tonality_maj == maj and ns.is_vertical)
             if dns is None: raise NoReplyError(f"Не удалось найти доминанту: {'maj' if maj else 'min'}, arp")
 
-            cadence = self.__cadence = rnd.sample([tns, sdns, dns], 3) # shuffle cadence
-            guessed_index = self.__guessed_index = rnd.randint(0, 2) # guess chord number
+            cadence = self.__cadence = self.rng.sample([tns, sdns, dns], 3) # shuffle cadence
+            guessed_index = self.__guessed_index = self.rng.randint(0, 2) # guess chord number
 
         if cadence:
             gamelevel = self.game_level
             start_text, start_tts = self._select_start_reply(gamelevel)
-            question_text, question_tts = gamelevel.questions()
+            question_text, question_tts = gamelevel.questions(self.rng)
             
-            task_text, task_tts = gamelevel.tasks()(
+            task_text, task_tts = gamelevel.tasks(self.rng)(
                     chord_arp = self.engine.get_audio_tag(MusicNoteSequence.get_file_name(False, cadence[guessed_index])),
                     chord_vert = self.engine.get_audio_tag(cadence[guessed_index]),
                     cadence = self.engine.format_tts(cadence))
@@ -131,7 +139,7 @@ class CadenceLevel(MelDictLevelBase):
 
         answer = self._get_last_number(message, button)
         if answer is None:
-            text, tts = VoiceMenu().root.dont_understand()
+            text, tts = VoiceMenu().root.dont_understand(self.rng)
             return text, self.engine.format_tts(tts)
 
         reply_text = reply_tts = None
@@ -149,7 +157,7 @@ class CadenceLevel(MelDictLevelBase):
 
         # continue_reply = "" if self.finished else rnd.choice(CadenceLevel.__continue_replies)
         continue_text, continue_tts = (None, None) if self.finished \
-            else self.game_level.continues()
+            else self.game_level.continues(self.rng)
 
         text = self.engine.format_text(
             reply_text, continue_text, debug, "\n", next_text)
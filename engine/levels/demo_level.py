@@ -1,22 +1,25 @@
-import random as rnd
 from aliceio.types import Message, TextButton
 from typing import Iterable
 from engine.levels.base_level import MelDictLevelBase, NoReplyError
 from engine.musicnotesequence import MusicNoteSequence
 from engine.meldictenginebase import MelDictEngineBase
-from engine.maindb import MainDB
 from config import Config
-from voicemenu import VoiceMenu, GameLevel
+from voicemenu import VoiceMenu, GameLevel, FormatButton
 from myconstants import *
 
+def _is_demo_interval(ns: MusicNoteSequence) -> bool:
+    return ns.is_interval and not ns.is_vertical
+
 class DemoLevel(MelDictLevelBase):
+    _button_keys = (False, True) # направление сравнения нот
+
     def __init__(self, engine: MelDictEngineBase, first_run: bool = True):
         super().__init__(engine, first_run)
         self.__current_noteseq = None
         self.__current_comparator = False
 
     @property
-    def id(self) -> int: return 0
+    def id(self) -> int: return LevelId.DEMO
 
     @property
     def game_level(self) -> GameLevel: return VoiceMenu().levels.demo
@@ -25,20 +28,34 @@ class DemoLevel(MelDictLevelBase):
         self.__current_noteseq = None
         self.__current_comparator = False
 
-    def get_buttons(self) -> Iterable[TextButton]:
-        if not self.finished:
-            answer = self.game_level.answers()
-            if answer:
-                title = answer.btn(item_number = 1, note_pos = 0, note_cmp = self.__current_comparator)
-                yield self._create_button(title, 1)
-                title = answer.btn(item_number = 2, note_pos = 1, note_cmp = self.__current_comparator)
-                yield self._create_button(title, 2)
+    def _dump_secrets(self) -> list:
+        ids = self._noteseq_ids(self.__current_noteseq)
+        return [*ids, self.__current_comparator] if ids else None
+
+    def _task_noteseqs(self) -> tuple[MusicNoteSequence, ...]:
+        return (self.__current_noteseq,)
+
+    def _load_secrets(self, secrets: list) -> bool:
+        noteseqs = self._noteseqs(secrets[:1])
+        if noteseqs:
+            self.__current_noteseq, = noteseqs
+            self.__current_comparator = secrets[1]
+        return noteseqs is not None
+
+    @property
+    def _button_key(self) -> bool: return self.__current_comparator
+
+    def _create_answer_buttons(self, answer: FormatButton, comparator: bool) -> Iterable[TextButton]:
+        title = answer.btn(item_number = 1, note_pos = 0, note_cmp = comparator)
+        yield self._create_button(title, 1)
+        title = answer.btn(item_number = 2, note_pos = 1, note_cmp = comparator)
+        yield self._create_button(title, 2)
 
     def __format_what(self, noteseq: MusicNoteSequence, vm: VoiceMenu = None) -> tuple[str, str]:
         text = tts = None
         if len(noteseq.name) > 0:
             vm = vm if vm else VoiceMenu()
-            what = vm.levels.demo.whats()
+            what = vm.levels.demo.whats(self.rng)
             text, tts = what(asc=noteseq.is_ascending, value=lambda s: (noteseq.tts_name if s else noteseq.name).lower())
         return text, tts
 
@@ -54,14 +71,14 @@ class DemoLevel(MelDictLevelBase):
             note_pos = int(noteseq.is_ascending) if note_cmp \
                 else int(not noteseq.is_ascending)
 
-            answer = vm.levels.demo.answers()
+            answer = vm.levels.demo.answers(self.rng)
             answer_text, answer_tts = answer(
                 note_pos=note_pos, note_cmp=note_cmp)
             what_text, what_tts = self.__format_what(noteseq, vm)
             text = self.engine.format_text(answer_text, what_text)
             tts = self.engine.format_tts(answer_tts, what_tts)
 
-        wrong = vm.root.wrongs()
+        wrong = vm.root.wrongs(self.rng)
         text = self.engine.format_text(wrong.text, text)
         tts = self.engine.format_tts(wrong.tts, tts)
         return text, tts
@@ -77,23 +94,19 @@ class DemoLevel(MelDictLevelBase):
         return None, None
 
     def _get_reply(self)-> tuple[str, str]:
-        main_db = MainDB()
         noteseq = self.__current_noteseq
         comparator = self.__current_comparator
 
         if noteseq is None:
-            noteseq = self.__current_noteseq = \
-                main_db.rnd(
-                    lambda ns:
-                        ns.is_interval and not ns.is_vertical)
+            noteseq = self.__current_noteseq = self._draw(_is_demo_interval)
 
-            comparator = self.__current_comparator = bool(rnd.getrandbits(1))
+            comparator = self.__current_comparator = bool(self.rng.getrandbits(1))
 
         if noteseq:
             gamelevel = self.game_level
             start_text, start_tts = self._select_start_reply(gamelevel)
-            task_text, task_tts = gamelevel.tasks()
-            question_text, question_tts = gamelevel.questions()(note_cmp=comparator)
+            task_text, task_tts = gamelevel.tasks(self.rng)
+            question_text, question_tts = gamelevel.questions(self.rng)(note_cmp=comparator)
             debug = self.__debug(noteseq, comparator)
 
             text = self.engine.format_text(
@@ -112,7 +125,7 @@ class DemoLevel(MelDictLevelBase):
 
         answer = self._get_last_number(message, button)
         if answer is None:
-            text, tts = VoiceMenu().root.dont_understand()
+            text, tts = VoiceMenu().root.dont_understand(self.rng)
             return text, self.engine.format_tts(tts)
 
         reply_text = reply_tts = None
@@ -132,7 +145,7 @@ class DemoLevel(MelDictLevelBase):
         self._reset_secrets()
 
         continue_text, continue_tts = (None, None) if self.finished \
-            else vm.levels.demo.continues()
+            else vm.levels.demo.continues(self.rng)
 
         next_text, next_tts = self.get_reply() # next interval
         debug = self.__debug(noteseq, comparator, answer)
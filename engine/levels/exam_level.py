@@ -8,17 +8,16 @@ from voicemenu import VoiceMenu, GameLevel
 from myconstants import *
 
 class ExamLevel(MelDictLevelBase):
-    def __init__(self,
-                 engine: MelDictEngineBase,
-                 missed_note_level: MissedNoteLevel,
-                 prima_location_level: PrimaLocationLevel,
-                 cadence_level: CadenceLevel,
-                 first_run = True):
+    def __init__(self, engine: MelDictEngineBase, first_run = True):
         super().__init__(engine, first_run)
-        self.__levels = missed_note_level, prima_location_level, cadence_level
+        # уровни экзамена принадлежат экзамену и создаются вместе с ним
+        self.__levels = \
+            MissedNoteLevel(engine, first_run), \
+            PrimaLocationLevel(engine, first_run), \
+            CadenceLevel(engine, first_run)
 
     @property
-    def id(self) -> int: return 100
+    def id(self) -> int: return LevelId.EXAM
 
     @property
     def game_level(self) -> GameLevel: return VoiceMenu().levels.exam
@@ -51,6 +50,14 @@ class ExamLevel(MelDictLevelBase):
     def _reset_secrets(self):
         pass
 
+    def _dump_secrets(self) -> list:
+        return [level.dump_state() for level in self.__levels]
+
+    def _load_secrets(self, secrets: list) -> bool:
+        for level, state in zip(self.__levels, secrets):
+            level.load_state(state)
+        return True
+
     def get_stats_reply(self):
         correct = self.correct_score
         reply = f"Всего отвечено на {correct} {MelDictLevelBase._decline_question(correct)} правильно."
@@ -92,5 +99,9 @@ class ExamLevel(MelDictLevelBase):
                         ttss.append(tts)
                 break
 
+        if self.finished:
+            self.engine.record_exam(self.correct_score, self.incorrect_score,
+                                    { level.id: [level.correct_score, level.incorrect_score] for level in self.__levels })
+
         return (self.engine.format_text(texts, sep="\n"), self.engine.format_tts(ttss, sep=".")) \
             if len(texts) > 0 else (None, None)
\ No newline at end of file
@@ -1,14 +1,15 @@
-import random as rnd
 from aliceio.types import Message, TextButton
 from typing import Iterable
 from engine.levels.base_level import MelDictLevelBase, NoReplyError
 from engine.musicnotesequence import MusicNoteSequence
 from engine.meldictenginebase import MelDictEngineBase
-from engine.maindb import MainDB
 from config import Config
-from voicemenu import VoiceMenu, GameLevel
+from voicemenu import VoiceMenu, GameLevel, FormatButton
 from myconstants import *
 
+def _is_missed_note_interval(ns: MusicNoteSequence) -> bool:
+    return ns.is_interval and ns.is_ascending and not ns.is_vertical and len(ns.name) > 0
+
 class MissedNoteLevel(MelDictLevelBase):
     def __init__(self, engine: MelDictEngineBase, first_run: bool = True):
         super().__init__(engine, first_run)
@@ -16,7 +17,7 @@ class MissedNoteLevel(MelDictLevelBase):
         self.__chord = None
 
     @property
-    def id(self) -> int: return 1
+    def id(self) -> int: return LevelId.MISSED_NOTE
 
     @property
     def game_level(self) -> GameLevel: return VoiceMenu().levels.missed_note
@@ -25,20 +26,29 @@ class MissedNoteLevel(MelDictLevelBase):
         self.__interval = None
         self.__chord = None
 
-    def get_buttons(self) -> Iterable[TextButton]:
-        if not self.finished:
-            answer = self.game_level.answers()
-            if answer:
-                title = answer.btn(item_number = 1, note_pos = 0)
-                yield self._create_button(title, 1)
-                title = answer.btn(item_number = 2, note_pos = 1)
-                yield self._create_button(title, 2)
-                title = answer.btn(item_number = 3, note_pos = 2)
-                yield self._create_button(title, 3)
+    def _dump_secrets(self) -> list:
+        return self._noteseq_ids(self.__interval, self.__chord)
+
+    def _task_noteseqs(self) -> tuple[MusicNoteSequence, ...]:
+        return (self.__interval,)
+
+    def _load_secrets(self, secrets: list) -> bool:
+        noteseqs = self._noteseqs(secrets)
+        if noteseqs:
+            self.__interval, self.__chord = noteseqs
+        return noteseqs is not None
+
+    def _create_answer_buttons(self, answer: FormatButton, _) -> Iterable[TextButton]:
+        title = answer.btn(item_number = 1, note_pos = 0)
+        yield self._create_button(title, 1)
+        title = answer.btn(item_number = 2, note_pos = 1)
+        yield self._create_button(title, 2)
+        title = answer.btn(item_number = 3, note_pos = 2)
+        yield self._create_button(title, 3)
 
     def __format_what(self, chord: MusicNoteSequence, interval: MusicNoteSequence) -> tuple[str, str]:
         gamelevel = self.game_level
-        what = gamelevel.whats()
+        what = gamelevel.whats(self.rng)
         text, tts = what(
             inversion=chord.inversion_str.lower(),
             maj=chord.is_chord_maj,
@@ -52,7 +62,7 @@ class MissedNoteLevel(MelDictLevelBase):
     def __format_incorrect(self, chord: MusicNoteSequence, interval: MusicNoteSequence) -> tuple[str, str]:        
         text = tts = None
         if self.show_right:
-            answer = self.game_level.answers()
+            answer = self.game_level.answers(self.rng)
             answer_text, answer_tts = answer(
                 note_pos=interval.missed_note)
             what_text, what_tts = self.__format_what(chord, interval)
@@ -68,19 +78,16 @@ class MissedNoteLevel(MelDictLevelBase):
                   f"Интервал: {chord.file_name}, {interval.id}, {interval.base_chord}, {interval}, пропуск: {interval.missed_note + 1}\n"]
 
     def _get_reply(self):
-        main_db = MainDB()
         interval = self.__interval
         chord = self.__chord
 
         if interval is None:
-            interval = main_db.rnd(
-                lambda ns:
-                    ns.is_interval and ns.is_ascending and not ns.is_vertical and len(ns.name) > 0)
+            interval = self._draw(_is_missed_note_interval)
 
             if interval is None:
                 raise NoReplyError(f"Не удалось выбрать интервал")
 
-            chord = main_db.rnd(
+            chord = self._draw(
                 lambda ns:
                     ns.is_triad and not ns.is_vertical and interval.base_chord == ns.id)
 
@@ -93,8 +100,8 @@ class MissedNoteLevel(MelDictLevelBase):
         if chord:
             gamelevel = self.game_level
             start_text, start_tts = self._select_start_reply(gamelevel)
-            task_text, task_tts = gamelevel.tasks()
-            question_text, question_tts = gamelevel.questions()
+            task_text, task_tts = gamelevel.tasks(self.rng)
+            question_text, question_tts = gamelevel.questions(self.rng)
             debug = self.__debug(chord, interval)
 
             text = self.engine.format_text(
@@ -121,7 +128,7 @@ class MissedNoteLevel(MelDictLevelBase):
 
         answer = self._get_last_number(message, button)
         if answer is None:
-            text, tts = VoiceMenu().root.dont_understand()
+            text, tts = VoiceMenu().root.dont_understand(self.rng)
             return text, self.engine.format_tts(tts)
 
         reply_text = reply_tts = None
@@ -136,7 +143,7 @@ class MissedNoteLevel(MelDictLevelBase):
         self._reset_secrets()
 
         continue_text, continue_tts = (None, None) if self.finished \
-            else self.game_level.continues()
+            else self.game_level.continues(self.rng)
 
         next_text, next_tts = self.get_reply() # next interval and chord
         debug = self.__debug(chord, interval, answer)
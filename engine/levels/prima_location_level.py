@@ -3,19 +3,27 @@ from typing import Iterable
 from engine.levels.base_level import MelDictLevelBase, NoReplyError
 from engine.musicnotesequence import MusicNoteSequence
 from engine.meldictenginebase import MelDictEngineBase
-from engine.maindb import MainDB
 from config import Config
-from voicemenu import VoiceMenu, GameLevel
-from myfilters import CmdFilter
+from voicemenu import VoiceMenu, GameLevel, FormatButton
+from myfilters import CmdTable
 from myconstants import *
 
+def _is_prima_location_triad(ns: MusicNoteSequence) -> bool:
+    return ns.is_triad and not ns.is_vertical and \
+        ns.prima_location != MusicNoteSequence.PRIMALOC_UNKNOWN
+
 class PrimaLocationLevel(MelDictLevelBase):
+    _answer_commands = CmdTable(
+        (MusicNoteSequence.PRIMALOC_BOTTOM, ("внизу", "снизу"), ("не", "нет")),
+        (MusicNoteSequence.PRIMALOC_MIDDLE, ("середин", "посреди", "посередин"), ("не", "нет")),
+        (MusicNoteSequence.PRIMALOC_TOP, ("сверху", "наверху", "вверху"), ("не", "нет")))
+
     def __init__(self, engine: MelDictEngineBase, first_run: bool = True):
         super().__init__(engine, first_run)
         self.__current_noteseq = None
 
     @property
-    def id(self) -> int: return 2
+    def id(self) -> int: return LevelId.PRIMA_LOCATION
 
     @property
     def game_level(self) -> GameLevel: return VoiceMenu().levels.prima_location
@@ -23,21 +31,30 @@ class PrimaLocationLevel(MelDictLevelBase):
     def _reset_secrets(self):
         self.__current_noteseq = None
 
-    def get_buttons(self) -> Iterable[TextButton]:
-        if not self.finished:
-            answer = self.game_level.answers()
-            if answer:
-                title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_BOTTOM)
-                yield self._create_button(title, MusicNoteSequence.PRIMALOC_BOTTOM)
-                title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_MIDDLE)
-                yield self._create_button(title, MusicNoteSequence.PRIMALOC_MIDDLE)
-                title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_TOP)
-                yield self._create_button(title, MusicNoteSequence.PRIMALOC_TOP)
+    def _dump_secrets(self) -> list:
+        return self._noteseq_ids(self.__current_noteseq)
+
+    def _task_noteseqs(self) -> tuple[MusicNoteSequence, ...]:
+        return (self.__current_noteseq,)
+
+    def _load_secrets(self, secrets: list) -> bool:
+        noteseqs = self._noteseqs(secrets)
+        if noteseqs:
+            self.__current_noteseq, = noteseqs
+        return noteseqs is not None
+
+    def _create_answer_buttons(self, answer: FormatButton, _) -> Iterable[TextButton]:
+        title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_BOTTOM)
+        yield self._create_button(title, MusicNoteSequence.PRIMALOC_BOTTOM)
+        title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_MIDDLE)
+        yield self._create_button(title, MusicNoteSequence.PRIMALOC_MIDDLE)
+        title = answer.btn(prima_loc = MusicNoteSequence.PRIMALOC_TOP)
+        yield self._create_button(title, MusicNoteSequence.PRIMALOC_TOP)
 
     def __format_incorrect(self, noteseq: MusicNoteSequence) -> tuple[str, str]:
         text = tts = None
         if self.show_right:
-            answer = self.game_level.answers()
+            answer = self.game_level.answers(self.rng)
             text, tts = answer(prima_loc=noteseq.prima_location)
         return super()._format_incorrect(text, tts)
 
@@ -48,21 +65,16 @@ class PrimaLocationLevel(MelDictLevelBase):
                    f"Загадан: {noteseq.file_name}, {noteseq.id}, {noteseq}, {noteseq.prima_location_str}\n"]
 
     def _get_reply(self)-> tuple[str, str]:
-        main_db = MainDB()
         noteseq = self.__current_noteseq
         
         if noteseq is None:
-            noteseq = self.__current_noteseq = main_db.rnd(
-                lambda ns:
-                    ns != self.__current_noteseq and \
-                    ns.is_triad and not ns.is_vertical and \
-                    ns.prima_location != MusicNoteSequence.PRIMALOC_UNKNOWN)
+            noteseq = self.__current_noteseq = self._draw(_is_prima_location_triad)
 
         if noteseq:
             gamelevel = self.game_level
             start_text, start_tts = self._select_start_reply(gamelevel)
-            task_text, task_tts = gamelevel.tasks()
-            question_text, question_tts = gamelevel.questions()
+            task_text, task_tts = gamelevel.tasks(self.rng)
+            question_text, question_tts = gamelevel.questions(self.rng)
             debug = self.__debug(noteseq)
 
             text = self.engine.format_text(
@@ -90,14 +102,9 @@ class PrimaLocationLevel(MelDictLevelBase):
         answer = self._get_value(message, button)
 
         if isinstance(answer, str):
-            if answer and CmdFilter.passed(answer, ("внизу", "снизу"), ("не", "нет")):
-                answer = MusicNoteSequence.PRIMALOC_BOTTOM
-            elif answer and CmdFilter.passed(answer, ("середин", "посреди", "посередин"), ("не", "нет")):
-                answer = MusicNoteSequence.PRIMALOC_MIDDLE
-            elif answer and CmdFilter.passed(answer, ("сверху", "наверху", "вверху"), ("не", "нет")):
-                answer = MusicNoteSequence.PRIMALOC_TOP
-            else:
-                text, tts = VoiceMenu().root.dont_understand()
+            answer = PrimaLocationLevel._answer_commands.select(answer)
+            if answer is None:
+                text, tts = VoiceMenu().root.dont_understand(self.rng)
                 return text, self.engine.format_tts(tts)
 
         reply_text = reply_tts = None
@@ -111,7 +118,7 @@ class PrimaLocationLevel(MelDictLevelBase):
         self._reset_secrets()
 
         continue_text, continue_tts = (None, None) if self.finished \
-            else self.game_level.continues()
+            else self.game_level.continues(self.rng)
 
         next_text, next_tts = self.get_reply() # next chord
         debug = self.__debug(noteseq, answer)
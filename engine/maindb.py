@@ -1,17 +1,32 @@
 import os
+import csv
 import logging
-import pandas as pd
-import random as rnd
+import random
 from typing import Callable, Iterable
 from engine.musicnotesequence import MusicNoteSequence
 from config import Config
 from singleton import SingletonMeta
+from metrics import count_draw
 from myconstants import *
 from abspath import abs_path
 
+def _csv_value(value: str) -> str | bool | None:
+    """Значение ячейки CSV: пустая - None, True/False - логическое значение, остальные - строка."""
+    if value == "":
+        return None
+    if value in ("True", "False"):
+        return value == "True"
+    return value
+
+def read_csv(file_name: str) -> list[dict[str, str | bool | None]]:
+    """Строки CSV-файла базы (разделитель SEP, кодировка UTF-8) в виде словарей по заголовку."""
+    with open(file_name, "r", encoding=UTF8, newline="") as file:
+        return [{ key: _csv_value(value) for key, value in row.items() } for row in csv.DictReader(file, delimiter=SEP)]
+
 class MainDB(metaclass=SingletonMeta):
     def __init__(self):
         self.__data = list[MusicNoteSequence]()
+        self.__by_id = dict[str, MusicNoteSequence]()
         self.__tts = dict[str, str]()
         self.__used_noteseqs = set[MusicNoteSequence]()
         self.__file = None
@@ -28,6 +43,10 @@ class MainDB(metaclass=SingletonMeta):
     def __len__(self):
         return len(self.__data)
 
+    def get(self, id: str) -> MusicNoteSequence:
+        """Последовательность по id из базы или None, если её нет (например, после изменения базы)."""
+        return self.__by_id.get(id)
+
     def clear_used(self):
         self.__used_noteseqs.clear()
 
@@ -36,36 +55,48 @@ class MainDB(metaclass=SingletonMeta):
             if predicate is None or predicate(noteseq) == True:
                 yield noteseq
 
-    def shuffle(self, predicate: Callable[[MusicNoteSequence], bool] = None) -> Iterable[MusicNoteSequence]:
+    def shuffle(self, predicate: Callable[[MusicNoteSequence], bool] = None,
+                rng: random.Random = None, used: set[MusicNoteSequence] = None) -> Iterable[MusicNoteSequence]:
+        """
+        Перебирает в случайном порядке (генератором rng, без него - модулем random) ещё не выбранные
+        последовательности и отмечает их выбранными в used (без него - в общем множестве базы).
+        """
+        rng = rng or random
+        used = self.__used_noteseqs if used is None else used
         filtered = 0
         dblen = len(self.__data)
 
         if dblen == 0: return
 
         for _ in range(2):
-            for i in rnd.sample(range(0, dblen), dblen):
+            for i in rng.sample(range(0, dblen), dblen):
                 noteseq = self.__data[i]
                 if predicate is None or predicate(noteseq) == True:
-                    if noteseq not in self.__used_noteseqs:
-                        self.__used_noteseqs.add(noteseq)
+                    if noteseq not in used:
+                        used.add(noteseq)
                         filtered += 1
                         yield noteseq
 
-            if filtered == 0 and len(self.__used_noteseqs) > 0:
-                self.__used_noteseqs.clear()
+            if filtered == 0 and len(used) > 0:
+                used.clear()
                 continue
             break
 
-    def rnd(self, predicate: Callable[[MusicNoteSequence], bool] = None) -> MusicNoteSequence:
-        for noteseq in self.shuffle(predicate):
+    def rnd(self, predicate: Callable[[MusicNoteSequence], bool] = None, level: int = None,
+            rng: random.Random = None, used: set[MusicNoteSequence] = None) -> MusicNoteSequence:
+        """Возвращает случайную ещё не выбранную последовательность; level - id уровня для метрик."""
+        count_draw(level)
+        for noteseq in self.shuffle(predicate, rng, used):
             return noteseq
 
     @classmethod
     def load(self):
+        """Загружает базу в новый экземпляр и публикует его только после успешной загрузки."""
         config = Config()
-        instance = self()
+        instance = self.create() # при ошибке остаётся прежняя база
         instance.__load_tts(config)
         instance.__load_main_db(config)
+        self.publish(instance)
         return instance
 
     def __load_tts(self, config: Config):
@@ -76,9 +107,7 @@ class MainDB(metaclass=SingletonMeta):
                 return
 
             logging.info("Загрузка файла TTS")
-            df = pd.read_csv(tts_db, sep=SEP, encoding=UTF8, index_col="text")
-            df.index = df.index.str.lower()
-            self.__tts = df.tts.dropna().to_dict()
+            self.__tts = { row["text"].lower(): row["tts"] for row in read_csv(tts_db) if row["text"] and row["tts"] }
 
             logging.info(f"Файл TTS загружен")
         except Exception as e:
@@ -93,20 +122,19 @@ class MainDB(metaclass=SingletonMeta):
                 return None
 
             logging.info(f"Загрузка базы трезвучий")
-            df = pd.read_csv(main_db, sep=SEP, encoding=UTF8, index_col="id")
             data = list[MusicNoteSequence]()
 
-            for index, row in df.iterrows():
-                noteseq = MusicNoteSequence(row.vertical,
-                                            row.note_1, row.note_2, row.note_3,
-                                            id=index,
-                                            base_chord=row.base_chord,
-                                            chord_str=row.chord_type,
-                                            interval_str=row.interval,
-                                            tonality_maj=row.tonality_maj,
-                                            chord_maj=row.chord_maj,
-                                            prima_location=row.prima_location,
-                                            inversion=row.inversion)
+            for row in read_csv(main_db):
+                noteseq = MusicNoteSequence(row["vertical"],
+                                            row["note_1"], row["note_2"], row["note_3"],
+                                            id=row["id"],
+                                            base_chord=row["base_chord"],
+                                            chord_str=row["chord_type"],
+                                            interval_str=row["interval"],
+                                            tonality_maj=row["tonality_maj"],
+                                            chord_maj=row["chord_maj"],
+                                            prima_location=row["prima_location"],
+                                            inversion=row["inversion"])
 
                 noteseq.tts_name = self.__tts.get(noteseq.name.lower(), None)
                 data.append(noteseq)
@@ -117,6 +145,7 @@ class MainDB(metaclass=SingletonMeta):
                         logging.warning(f"Странный интервал {distance / 2:.1f} тонов:\n{row}")
             
             self.__data = data
+            self.__by_id = { noteseq.id: noteseq for noteseq in data }
             self.__file = main_db
             self.clear_used()
 
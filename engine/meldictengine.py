@@ -5,33 +5,100 @@ from engine.levels.prima_location_level import PrimaLocationLevel
 from engine.levels.cadence_level import CadenceLevel
 from engine.levels.exam_level import ExamLevel
 from engine.meldictenginebase import MelDictEngineBase
-from engine.maindb import MainDB
+from engine.musicnotesequence import MusicNoteSequence
 from myconstants import *
 from voicemenu import VoiceMenu
 
+def _is_greeting_chord(ns: MusicNoteSequence) -> bool:
+    return ns.is_vertical and (ns.is_chord_maj or ns.is_tonality_maj)
+
 class MelDictEngine(MelDictEngineBase):
-    def __init__(self, skill_id):
-        super().__init__(skill_id)
-        self._demo_level = DemoLevel(self)
-        self._missed_note_level = MissedNoteLevel(self)
-        self._prima_loc_level = PrimaLocationLevel(self)
-        self._cadence_level = CadenceLevel(self)
-        self._exam = ExamLevel(self, self._missed_note_level, self._prima_loc_level, self._cadence_level)
-        self._current_level = None
+    _level_types: dict[int, type[MelDictLevelBase]] = {
+        LevelId.DEMO: DemoLevel,
+        LevelId.MISSED_NOTE: MissedNoteLevel,
+        LevelId.PRIMA_LOCATION: PrimaLocationLevel,
+        LevelId.CADENCE: CadenceLevel,
+        LevelId.EXAM: ExamLevel,
+    }
+
+    _train_level_ids = (LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE)
+
+    def __init__(self, skill_id, seed: int = None):
+        super().__init__(skill_id, seed)
+        # уровни создаются при входе в них и освобождаются при выходе
+        self._current_level: MelDictLevelBase = None
+        self._exam: ExamLevel = None # последний экзамен, хранится ради статистики
+        self._visited_levels = set[int]()
 
     @MelDictEngineBase.mode.setter
     def mode(self, value: int):
         self._mode = max(GameMode.UNKNOWN, value)
-        MainDB().clear_used()
+        self.used_noteseqs.clear()
 
         match self._mode:
             case GameMode.DEMO:
-                self._current_level = None
-                self._demo_level.reset()
+                self._current_level = self._create_level(LevelId.DEMO)
 
             case GameMode.EXAM:
+                self._current_level = self._exam = self._create_level(LevelId.EXAM)
+
+            case GameMode.TRAIN:
+                pass # уровень выбирается в select_train_level
+
+            case _:
                 self._current_level = None
-                self._exam.reset()
+                if self._exam and not self._exam.started:
+                    self._exam = None
+
+    def _create_level(self, level_id: int) -> MelDictLevelBase:
+        level_type = MelDictEngine._level_types.get(level_id)
+        if level_type is None: return None
+
+        # уровень, который пользователь проходил в прошлых сессиях, начинается без вступления
+        first_run = level_id not in self._visited_levels and not (self.progress and self.progress.played(level_id))
+        self._visited_levels.add(level_id)
+        return level_type(self, first_run)
+
+    def dump_state(self) -> list:
+        """
+        Состояние сессии для сохранения при перезапуске сервера: режим, пройденные уровни,
+        последний экзамен, текущий уровень (True - текущий уровень и есть экзамен) и состояние
+        случайных выборок.
+        """
+        level = self._current_level
+        if level is not None and level is not self._exam:
+            level = [level.id, level.dump_state()]
+        elif level is not None:
+            level = True
+
+        return [self._mode, sorted(self._visited_levels), self._exam.dump_state() if self._exam else None, level,
+                self._dump_random()]
+
+    def load_state(self, state: list):
+        """Восстанавливает состояние, сохранённое dump_state."""
+        self._mode, visited, exam, level, random_state = state[:5]
+        self._visited_levels = set(visited)
+        self._load_random(random_state)
+
+        if exam is not None:
+            self._exam = ExamLevel(self)
+            self._exam.load_state(exam)
+
+        if level is True:
+            self._current_level = self._exam
+        elif level is not None:
+            level_id, level_state = level
+            self._current_level = MelDictEngine._level_types[level_id](self)
+            self._current_level.load_state(level_state)
+
+    def select_train_level(self, level_id: int) -> MelDictLevelBase:
+        """Создаёт тренировочный уровень и переводит движок в режим тренировки."""
+        if level_id not in MelDictEngine._train_level_ids:
+            return None
+
+        self.mode = GameMode.TRAIN
+        self._current_level = self._create_level(level_id)
+        return self._current_level
 
     def get_rules_reply(self) -> tuple[str, str]:
         text, tts = VoiceMenu().main_menu.rules
@@ -40,10 +107,17 @@ class MelDictEngine(MelDictEngineBase):
     def get_stats_reply(self) -> tuple[str, str]:
         match self.mode:
             case GameMode.DEMO | GameMode.TRAIN:
-                text, tts = VoiceMenu().root.level_not_scored()
+                text, tts = VoiceMenu().root.level_not_scored(self.rng)
+            case _ if self._exam and self._exam.started:
+                text, tts = self._exam.get_stats_reply()
+            case _ if self.progress and self.progress.last_exam:
+                exam = self.progress.last_exam
+                text, tts = VoiceMenu().root.last_exam(self.rng)(
+                    correct = exam.correct,
+                    questions = MelDictLevelBase._decline_question(exam.correct),
+                    total = exam.total)
             case _:
-                text, tts = self._exam.get_stats_reply() if self._exam.started \
-                    else VoiceMenu().root.no_score()
+                text, tts = VoiceMenu().root.no_score(self.rng)
 
         return text, tts
 
@@ -53,9 +127,7 @@ class MelDictEngine(MelDictEngineBase):
 
         match self.mode:
             case GameMode.INIT:
-                noteseq = MainDB().rnd(
-                    lambda ns:
-                        ns.is_vertical and (ns.is_chord_maj or ns.is_tonality_maj))
+                noteseq = self.draw(_is_greeting_chord)
 
                 self.mode = GameMode.MENU
                 greet = VoiceMenu().main_menu.greetings(first_run=True)
@@ -74,32 +146,26 @@ class MelDictEngine(MelDictEngineBase):
                     cadence = vm.levels.cadence.name)
                 return text, tts
 
-            case GameMode.DEMO:
-                level = self._demo_level
-
-            case GameMode.TRAIN:
+            case GameMode.DEMO | GameMode.TRAIN | GameMode.EXAM:
                 level = self._current_level
 
-            case GameMode.EXAM:
-                level = self._exam
-
         if level:
             text, tts = level.get_reply()
             return text, tts
 
-        return VoiceMenu().root.dont_understand()
+        return VoiceMenu().root.dont_understand(self.rng)
     
     def process_back_action(self) -> tuple[str, str]:
         match self.mode:
             case GameMode.MENU:
-                text, tts = VoiceMenu().root.no_way_back()
+                text, tts = VoiceMenu().root.no_way_back(self.rng)
                 return text, tts
             case GameMode.DEMO | GameMode.TRAIN_MENU | GameMode.EXAM:
                 self.mode = GameMode.MENU
             case GameMode.TRAIN:
                 self.mode = GameMode.TRAIN_MENU
             case _:
-                text, tts = VoiceMenu().root.dont_understand()
+                text, tts = VoiceMenu().root.dont_understand(self.rng)
                 return text, tts
 
         text, tts = self.get_reply()
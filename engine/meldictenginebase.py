@@ -1,18 +1,81 @@
+import random
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import Callable, Iterable
 from aliceio.types import Message, TextButton
 from engine.musicnotesequence import MusicNoteSequence
+from engine.maindb import MainDB
+from engine.progressdb import UserProgress
 from myconstants import *
 
 class MelDictEngineBase(ABC):
-    def __init__(self, skill_id: str):
+    """
+    Случайные выборки сессии (задания, варианты реплик и кнопок) берутся из собственного генератора
+    движка. В начале хода begin_turn переинициализирует его от seed сессии и номера хода, а номер
+    хода увеличивается (end_turn), только когда ответ отправлен пользователю, поэтому любой
+    услышанный пользователем ход воспроизводится по сохранённому состоянию. Последовательности, уже
+    загаданные в сессии, не повторяются, пока не сменится режим.
+
+    Ответы и завершённые экзамены записываются в прогресс пользователя (progress), если он задан.
+    """
+    def __init__(self, skill_id: str, seed: int = None):
         assert isinstance(skill_id, str) and len(skill_id) > 0
         self.__skill_id = skill_id
         self._mode = GameMode.UNKNOWN
+        self.__seed = seed if seed is not None else random.getrandbits(63)
+        self.__turn = 0
+        self.__rng = random.Random(self.__seed)
+        self.__used_noteseqs = set[MusicNoteSequence]()
+        self.__progress: UserProgress = None
 
     @property
     def skill_id(self) -> str: return self.__skill_id
 
+    @property
+    def seed(self) -> int: return self.__seed
+
+    @property
+    def turn(self) -> int: return self.__turn
+
+    @property
+    def rng(self) -> random.Random: return self.__rng
+
+    @property
+    def used_noteseqs(self) -> set[MusicNoteSequence]: return self.__used_noteseqs
+
+    @property
+    def progress(self) -> UserProgress: return self.__progress
+    @progress.setter
+    def progress(self, value: UserProgress): self.__progress = value
+
+    def record_answer(self, level_id: int, correct: bool, noteseqs: Iterable[MusicNoteSequence] = ()):
+        if self.__progress is not None:
+            self.__progress.add_answer(level_id, correct, (noteseq.id for noteseq in noteseqs if noteseq is not None))
+
+    def record_exam(self, correct: int, incorrect: int, levels: dict[int, list[int]]):
+        if self.__progress is not None:
+            self.__progress.add_exam(correct, incorrect, levels)
+
+    def begin_turn(self):
+        """Начинает ход пользователя: генератор зависит только от seed и номера хода."""
+        self.__rng.seed((self.__seed << 32) + self.__turn)
+
+    def end_turn(self):
+        """Завершает ход, ответ на который отправлен пользователю."""
+        self.__turn += 1
+
+    def draw(self, predicate: Callable[[MusicNoteSequence], bool], level: int = None) -> MusicNoteSequence:
+        """Случайная последовательность базы, ещё не загаданная в сессии."""
+        return MainDB().rnd(predicate, level, self.__rng, self.__used_noteseqs)
+
+    def _dump_random(self) -> list:
+        return [self.__seed, self.__turn, sorted(noteseq.id for noteseq in self.__used_noteseqs)]
+
+    def _load_random(self, state: list):
+        self.__seed, self.__turn, used = state
+        main_db = MainDB()
+        self.__used_noteseqs = { noteseq for noteseq in map(main_db.get, used) if noteseq is not None }
+        self.__rng.seed(self.__seed) # до begin_turn выборки не зависят от состояния исходного генератора
+
     @property
     def mode(self) -> int: return self._mode
 
@@ -49,10 +112,18 @@ class MelDictEngineBase(ABC):
         pass
 
     def format_text(self, *args: Iterable[str], sep = " ") -> str:
-        return self.__format_text(False, *args, sep=sep)
-
-    def __format_text(self, new_line: bool, *args: Iterable[str], sep = " ") -> str:
-        text = ""
+        """
+        Склеивает фрагменты ответа: sep ставится перед фрагментом, начинающимся с буквы или цифры,
+        если он не первый и предыдущий не закончился переводом строки. None и пустые строки пропускаются.
+        Вложенная коллекция склеивается через пробел и считается одним фрагментом.
+        """
+        parts = []
+        self.__format_text(parts, False, args, sep)
+        return "".join(parts)
+
+    def __format_text(self, parts: list[str], new_line: bool, args: Iterable, sep: str) -> bool:
+        """Добавляет фрагменты в parts; возвращает признак перевода строки в конце."""
+        start = len(parts)
 
         for value in args:
             if value is None:
@@ -60,50 +131,91 @@ class MelDictEngineBase(ABC):
             if isinstance(value, str):
                 pass # pass required
             elif isinstance(value, Iterable):
-                value = self.__format_text(new_line, *value)
+                # место под разделитель перед коллекцией, заполняется, когда известен её первый символ
+                slot = len(parts) if len(parts) > start else None
+                if slot is not None:
+                    parts.append("")
+
+                group_new_line = self.__format_text(parts, new_line, value, " ")
+                if slot is not None:
+                    if len(parts) == slot + 1: # пустая коллекция
+                        parts.pop()
+                        continue
+                    if not new_line and len(sep) > 0 and parts[slot + 1][0].isalnum():
+                        parts[slot] = sep
+                elif len(parts) == start:
+                    continue
+
+                new_line = group_new_line
+                continue
             else:
                 value = str(value)
 
             if len(value) == 0:
                 continue
 
-            if not new_line and len(sep) > 0 and len(text) > 0 and value[0].isalnum():
-                text += sep
+            if not new_line and len(sep) > 0 and len(parts) > start and value[0].isalnum():
+                parts.append(sep)
 
-            text += value
+            parts.append(value)
             new_line = value[-1] == "\n"
 
-        return text
+        return new_line
 
     def format_tts(self, *args: Iterable[str] | Iterable[MusicNoteSequence], sep = " ") -> str:
-        return self.__format_tts(False, False, *args, sep=sep)[0]
+        """
+        То же, что format_text, но MusicNoteSequence заменяется тегом звука: перед тегом разделитель
+        не ставится, и тег не меняет признак перевода строки. Вложенная коллекция, заканчивающаяся тегом,
+        тоже не отделяется разделителем и не меняет признак перевода строки.
+        """
+        parts = []
+        self.__format_tts(parts, False, args, sep)
+        return "".join(parts)
+
+    def __format_tts(self, parts: list[str], new_line: bool, args: Iterable, sep: str) -> tuple[bool, bool]:
+        """Добавляет фрагменты в parts; возвращает признак перевода строки и признак тега в конце."""
+        start = len(parts)
+        tag = False
 
-    def __format_tts(self, new_line: bool, prev_tag: bool, *args: Iterable[str] | Iterable[MusicNoteSequence], sep = " ") \
-        -> tuple[str, bool]:
-        tts = ""
         for value in args:
-            tag = False
-
             if value is None:
                 continue
+
+            is_tag = False
             if isinstance(value, str):
                 pass # pass required
             elif isinstance(value, MusicNoteSequence):
                 value = self.get_audio_tag(value.file_name)
-                tag = True
+                is_tag = True
             elif isinstance(value, Iterable):
-                value, tag = self.__format_tts(new_line, prev_tag, *value)
+                slot = len(parts) if len(parts) > start else None
+                if slot is not None:
+                    parts.append("")
+
+                group_new_line, group_tag = self.__format_tts(parts, new_line, value, " ")
+                if slot is not None:
+                    if len(parts) == slot + 1: # пустая коллекция
+                        parts.pop()
+                        continue
+                    if not new_line and not group_tag and len(sep) > 0 and parts[slot + 1][0].isalnum():
+                        parts[slot] = sep
+                elif len(parts) == start:
+                    continue
+
+                new_line = new_line if group_tag else group_new_line
+                tag = group_tag
+                continue
             else:
                 value = str(value)
 
             if len(value) == 0:
                 continue
 
-            if not new_line and not tag and len(sep) > 0 and len(tts) > 0 and value[0].isalnum():
-                tts += sep
+            if not new_line and not is_tag and len(sep) > 0 and len(parts) > start and value[0].isalnum():
+                parts.append(sep)
 
-            tts += value
-            new_line = new_line if tag else value[-1] == "\n"
-            prev_tag = tag
+            parts.append(value)
+            new_line = new_line if is_tag else value[-1] == "\n"
+            tag = is_tag
 
-        return tts, prev_tag
\ No newline at end of file
+        return new_line, tag
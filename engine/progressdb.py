@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from metrics import metrics
+from myconstants import *
+
+HISTORY = 10 # последних экзаменов пользователя в памяти
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS levels (
+    user_id TEXT NOT NULL,
+    level_id INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    incorrect INTEGER NOT NULL,
+    PRIMARY KEY (user_id, level_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS errors (
+    user_id TEXT NOT NULL,
+    noteseq_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, noteseq_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS exams (
+    user_id TEXT NOT NULL,
+    finished REAL NOT NULL,
+    correct INTEGER NOT NULL,
+    incorrect INTEGER NOT NULL,
+    levels TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS exams_user ON exams (user_id, finished);
+"""
+
+class ExamRecord:
+    """Завершённый экзамен: время завершения, баллы и баллы по уровням { id уровня: [правильно, неправильно] }."""
+    __slots__ = ("finished", "correct", "incorrect", "levels")
+
+    def __init__(self, finished: float, correct: int, incorrect: int, levels: dict[int, list[int]]):
+        self.finished = finished
+        self.correct = correct
+        self.incorrect = incorrect
+        self.levels = levels
+
+    @property
+    def total(self) -> int: return self.correct + self.incorrect
+
+
+class UserProgress:
+    """
+    Прогресс пользователя: история экзаменов, точность по уровням и количество ошибок
+    по последовательностям базы трезвучий.
+
+    Изменения видны сразу, а в базу записываются фоновой задачей ProgressDB. Пока сохранённый
+    прогресс не прочитан из базы (loaded), объект содержит только изменения этого процесса;
+    после чтения они добавляются к сохранённым значениям.
+    """
+    def __init__(self, db: "ProgressDB", user_id: str):
+        self.__db = db
+        self.__user_id = user_id
+        self.__loaded = False
+        self.__levels = dict[int, list[int]]() # id уровня: [правильно, неправильно]
+        self.__errors = dict[str, int]() # id последовательности: ошибок
+        self.__exams = list[ExamRecord]() # от старых к новым, не больше HISTORY
+
+    @property
+    def user_id(self) -> str: return self.__user_id
+
+    @property
+    def loaded(self) -> bool: return self.__loaded
+
+    @property
+    def exams(self) -> tuple[ExamRecord, ...]: return tuple(self.__exams)
+
+    @property
+    def last_exam(self) -> ExamRecord: return self.__exams[-1] if self.__exams else None
+
+    def accuracy(self, level_id: int) -> tuple[int, int]:
+        """Количество правильных и неправильных ответов на уровне, включая ответы на экзаменах."""
+        return tuple(self.__levels.get(level_id, (0, 0)))
+
+    def errors(self, noteseq_id: str) -> int:
+        return self.__errors.get(noteseq_id, 0)
+
+    def played(self, level_id: int) -> bool:
+        return level_id in self.__levels or (level_id == LevelId.EXAM and len(self.__exams) > 0)
+
+    def add_answer(self, level_id: int, correct: bool, noteseq_ids: Iterable[str] = ()):
+        noteseq_ids = tuple(noteseq_ids) if not correct else ()
+        with self.__db.lock:
+            self._apply_answer(level_id, correct, noteseq_ids)
+            self.__db.queue_answer(self.__user_id, level_id, correct, noteseq_ids)
+
+    def add_exam(self, correct: int, incorrect: int, levels: dict[int, list[int]]):
+        exam = ExamRecord(time.time(), correct, incorrect, levels)
+        with self.__db.lock:
+            self._apply_exam(exam)
+            self.__db.queue_exam(self.__user_id, exam)
+
+    def _apply_answer(self, level_id: int, correct: bool, noteseq_ids: tuple[str, ...]):
+        counts = self.__levels.setdefault(level_id, [0, 0])
+        counts[0 if correct else 1] += 1
+        for noteseq_id in noteseq_ids:
+            self.__errors[noteseq_id] = self.__errors.get(noteseq_id, 0) + 1
+
+    def _apply_exam(self, exam: ExamRecord):
+        self.__exams.append(exam)
+        del self.__exams[:-HISTORY]
+
+    def _load(self, levels: list[tuple], errors: list[tuple], exams: list[ExamRecord]):
+        """Заменяет прогресс сохранённым в базе; изменения, ещё не записанные в базу, ProgressDB применяет заново."""
+        self.__levels = { level_id: [correct, incorrect] for level_id, correct, incorrect in levels }
+        self.__errors = dict(errors)
+        self.__exams = exams[-HISTORY:]
+        self.__loaded = True
+
+
+class ProgressDB:
+    """
+    Хранилище прогресса пользователей (UserProgress) в локальной базе SQLite.
+
+    Прогресс пользователя берётся из кэша в памяти (get); если его там нет, возвращается пустой
+    прогресс, а чтение из базы ставится в очередь. Изменения копятся в памяти. Фоновая задача
+    (run) раз в flush_interval секунд записывает их в базу одной транзакцией, а очередь чтения
+    выполняет сразу, как только она появилась. Обращения к базе выполняются в отдельном потоке,
+    поэтому обработка запросов не ждёт диска. В кэше хранятся не больше max_users пользователей,
+    давно не обращавшиеся вытесняются.
+
+    Точность по уровням и ошибки записываются приращениями, поэтому несколько рабочих процессов
+    могут писать в одну базу; прогресс в кэше одного процесса не видит изменений других процессов.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock() # кэш, прогресс пользователей и очереди
+        self.__db_lock = threading.Lock() # соединение с базой
+        self.__connection: sqlite3.Connection = None
+        self.__file = None
+        self.__max_users = 0
+        self.__users = OrderedDict[str, UserProgress]()
+        self.__answers = list[tuple[str, int, bool, tuple[str, ...]]]()
+        self.__exams = list[tuple[str, ExamRecord]]()
+        self.__loads = list[UserProgress]()
+        self.__wakeup: asyncio.Event = None
+
+    @property
+    def lock(self) -> threading.Lock: return self.__lock
+
+    @property
+    def file(self) -> str: return self.__file
+
+    @property
+    def opened(self) -> bool: return self.__connection is not None
+
+    @property
+    def pending(self) -> int: return len(self.__answers) + len(self.__exams)
+
+    def open(self, file_name: str, max_users: int = 10000):
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        connection = sqlite3.connect(file_name, timeout=30.0, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self.__connection = connection
+        self.__file = file_name
+        self.__max_users = max_users
+        logging.info(f"База прогресса пользователей открыта: {file_name}")
+
+    def close(self):
+        """Записывает накопленные изменения и закрывает базу."""
+        if self.__connection is None:
+            return
+
+        self.flush()
+        with self.__db_lock:
+            self.__connection.close()
+            self.__connection = None
+        with self.__lock:
+            self.__users.clear()
+
+    def get(self, user_id: str) -> UserProgress:
+        """Прогресс пользователя из кэша; None, если база не открыта."""
+        if self.__connection is None or not user_id:
+            return None
+
+        with self.__lock:
+            progress = self.__users.get(user_id)
+            if progress is not None:
+                self.__users.move_to_end(user_id)
+                return progress
+
+            progress = self.__users[user_id] = UserProgress(self, user_id)
+            if len(self.__users) > self.__max_users:
+                self.__users.popitem(last=False)
+            self.__loads.append(progress)
+
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+        return progress
+
+    def queue_answer(self, user_id: str, level_id: int, correct: bool, noteseq_ids: tuple[str, ...]):
+        """Ставит ответ в очередь записи; вызывается под lock."""
+        self.__answers.append((user_id, level_id, correct, noteseq_ids))
+
+    def queue_exam(self, user_id: str, exam: ExamRecord):
+        """Ставит экзамен в очередь записи; вызывается под lock."""
+        self.__exams.append((user_id, exam))
+
+    def flush(self, write: bool = True) -> int:
+        """
+        Записывает накопленные изменения в базу (если write) и читает прогресс пользователей
+        из очереди чтения. Возвращает количество записанных изменений. Выполняется вне цикла событий.
+        """
+        with self.__lock:
+            answers = exams = ()
+            if write:
+                answers, self.__answers = self.__answers, []
+                exams, self.__exams = self.__exams, []
+            loads, self.__loads = self.__loads, []
+
+        written = 0
+        if answers or exams:
+            try:
+                self.__write(answers, exams)
+                written = len(answers) + len(exams)
+                metrics.progress_writes.labels("ok").inc(written)
+            except Exception as e:
+                metrics.progress_writes.labels("error").inc(len(answers) + len(exams))
+                logging.error(f"Ошибка записи прогресса пользователей в {self.__file}", exc_info=e)
+
+        for progress in loads:
+            try:
+                self.__load(progress)
+            except Exception as e:
+                logging.error(f"Ошибка чтения прогресса пользователя {progress.user_id}", exc_info=e)
+
+        return written
+
+    def __write(self, answers: list[tuple], exams: list[tuple[str, ExamRecord]]):
+        levels = dict[tuple[str, int], list[int]]()
+        errors = dict[tuple[str, str], int]()
+
+        for user_id, level_id, correct, noteseq_ids in answers:
+            counts = levels.setdefault((user_id, level_id), [0, 0])
+            counts[0 if correct else 1] += 1
+            for noteseq_id in noteseq_ids:
+                errors[(user_id, noteseq_id)] = errors.get((user_id, noteseq_id), 0) + 1
+
+        with self.__db_lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT INTO levels VALUES (?, ?, ?, ?) ON CONFLICT (user_id, level_id) "
+                "DO UPDATE SET correct = correct + excluded.correct, incorrect = incorrect + excluded.incorrect",
+                ((user_id, level_id, correct, incorrect) for (user_id, level_id), (correct, incorrect) in levels.items()))
+            self.__connection.executemany(
+                "INSERT INTO errors VALUES (?, ?, ?) ON CONFLICT (user_id, noteseq_id) "
+                "DO UPDATE SET count = count + excluded.count",
+                ((user_id, noteseq_id, count) for (user_id, noteseq_id), count in errors.items()))
+            self.__connection.executemany(
+                "INSERT INTO exams VALUES (?, ?, ?, ?, ?)",
+                ((user_id, exam.finished, exam.correct, exam.incorrect, json.dumps(exam.levels, separators=(",", ":")))
+                 for user_id, exam in exams))
+
+    def __load(self, progress: UserProgress):
+        user_id = progress.user_id
+        with self.__db_lock:
+            levels = self.__connection.execute(
+                "SELECT level_id, correct, incorrect FROM levels WHERE user_id = ?", (user_id,)).fetchall()
+            errors = self.__connection.execute(
+                "SELECT noteseq_id, count FROM errors WHERE user_id = ?", (user_id,)).fetchall()
+            exams = self.__connection.execute(
+                "SELECT finished, correct, incorrect, levels FROM exams WHERE user_id = ? ORDER BY finished DESC LIMIT ?",
+                (user_id, HISTORY)).fetchall()
+
+        exams = [ExamRecord(finished, correct, incorrect, { int(level_id): counts for level_id, counts in json.loads(levels_json).items() })
+                 for finished, correct, incorrect, levels_json in reversed(exams)]
+
+        # изменения, сделанные после начала записи, ещё в очереди: база их не содержит
+        with self.__lock:
+            progress._load(levels, errors, exams)
+            for answer_user_id, level_id, correct, noteseq_ids in self.__answers:
+                if answer_user_id == user_id:
+                    progress._apply_answer(level_id, correct, noteseq_ids)
+            for exam_user_id, exam in self.__exams:
+                if exam_user_id == user_id:
+                    progress._apply_exam(exam)
+
+    async def run(self, flush_interval: float):
+        """Фоновая задача: запись изменений раз в flush_interval секунд и чтение прогресса по запросу."""
+        self.__wakeup = asyncio.Event()
+        written = time.monotonic()
+        try:
+            while True:
+                timeout = max(0.0, written + flush_interval - time.monotonic())
+                try:
+                    await asyncio.wait_for(self.__wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+                self.__wakeup.clear()
+                write = time.monotonic() - written >= flush_interval
+                await asyncio.to_thread(self.flush, write)
+                if write:
+                    written = time.monotonic()
+        finally:
+            self.__wakeup = None
+
+
+progress_db = ProgressDB()
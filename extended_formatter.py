@@ -1,4 +1,5 @@
 from string import Formatter
+from collections.abc import Callable
 
 class ExtendedFormatter(Formatter):
     """An extended format string formatter
@@ -29,4 +30,29 @@ class ExtendedFormatter(Formatter):
                 return str(value).capitalize()
 
         # Do the default conversion or raise error if no matching conversion found
-        return super(ExtendedFormatter, self).convert_field(value, conversion)
\ No newline at end of file
+        return super(ExtendedFormatter, self).convert_field(value, conversion)
+
+    def converter(self, conversion) -> Callable:
+        """ Resolve conversion symbol once
+
+        Returns a function which performs the same conversion as
+        convert_field, so that templates can be compiled in advance
+        """
+        match conversion:
+            case None:
+                return lambda value: value
+            case "u":
+                return lambda value: str(value).upper()
+            case "l":
+                return lambda value: str(value).lower()
+            case "c":
+                return lambda value: str(value).capitalize()
+            case "s":
+                return str
+            case "r":
+                return repr
+            case "a":
+                return ascii
+
+        # Let the formatter raise the error for unknown conversion
+        return lambda value: self.convert_field(value, conversion)
\ No newline at end of file
@@ -1,32 +1,143 @@
 import os
+import time
+import hashlib
 import logging
+import threading
 from collections.abc import Callable
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileSystemEvent
+from metrics import metrics, Timer
+
+
+class WatchedFile:
+    """Файл ресурса, перезагружаемого при изменении."""
+    def __init__(self, file_name: str, callback: Callable[[str], None]):
+        self.file_name = os.path.abspath(file_name)
+        self.name = os.path.basename(self.file_name)
+        self.callback = callback
+        self.digest = file_digest(self.file_name)
+
+
+def file_digest(file_name: str) -> bytes:
+    try:
+        with open(file_name, "rb") as file:
+            return hashlib.sha256(file.read()).digest()
+    except OSError:
+        return None
 
 
 # Обработчик событий для Watchdog
 class ModifiedHandler(FileSystemEventHandler):
-    def __init__(self, file_name: str, callback: Callable[[str], None]):
+    def __init__(self, on_change: Callable[[str], None]):
+        assert on_change
+        self.__on_change = on_change
+
+    def on_modified(self, event: FileSystemEvent):
+        self.__on_change(event.src_path)
+
+    def on_created(self, event: FileSystemEvent):
+        self.__on_change(event.src_path)
+
+    def on_moved(self, event: FileSystemEvent):
+        # редакторы сохраняют файл во временный и переименовывают его в исходный
+        self.__on_change(event.dest_path)
+
+
+class FileWatcher:
+    """
+    Один наблюдатель watchdog для всех перезагружаемых файлов.
+
+    События файла собираются в течение debounce секунд после последнего из них, после чего файл
+    перезагружается один раз в отдельном потоке, а не в потоке наблюдателя или цикла событий.
+    Если содержимое не изменилось (по SHA-256), перезагрузка пропускается. Ошибка перезагрузки
+    записывается в лог, а ресурс остаётся в последнем успешно загруженном состоянии: загрузчики
+    публикуют новый экземпляр только после успешной загрузки.
+    """
+    def __init__(self, debounce: float = 0.5):
+        assert debounce >= 0
+        self.__debounce = debounce
+        self.__files = dict[str, WatchedFile]()
+        self.__folders = set[str]()
+        self.__pending = dict[str, float]() # файл: время перезагрузки
+        self.__condition = threading.Condition()
+        self.__stopped = False
+        self.__observer = Observer()
+        self.__handler = ModifiedHandler(self.__on_change)
+        self.__thread = threading.Thread(target=self.__run, name="filewatcher", daemon=True)
+
+    def watch(self, file_name: str, callback: Callable[[str], None]):
+        """Регистрирует файл; callback(file_name) перезагружает ресурс и бросает исключение при ошибке."""
         assert file_name
         assert callback
-        self.file_name = os.path.abspath(file_name)
-        self.__callback = callback
-
-    def on_modified(self, event):
-        if os.path.abspath(event.src_path) == self.file_name:
-            try:
-                logging.info(f"Обнаружено изменение {self.file_name}")
-                self.__callback(self.file_name)
-            except:
-                pass
-
-def start_file_watcher(file_name: str, callback: Callable[[str], None]):
-    """Запускает наблюдателя для отслеживания изменений файла."""
-    event_handler = ModifiedHandler(file_name, callback)
-    observer = Observer()
-    folder_path = os.path.dirname(event_handler.file_name)
-    observer.schedule(event_handler, path=folder_path, recursive=False)
-    observer.start()
-    logging.info(f"Запущено наблюдение за изменениями {event_handler.file_name}")
-    return observer
\ No newline at end of file
+        watched = WatchedFile(file_name, callback)
+        self.__files[watched.file_name] = watched
+
+        folder = os.path.dirname(watched.file_name)
+        if folder not in self.__folders:
+            self.__folders.add(folder)
+            self.__observer.schedule(self.__handler, path=folder, recursive=False)
+
+        logging.info(f"Запущено наблюдение за изменениями {watched.file_name}")
+
+    def start(self):
+        self.__observer.start()
+        self.__thread.start()
+
+    def stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+
+        self.__observer.stop()
+        self.__observer.join()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def __on_change(self, path: str):
+        file_name = os.path.abspath(path)
+        if file_name not in self.__files:
+            return
+
+        with self.__condition:
+            self.__pending[file_name] = time.monotonic() + self.__debounce
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__stopped:
+                    now = time.monotonic()
+                    due = [name for name, deadline in self.__pending.items() if deadline <= now]
+                    if due:
+                        break
+                    self.__condition.wait(min(self.__pending.values()) - now if self.__pending else None)
+
+                if self.__stopped:
+                    return
+
+                for name in due:
+                    self.__pending.pop(name)
+
+            for name in due:
+                self.__reload(self.__files[name])
+
+    def __reload(self, watched: WatchedFile):
+        digest = file_digest(watched.file_name)
+        if digest is None: # файл удалён или ещё не записан, о новом файле придёт отдельное событие
+            return
+        if digest == watched.digest:
+            metrics.reloads.labels(watched.name, "unchanged").inc()
+            return
+
+        logging.info(f"Обнаружено изменение {watched.file_name}")
+        try:
+            with Timer(metrics.reload_seconds.labels(watched.name)):
+                watched.callback(watched.file_name)
+        except Exception as e:
+            metrics.reloads.labels(watched.name, "error").inc()
+            logging.error(f"Ошибка перезагрузки {watched.file_name}, используется предыдущая версия", exc_info=e)
+            return
+
+        # хэш запоминается только после успешной загрузки, чтобы исправленный файл загрузился снова
+        watched.digest = digest
+        metrics.reloads.labels(watched.name, "ok").inc()
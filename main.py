@@ -3,17 +3,33 @@ import logging.config
 import logging.handlers
 import os
 import ssl
+import shutil
+import asyncio
 import logging
+import threading
+import tempfile
 from aiohttp import web
-from aliceio.webhook.aiohttp_server import OneSkillAiohttpRequestHandler, setup_application
+from aliceio.webhook.aiohttp_server import setup_application
+from aliceio.utils.funcs import build_json_payload
 from aliceio import Skill
-from watchdog.observers.api import BaseObserver
-from filewatcher import start_file_watcher
+from filewatcher import FileWatcher
 from config import Config
 from voicemenu import VoiceMenu
 from engine.maindb import MainDB
-from chordgen import generate_audio
-from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_handlers import dispatcher, admission, upload_websounds
+from engine.alice.alice_websounds import AliceWebSounds
+from engine.alice.alice_sessions import install_session_persistence
+from engine.progressdb import progress_db
+from engine.buttonsets import ButtonSets
+from supervisor import Supervisor, bind_socket, worker_socket_path, install_session_router, install_worker_metrics_endpoint, \
+    serve_worker, session_owner
+from engine.alice.alice_response import FastAiohttpRequestHandler
+from engine.alice.alice_tracing import install_tracing
+from metrics import metrics, Timer, install_metrics_endpoint
+from profiler import install_profiler
+from stallwatcher import install_stall_watcher
+from startup import startup, install_readiness_endpoint
+from queuelogging import BoundedQueueHandler, configure_log_queue
 from myconstants import *
 from abspath import abs_path
 
@@ -32,17 +48,45 @@ def configure_logger() -> logging.Logger:
     file_handler = logging.handlers.RotatingFileHandler(abs_path("logs/skill.log"), maxBytes=1024 * 1024, backupCount=5, encoding=UTF8)
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
     # Создаем обработчик для записи лога в консоль
     consoleHandler = logging.StreamHandler(sys.stdout)
     consoleHandler.setFormatter(formatter)
-    logger.addHandler(consoleHandler)
+
+    # запись в файл и консоль выполняется отдельным потоком, а не потоком цикла событий
+    logger.addHandler(BoundedQueueHandler([file_handler, consoleHandler]))
 
     return logger
 
 
-def generate_sounds():
+def configure_worker_logger(index: int):
+    """
+    Переключает запись лога рабочего процесса в собственный файл (logs/skill.<номер>.log):
+    ротация одного файла несколькими процессами теряет и перемешивает записи.
+    """
+    for handler in logging.getLogger().handlers:
+        if not isinstance(handler, BoundedQueueHandler):
+            continue
+
+        for target in handler.handlers:
+            if not isinstance(target, logging.FileHandler):
+                continue
+
+            root, ext = os.path.splitext(target.baseFilename)
+            target.acquire() # поток записи мог уже начать запись в унаследованный файл
+            try:
+                target.baseFilename = f"{root}.{index}{ext}"
+                if target.stream:
+                    target.stream.close()
+                    target.stream = None # файл откроется при следующей записи
+            finally:
+                target.release()
+
+
+def generate_sounds(stop: threading.Event = None):
+    # звуковой стек (numpy, pydub, fluidsynth) нужен только для генерации: не замедляет запуск сервера
+    from chordgen import generate_audio
+
     config = Config()
 
     # генерируем отсутствующие звуки
@@ -50,12 +94,21 @@ def generate_sounds():
     count = 0
 
     for noteseq in MainDB():
+        if stop is not None and stop.is_set():
+            logging.info("Генерация аудио прервана")
+            return
+
         try:
             logging.info(f"Генерация аудио для {noteseq}")
-            if generate_audio(noteseq, replace_existing=False):
+            with Timer(metrics.job_seconds.labels("render")):
+                generated = generate_audio(noteseq, replace_existing=False)
+
+            metrics.jobs.labels("render", "ok" if generated else "skipped").inc()
+            if generated:
                 count += 1
                 logging.info(f"Аудио для {noteseq} сгенерировано")
         except Exception as e:
+            metrics.jobs.labels("render", "error").inc()
             logging.error(f"Ошибка во время генерации аудио для {noteseq}", exc_info=e)
             continue
 
@@ -63,10 +116,200 @@ def generate_sounds():
         logging.info(f"Всего аудиофайлов сгенерировано: {count}")
 
 
+async def build_websounds(skill: Skill, stop: threading.Event):
+    """
+    Фоновое задание: генерирует недостающие звуки и загружает их в навык. Сервер в это время
+    уже принимает запросы; сохранённую базу облачных идентификаторов подхватывает наблюдатель файлов.
+    """
+    try:
+        with startup.phase("websounds"):
+            await asyncio.to_thread(generate_sounds, stop)
+            if not stop.is_set():
+                await upload_websounds(skill)
+    except Exception as e:
+        logging.error("Ошибка генерации и загрузки звуков", exc_info=e)
+
+
+def install_websounds_job(app: web.Application, skill: Skill):
+    """Запускает build_websounds при старте приложения и останавливает его при завершении."""
+    stop = threading.Event()
+    task: asyncio.Task = None
+
+    async def on_startup(_):
+        nonlocal task
+        task = asyncio.create_task(build_websounds(skill, stop))
+
+    async def on_cleanup(_):
+        stop.set() # генерация в потоке не отменяется, а останавливается перед следующим звуком
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+def reload_websounds(_):
+    AliceWebSounds.load()
+    AliceWebSounds().audio_tags(Config().skill.id)
+    startup.ready() # записывает время до готовности, если ждали базу звуков
+
+
+def start_watchers() -> FileWatcher:
+    """Запускает наблюдение за файлами конфигурации, голосового меню, базы трезвучий и базы облачных звуков."""
+    watcher = FileWatcher()
+    watcher.watch(Config().file, Config.load)
+    watcher.watch(VoiceMenu().file, VoiceMenu.load)
+    watcher.watch(MainDB().file, lambda _: MainDB.load())
+
+    websounds_db = abs_path(Config().data.websounds_db)
+    os.makedirs(os.path.dirname(websounds_db), exist_ok=True)
+    watcher.watch(websounds_db, reload_websounds)
+
+    watcher.start()
+    return watcher
+
+
+def stop_watchers(watcher: FileWatcher):
+    if watcher:
+        watcher.stop()
+
+
+def create_app(skill: Skill, worker: int = None, socket_paths: list[str] = None, **kwargs) -> web.Application:
+    """Приложение сервера; worker и socket_paths - номер рабочего процесса и сокеты всех процессов (run_workers)."""
+    app = web.Application()
+    requests_handler = FastAiohttpRequestHandler(dispatcher=dispatcher, skill=skill)
+    requests_handler.register(app, path=f"/{Config().network.path}")
+    setup_application(app, dispatcher, skill=skill, **kwargs)
+
+    if Config().tracing.enabled:
+        tracer = install_tracing(dispatcher)
+        logging.info(f"Трассировка запросов включена: доля {Config().tracing.sample_rate}, файл {tracer.file}")
+
+    if Config().stall_watcher.enabled:
+        install_stall_watcher(app)
+
+    if Config().profiler.enabled:
+        install_profiler(app)
+
+    if Config().metrics.enabled:
+        if worker is not None: # метрики всех рабочих процессов с меткой worker
+            install_worker_metrics_endpoint(app, Config().metrics.path, worker, socket_paths)
+        else:
+            install_metrics_endpoint(app, Config().metrics.path)
+        logging.info(f"Метрики доступны по пути {Config().metrics.path}")
+
+    if Config().readiness.enabled:
+        install_readiness_endpoint(app, Config().readiness.path)
+
+    return app
+
+
+def owner_unavailable(_: web.Request) -> web.Response:
+    """
+    Ответ на запрос сессии, процесс-владелец которой недоступен (см. install_session_router):
+    заранее построенный ответ "приходи через пару минут", как при перегрузке.
+    """
+    metrics.admission_shed.labels("owner_unavailable", "unknown").inc()
+    return web.Response(body=build_json_payload(admission.reply("try_later")))
+
+
+def install_sessions(app: web.Application, worker: int = None, workers: int = 1):
+    """Сохранение сессий при остановке и их восстановление при запуске (sessions.persist)."""
+    config = Config().sessions
+    if not config.persist:
+        return
+
+    owns = (lambda session_id: session_owner(session_id, workers) == worker) if worker is not None else None
+    install_session_persistence(app, dispatcher.fsm.storage, abs_path(config.file), worker, owns)
+
+
+def install_progress(app: web.Application):
+    """
+    Хранилище прогресса пользователей (progress.enabled): база открывается при запуске приложения,
+    фоновая задача записывает изменения, при остановке оставшиеся изменения записываются и база закрывается.
+    """
+    config = Config().progress
+    if not config.enabled:
+        return
+
+    task: asyncio.Task = None
+
+    async def on_startup(_):
+        nonlocal task
+        try:
+            await asyncio.to_thread(progress_db.open, abs_path(config.file), config.max_users)
+        except Exception as e:
+            logging.error(f"Ошибка открытия базы прогресса {config.file}, прогресс не сохраняется", exc_info=e)
+            return
+        task = asyncio.create_task(progress_db.run(config.flush_interval))
+
+    async def on_cleanup(_):
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        try:
+            await asyncio.to_thread(progress_db.close)
+        except Exception as e:
+            logging.error("Ошибка записи прогресса пользователей при остановке", exc_info=e)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+def run_workers(skill: Skill, ssl_context: ssl.SSLContext):
+    """
+    Запускает сервер в нескольких рабочих процессах под супервизором.
+
+    База облачных идентификаторов звуков загружается в main до fork, а звуки генерируются
+    и загружаются один раз, фоновым потоком супервизора, который запускается после fork
+    рабочих процессов. Каждый процесс пишет лог в свой файл (configure_worker_logger). Порт открывается
+    супервизором и наследуется процессами, а запросы закрепляются за процессами по session_id
+    (см. install_session_router). Каждый процесс сам следит за изменением файлов (наблюдатели
+    watchdog не переживают fork) и так же подхватывает новую базу облачных звуков.
+    """
+    config = Config()
+    stop = threading.Event()
+
+    async def build():
+        try:
+            await build_websounds(skill, stop)
+        finally:
+            await skill.session.close()
+
+    def start_websounds():
+        if config.data.upload_websounds:
+            threading.Thread(target=asyncio.run, args=(build(),), name="websounds", daemon=True).start()
+
+    ButtonSets.of(VoiceMenu()) # строится до fork и достаётся процессам готовым
+
+    sock = bind_socket(config.network.ip, config.network.port)
+    sockets_folder = tempfile.mkdtemp(prefix="meldict-")
+    socket_paths = [worker_socket_path(sockets_folder, index) for index in range(config.network.workers)]
+
+    def worker(index: int):
+        configure_worker_logger(index)
+        watchers = start_watchers()
+        try:
+            worker_skill = Skill(skill_id=config.skill.id, oauth_token=config.skill.oauth_token)
+            app = create_app(worker_skill, index, socket_paths)
+            install_sessions(app, index, config.network.workers)
+            install_progress(app)
+            install_session_router(app, index, socket_paths, owner_unavailable)
+            asyncio.run(serve_worker(app, sock, ssl_context, socket_paths[index], config.network.shutdown_timeout))
+        finally:
+            stop_watchers(watchers)
+
+    try:
+        Supervisor(config.network.workers, worker, config.network.shutdown_timeout).run(start_websounds)
+    finally:
+        stop.set()
+        sock.close()
+        shutil.rmtree(sockets_folder, ignore_errors=True)
+
+
 def main() -> None:
-    cfg_watcher: BaseObserver = None
-    vm_watcher: BaseObserver = None
-    main_watcher: BaseObserver = None
+    watchers: FileWatcher = None
 
     try:
         # Настройка логгера
@@ -75,20 +318,23 @@ def main() -> None:
         logging.info("*** Запуск сервера Музыкального Диктанта ***")
 
         # Загрузка конфига (должна выполняться следующей после логгера)
-        config = Config.load_default()
-        cfg_watcher = start_file_watcher(config.file, Config.load)
+        with startup.phase("config"):
+            config = Config.load_default()
+        configure_log_queue(config.logging.queue_size, config.logging.block, config.logging.block_timeout)
 
         # Загрузка голосового меню
-        vm = VoiceMenu.load(abs_path(config.data.voice_menu))
-        vm_watcher = start_file_watcher(vm.file, VoiceMenu.load)
+        with startup.phase("voice_menu"):
+            VoiceMenu.load(abs_path(config.data.voice_menu))
 
         # Загрузка базы данных трезвучий
-        maindb = MainDB.load()
-        main_watcher = start_file_watcher(maindb.file, lambda _: MainDB.load())
+        with startup.phase("main_db"):
+            MainDB.load()
 
-        # Генерация звуков
-        if config.data.upload_websounds:
-            generate_sounds()
+        # Загрузка базы облачных идентификаторов звуков и построение тегов <speaker>;
+        # рабочие процессы получают их готовыми после fork
+        with startup.phase("websounds_db"):
+            AliceWebSounds.load()
+            AliceWebSounds().audio_tags(config.skill.id)
 
         # Создание экземпляра навыка Алисы
         # oauth-token resolve information: https://yandex.ru/dev/dialogs/alice/doc/ru/resource-upload#auth
@@ -103,26 +349,31 @@ def main() -> None:
             ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
             ssl_context.load_cert_chain(certfile=config.network.ssl.certfile, keyfile=config.network.ssl.keyfile)
 
-        app = web.Application()
-        requests_handler = OneSkillAiohttpRequestHandler(dispatcher=dispatcher, skill=skill)
-        requests_handler.register(app, path=f"/{config.network.path}")
-        setup_application(app, dispatcher, skill=skill)
+        if config.network.workers > 1 and hasattr(os, "fork"):
+            logging.info(f"Рабочих процессов: {config.network.workers}")
+            run_workers(skill, ssl_context)
+            return
+
+        if config.network.workers > 1:
+            logging.warning("Несколько рабочих процессов не поддерживаются на этой платформе, запуск в одном процессе")
+
+        watchers = start_watchers()
+        app = create_app(skill)
+        install_sessions(app)
+        install_progress(app)
+
+        # звуки генерируются и загружаются в фоне, сервер в это время уже принимает запросы
+        if config.data.upload_websounds:
+            install_websounds_job(app, skill)
 
         # запускаем прослушивание порта по указанному ip
-        web.run_app(app, host=config.network.ip, port=config.network.port, ssl_context=ssl_context)
+        web.run_app(app, host=config.network.ip, port=config.network.port, ssl_context=ssl_context,
+                    shutdown_timeout=config.network.shutdown_timeout)
     except Exception as e:
         logging.fatal("Необработанное исключение", exc_info=e)
         raise e
     finally:
-        if cfg_watcher:
-            cfg_watcher.stop()
-            cfg_watcher.join()
-        if main_watcher:
-            main_watcher.stop()
-            main_watcher.join()
-        if vm_watcher:
-            vm_watcher.stop()
-            vm_watcher.join()
+        stop_watchers(watchers)
         logging.info("*** Остановка сервера ***")
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+import math
+import time
+from bisect import bisect_left
+from collections.abc import Iterable
+from aiohttp import web
+from myconstants import *
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+def names_of(constants: type) -> dict[int, str]:
+    """Имена значений класса констант (GameMode, LevelId) для меток метрик."""
+    return { value: name.lower() for name, value in vars(constants).items() if not name.startswith("_") }
+
+
+class Metric:
+    """
+    Метрика с метками в текстовом формате Prometheus.
+
+    Значения обновляются без блокировок: обработка запросов идёт в одном потоке цикла событий,
+    а метрики, которые обновляются из других потоков (перезагрузка файлов), пишут каждая в свой ряд.
+    Ряд для набора значений меток создаётся при первом обращении и дальше берётся из словаря.
+    """
+    TYPE = None
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        assert name
+        self.__name = name
+        self.__documentation = documentation
+        self.__labels = tuple(labels)
+        self.__series = dict[tuple, object]()
+
+    @property
+    def name(self) -> str: return self.__name
+
+    @property
+    def label_names(self) -> tuple[str, ...]: return self.__labels
+
+    def labels(self, *values):
+        """Возвращает ряд метрики для значений меток в порядке label_names."""
+        series = self.__series.get(values)
+        if series is None:
+            assert len(values) == len(self.__labels), f"{self.__name}: ожидаются метки {self.__labels}"
+            series = self.__series.setdefault(values, self._create_series())
+        return series
+
+    def _create_series(self): pass
+
+    def _collect(self, series, labels: str) -> Iterable[str]: pass
+
+    def header(self) -> Iterable[str]:
+        yield f"# HELP {self.__name} {self.__documentation}"
+        yield f"# TYPE {self.__name} {self.TYPE}"
+
+    def samples(self, const_labels: str = "") -> Iterable[str]:
+        """Строки рядов метрики; const_labels (например, worker="0") добавляются к меткам каждого ряда."""
+        for values, series in list(self.__series.items()):
+            labels = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.__labels, values))
+            yield from self._collect(series, f"{const_labels},{labels}" if const_labels and labels else const_labels or labels)
+
+    def collect(self) -> Iterable[str]:
+        yield from self.header()
+        yield from self.samples()
+
+    def _sample(self, suffix: str, labels: str, value: float) -> str:
+        return f"{self.__name}{suffix}{{{labels}}} {format_value(value)}" if labels \
+            else f"{self.__name}{suffix} {format_value(value)}"
+
+
+class CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def _create_series(self): return CounterSeries()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _collect(self, series: CounterSeries, labels: str) -> Iterable[str]:
+        yield self._sample("_total", labels, series.value)
+
+
+class GaugeSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def _create_series(self): return GaugeSeries()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _collect(self, series: GaugeSeries, labels: str) -> Iterable[str]:
+        yield self._sample("", labels, series.value)
+
+
+class HistogramSeries:
+    """Ряд гистограммы: счётчики корзин хранятся не накопительно, накопление - при выгрузке."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # последняя корзина - +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.__bounds = tuple(sorted(buckets))
+
+    def _create_series(self): return HistogramSeries(self.__bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _collect(self, series: HistogramSeries, labels: str) -> Iterable[str]:
+        prefix = labels + "," if labels else ""
+        counts = list(series.counts) # снимок, чтобы count совпадал с корзиной +Inf
+        total = 0
+        for bound, count in zip(self.__bounds + (math.inf,), counts):
+            total += count
+            yield self._sample("_bucket", f'{prefix}le="{format_value(bound)}"', total)
+        yield self._sample("_sum", labels, series.sum)
+        yield self._sample("_count", labels, total)
+
+
+class Timer:
+    """Контекстный менеджер, добавляющий длительность блока в ряд гистограммы."""
+    __slots__ = ("__series", "__start")
+
+    def __init__(self, series: HistogramSeries):
+        self.__series = series
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.__series.observe(time.perf_counter() - self.__start)
+
+
+class Registry:
+    """Набор метрик навыка. Единственный экземпляр - metrics в этом модуле."""
+    def __init__(self):
+        self.__metrics = dict[str, Metric]()
+
+    def add(self, metric: Metric) -> Metric:
+        assert metric.name not in self.__metrics, f"Метрика {metric.name} уже зарегистрирована"
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.__metrics.values() for line in metric.collect()) + "\n"
+
+    def samples(self, const_labels: str) -> dict[str, list[str]]:
+        """Строки рядов всех метрик по именам метрик, с метками const_labels (см. render_merged)."""
+        return { metric.name: list(metric.samples(const_labels)) for metric in self.__metrics.values() }
+
+    def render_merged(self, parts: Iterable[dict[str, list[str]]]) -> str:
+        """Выгрузка рядов нескольких процессов (samples): у каждой метрики один заголовок и ряды всех процессов."""
+        parts = list(parts)
+        lines = []
+        for metric in self.__metrics.values():
+            lines.extend(metric.header())
+            for part in parts:
+                lines.extend(part.get(metric.name, ()))
+        return "\n".join(lines) + "\n"
+
+
+class SkillMetrics(Registry):
+    """Метрики Музыкального Диктанта."""
+    def __init__(self):
+        super().__init__()
+        self.requests = self.add(Counter("meldict_requests", "Обработанные запросы", ("handler", "mode")))
+        self.request_seconds = self.add(Histogram("meldict_request_seconds", "Время обработки запроса", ("handler", "mode")))
+        self.handler_seconds = self.add(Histogram("meldict_handler_seconds", "Время обработчика под бюджетом времени ответа", ("handler",)))
+        self.handler_overruns = self.add(Counter("meldict_handler_overruns", "Ответы, построенные позже бюджета времени", ("handler",)))
+        self.handler_fallbacks = self.add(Counter("meldict_handler_fallbacks", "Обработчики, отменённые по бюджету времени, с резервным ответом", ("handler",)))
+        self.sessions_active = self.add(Gauge("meldict_sessions_active", "Сессии в памяти процесса"))
+        self.sessions_evicted = self.add(Counter("meldict_sessions_evicted", "Сессии, удалённые по неактивности"))
+        self.requests_inflight = self.add(Gauge("meldict_requests_inflight", "Запросы в обработке"))
+        self.admission_shed = self.add(Counter("meldict_admission_shed", "Запросы, отклонённые при перегрузке", ("reason", "session")))
+        self.progress_writes = self.add(Counter("meldict_progress_writes", "Изменения прогресса пользователей, записанные в базу", ("result",)))
+        self.maindb_draws = self.add(Counter("meldict_maindb_draws", "Выборки из базы трезвучий", ("level",)))
+        self.reloads = self.add(Counter("meldict_reloads", "Перезагрузки файлов", ("file", "result")))
+        self.reload_seconds = self.add(Histogram("meldict_reload_seconds", "Время перезагрузки файла", ("file",)))
+        self.jobs = self.add(Counter("meldict_jobs", "Задания генерации и загрузки звуков", ("job", "result")))
+        self.job_seconds = self.add(Histogram("meldict_job_seconds", "Время выполнения задания", ("job",)))
+        self.log_records_dropped = self.add(Counter("meldict_log_records_dropped", "Записи лога, отброшенные при переполнении очереди"))
+        self.loop_stall_seconds = self.add(Histogram("meldict_loop_stall_seconds", "Длительность блокировок цикла событий",
+                                                     buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+        self.startup_phase_seconds = self.add(Gauge("meldict_startup_phase_seconds", "Длительность этапов запуска", ("phase",)))
+
+
+metrics = SkillMetrics()
+
+LEVEL_NAMES = names_of(LevelId)
+MODE_NAMES = names_of(GameMode)
+
+def count_draw(level: int = None):
+    """Учитывает выборку из базы трезвучий для уровня level (None - вне уровней)."""
+    metrics.maindb_draws.labels(LEVEL_NAMES.get(level, "none")).inc()
+
+
+def metrics_response(text: str) -> web.Response:
+    return web.Response(body=text.encode(UTF8), headers={ "Content-Type": CONTENT_TYPE, "Cache-Control": "no-store" })
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return metrics_response(metrics.render())
+
+def install_metrics_endpoint(app: web.Application, path: str):
+    """Добавляет в приложение GET-обработчик, отдающий метрики в текстовом формате Prometheus."""
+    app.router.add_get(path, handle_metrics)
@@ -12,4 +12,11 @@ class GameMode:
     DEMO = 2
     TRAIN_MENU = 3
     TRAIN = 4
-    EXAM = 5
\ No newline at end of file
+    EXAM = 5
+
+class LevelId:
+    DEMO = 0
+    MISSED_NOTE = 1
+    PRIMA_LOCATION = 2
+    CADENCE = 3
+    EXAM = 100
@@ -1,30 +1,123 @@
-from typing import Iterable
+from functools import lru_cache
+from typing import Iterable, Generic, TypeVar
 from aliceio.filters import BaseFilter
 from aliceio.types import Message
 
+T = TypeVar('T')
+
+class PrefixTrie:
+    """Префиксное дерево: за один проход по словам команды находит все совпавшие префиксы."""
+    __END = ""
+
+    def __init__(self, words: Iterable[str]):
+        self.__root = dict()
+        for word in words:
+            node = self.__root
+            for ch in word:
+                node = node.setdefault(ch, dict())
+            node[PrefixTrie.__END] = word
+
+    def match(self, words: Iterable[str]) -> set[str]:
+        """Возвращает множество префиксов, с которых начинается хотя бы одно слово."""
+        matched = set[str]()
+        root = self.__root
+        end = PrefixTrie.__END
+
+        if end in root:
+            matched.add(root[end])
+
+        for word in words:
+            node = root
+            for ch in word:
+                node = node.get(ch)
+                if node is None: break
+                prefix = node.get(end)
+                if prefix is not None: matched.add(prefix)
+
+        return matched
+
+
 class CmdFilter(BaseFilter):
+    """
+    Фильтр команды по префиксам слов: проходит, если слова команды начинаются с одного (или, при
+    all_words, с каждого) из слов include и ни одно не начинается со слов exclude. Строка include
+    или exclude разбивается на слова по пробелам. Пустое слово совпало бы с любой командой,
+    поэтому не допускается.
+    """
     def __init__(self, include: str | Iterable[str], exclude: str | Iterable[str] = None, all_words: bool = False) -> None:
         assert include
         include = include.split(sep=" ") if isinstance(include, str) else include
         exclude = exclude.split(sep=" ") if isinstance(exclude, str) else exclude if exclude else []
         self.__include = tuple(word.lower() for word in include)
         self.__exclude = tuple(word.lower() for word in exclude)
+        if not all(self.__include + self.__exclude):
+            raise ValueError(f"Пустое слово в фильтре команды: include={self.__include}, exclude={self.__exclude}")
         self.__all_words = all_words
+        self.__trie = PrefixTrie(self.__include + self.__exclude)
         super().__init__()
 
+    @property
+    def include(self) -> tuple[str, ...]: return self.__include
+
+    @property
+    def exclude(self) -> tuple[str, ...]: return self.__exclude
+
+    @property
+    def all_words(self) -> bool: return self.__all_words
+
     async def __call__(self, message: Message) -> bool:
         if message.command == "": return False
-        return CmdFilter.passed(message.command, self.__include, self.__exclude, self.__all_words)
+        return self.is_passed(message.command)
 
     def is_passed(self, command: str | Iterable[str]) -> bool:
-        return CmdFilter.passed(command, self.__include, self.__exclude, self.__all_words)
+        return self.check(self.__trie.match(CmdFilter.tokenize(command)))
+
+    def check(self, matched: set[str]) -> bool:
+        """Проверяет фильтр по множеству префиксов, найденных в команде."""
+        func = all if self.__all_words else any
+        return not any(word in matched for word in self.__exclude) \
+            and func(word in matched for word in self.__include)
+
+    @staticmethod
+    def tokenize(command: str | Iterable[str]) -> tuple[str, ...]:
+        """Разбивает команду на слова в нижнем регистре. Уже разбитая команда возвращается как есть."""
+        if not command: return ()
+        return tuple(command.lower().split(sep=" ")) if isinstance(command, str) else tuple(command)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def compile(include: str | tuple[str, ...], exclude: str | tuple[str, ...] = None, all_words: bool = False) -> "CmdFilter":
+        """Возвращает скомпилированный фильтр; фильтры с одинаковыми словами создаются один раз."""
+        return CmdFilter(include, exclude, all_words)
 
     @staticmethod
     def passed(command: str | Iterable[str], include: Iterable[str], exclude: Iterable[str] = None, all_words = False) -> bool:
         assert command
         assert include
-        command_words: Iterable[str] = command.lower().split(sep=" ") if isinstance(command, str) else command
+        include = include if isinstance(include, str) else tuple(include)
+        exclude = exclude if exclude is None or isinstance(exclude, str) else tuple(exclude)
+        return CmdFilter.compile(include, exclude, all_words).is_passed(command)
+
+
+class CmdTable(Generic[T]):
+    """
+    Таблица команд режима: (действие, include, exclude[, all_words]).
+
+    Слова всех фильтров собраны в одно префиксное дерево, поэтому команда разбирается за один
+    проход, после чего фильтры проверяются по порядку и возвращается первое подходящее действие.
+    """
+    def __init__(self, *entries: tuple):
+        self.__entries = tuple((entry[0], CmdFilter(*entry[1:])) for entry in entries)
+        self.__trie = PrefixTrie(word for _, cmd_filter in self.__entries
+                                 for word in cmd_filter.include + cmd_filter.exclude)
+
+    def select(self, command: str | Iterable[str], default: T = None) -> T:
+        tokens = CmdFilter.tokenize(command)
+        if not tokens: return default
+
+        matched = self.__trie.match(tokens)
+        for action, cmd_filter in self.__entries:
+            if cmd_filter.check(matched):
+                return action
 
-        func = all if all_words else any
-        return (exclude is None or not any(any(filter(lambda cmd: cmd.startswith(word), command_words)) for word in exclude)) \
-                and func(any(cmd.startswith(word) for cmd in command_words) for word in include)
+        return default
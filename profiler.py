@@ -0,0 +1,141 @@
+import os
+import sys
+import hmac
+import time
+import signal
+import logging
+import threading
+from collections import Counter
+from aiohttp import web
+from config import Config
+from myconstants import *
+from abspath import abs_path
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик потока цикла событий.
+
+    Отдельный поток каждые interval секунд снимает стек профилируемого потока через
+    sys._current_frames() и считает одинаковые стеки. Результат записывается в формате
+    collapsed stacks ("модуль:функция;модуль:функция количество"), который читают flamegraph.pl
+    и speedscope. Профилируемый поток не останавливается и не замедляется, кроме борьбы за GIL.
+    """
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        assert interval > 0
+        self.__thread_id = thread_id
+        self.__interval = interval
+        self.__thread: threading.Thread = None
+        self.__stop = threading.Event()
+        self.__labels = dict[object, str]() # code: метка кадра
+
+    @property
+    def running(self) -> bool: return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self, seconds: float, file_name: str) -> bool:
+        """Запускает профилирование на seconds секунд; False, если оно уже идёт."""
+        if self.running:
+            return False
+
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, args=(seconds, file_name), name="profiler", daemon=True)
+        self.__thread.start()
+        return True
+
+    def stop(self, timeout: float = None):
+        """Досрочно завершает профилирование и дожидается записи собранного профиля."""
+        if self.running:
+            self.__stop.set()
+            self.__thread.join(timeout)
+
+    def __run(self, seconds: float, file_name: str):
+        logging.info(f"Профилирование запущено на {seconds:.0f} с")
+        stacks = Counter[str]()
+        deadline = time.monotonic() + seconds
+
+        try:
+            while time.monotonic() < deadline and not self.__stop.is_set():
+                frame = sys._current_frames().get(self.__thread_id)
+                if frame is not None:
+                    stacks[self.__collapse(frame)] += 1
+                del frame
+                self.__stop.wait(self.__interval)
+
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            with open(file_name, "w", encoding=UTF8) as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+
+            logging.info(f"Профиль записан: {file_name}, выборок {stacks.total()}, различных стеков {len(stacks)}")
+        except Exception as e:
+            logging.error("Ошибка профилирования", exc_info=e)
+
+    def __collapse(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self.__labels.get(code)
+            if label is None:
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                label = self.__labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}".replace(";", ",").replace(" ", "_")
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+
+def profile_file_name() -> str:
+    return os.path.join(abs_path(Config().profiler.folder), f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+
+
+def install_profiler(app: web.Application):
+    """
+    Добавляет запуск профилирования по сигналу SIGUSR1 и, если задан profiler.token,
+    по запросу POST profiler.path?seconds=N с заголовком X-Admin-Token.
+
+    Профилируется поток, в котором работает цикл событий приложения.
+    """
+    profiler: SamplingProfiler = None
+
+    def start(seconds: float) -> str:
+        config = Config().profiler
+        seconds = min(max(seconds, 0.1), config.max_seconds)
+        file_name = profile_file_name()
+        return file_name if profiler.start(seconds, file_name) else None
+
+    async def on_startup(_):
+        nonlocal profiler
+        profiler = SamplingProfiler(threading.get_ident(), Config().profiler.interval)
+
+        if hasattr(signal, "SIGUSR1"):
+            def on_signal(*_):
+                if start(Config().profiler.seconds) is None:
+                    logging.warning("Профилирование уже идёт")
+            signal.signal(signal.SIGUSR1, on_signal)
+
+    async def handle_profile(request: web.Request) -> web.Response:
+        config = Config().profiler
+        if not config.token or not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), config.token):
+            return web.json_response({ "error": "forbidden" }, status=403)
+
+        try:
+            seconds = float(request.query.get("seconds", config.seconds))
+        except ValueError:
+            return web.json_response({ "error": "bad seconds" }, status=400)
+
+        file_name = start(seconds)
+        if file_name is None:
+            return web.json_response({ "error": "already running" }, status=409)
+        return web.json_response({ "file": file_name }, status=202)
+
+    async def on_cleanup(_):
+        if profiler:
+            profiler.stop(timeout=5)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+    config = Config().profiler
+    if config.token:
+        app.router.add_post(config.path, handle_profile)
+    else:
+        logging.warning("Не задан profiler.token: профилирование доступно только по сигналу SIGUSR1")
@@ -0,0 +1,98 @@
+import os
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from metrics import metrics
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Обработчик лога, передающий записи в отдельный поток через ограниченную очередь.
+
+    Запись в файл, ротация и вывод в консоль выполняются потоком QueueListener, а не потоком,
+    который пишет в лог (в том числе не потоком цикла событий). При переполнении очереди запись
+    отбрасывается или, если включено ожидание (block), поток ждёт место до block_timeout секунд
+    и только потом отбрасывает запись. Отброшенные записи считаются (dropped и метрика
+    meldict_log_records_dropped), а их количество, если report, сообщается в лог при следующей
+    удачной записи.
+
+    Обработчик владеет потоком записи: close() дожидается записи очереди, поэтому logging.shutdown()
+    ничего не теряет. После fork очередь и поток создаются в дочернем процессе заново.
+    """
+    def __init__(self, handlers: list[logging.Handler], queue_size: int = 10000, block: bool = False, block_timeout: float = 1.0,
+                 report: bool = True):
+        assert handlers
+        super().__init__(queue.Queue(queue_size))
+        self.__handlers = tuple(handlers)
+        self.__report = report
+        self.__block = block
+        self.__block_timeout = block_timeout
+        self.__dropped = 0
+        self.__reported = 0
+        self.__listener = QueueListener(self.queue, *self.__handlers, respect_handler_level=True)
+        self.__listener.start()
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.__after_fork)
+
+    @property
+    def dropped(self) -> int: return self.__dropped
+
+    @property
+    def handlers(self) -> tuple[logging.Handler, ...]: return self.__handlers
+
+    def configure(self, queue_size: int, block: bool, block_timeout: float = None):
+        """Меняет размер очереди и поведение при переполнении; размер применяется к следующим записям."""
+        self.queue.maxsize = queue_size # queue.Queue проверяет maxsize при каждой записи
+        self.__block = block
+        if block_timeout is not None:
+            self.__block_timeout = block_timeout
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # вместо форматирования всей записи (как в QueueHandler) только подставляются аргументы:
+        # они могут измениться позже, а трассировку исключения отформатирует поток записи
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.__block:
+                self.queue.put(record, timeout=self.__block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.__dropped += 1
+            metrics.log_records_dropped.inc()
+            return
+
+        if self.__report and self.__dropped != self.__reported:
+            count = self.__dropped - self.__reported
+            self.__reported = self.__dropped
+            warning = logging.LogRecord(record.name, logging.WARNING, __file__, 0,
+                                        f"Очередь лога переполнена, пропущено записей: {count}", None, None)
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                self.__reported -= count # сообщим при следующей записи
+
+    def close(self):
+        if self.__listener:
+            self.__listener.stop() # записывает всё, что осталось в очереди
+            self.__listener = None
+        super().close()
+
+    def __after_fork(self):
+        if self.__listener is None: # обработчик закрыт
+            return
+
+        # поток записи не переживает fork, а блокировка очереди могла остаться захваченной
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.__listener = QueueListener(self.queue, *self.__handlers, respect_handler_level=True)
+        self.__listener.start()
+
+
+def configure_log_queue(queue_size: int, block: bool, block_timeout: float, logger: logging.Logger = None):
+    """Применяет настройки очереди к BoundedQueueHandler логгера (по умолчанию корневого)."""
+    for handler in (logger or logging.getLogger()).handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            handler.configure(queue_size, block, block_timeout)
@@ -0,0 +1,56 @@
+import threading
+from contextvars import ContextVar
+from types import MappingProxyType
+from collections.abc import Callable
+
+class Snapshot:
+    """
+    Неизменяемое поколение ресурсов: экземпляры синглтонов (конфигурация, голосовое меню,
+    база трезвучий, облачные звуки) на момент публикации.
+    """
+    __slots__ = ("__version", "__items", "get")
+
+    def __init__(self, version: int, items: dict[type, object]):
+        self.__version = version
+        self.__items = MappingProxyType(items)
+        self.get: Callable[[type], object] = self.__items.get # без обёртки: вызывается при каждом обращении к синглтону
+
+    @property
+    def version(self) -> int: return self.__version
+
+    @property
+    def items(self) -> MappingProxyType: return self.__items
+
+
+class ResourceRegistry:
+    """
+    Реестр поколений ресурсов.
+
+    Текущее поколение читается без блокировки: это одна ссылка, которая заменяется целиком.
+    Публикация нового экземпляра создаёт новое поколение под блокировкой (публикации из разных
+    потоков не теряют друг друга), старые поколения не меняются и остаются у запросов,
+    которые их захватили.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__current = Snapshot(0, {})
+
+    @property
+    def current(self) -> Snapshot: return self.__current
+
+    def publish(self, cls: type, instance: object) -> Snapshot:
+        with self.__lock:
+            items = dict(self.__current.items)
+            items[cls] = instance
+            self.__current = Snapshot(self.__current.version + 1, items)
+            return self.__current
+
+
+registry = ResourceRegistry()
+
+# поколение, захваченное текущим запросом: все вызовы синглтонов в запросе возвращают его экземпляры
+pinned_snapshot = ContextVar[Snapshot]("pinned_snapshot", default=None)
+
+def snapshot() -> Snapshot:
+    """Поколение текущего запроса или, вне запроса, последнее опубликованное."""
+    return pinned_snapshot.get() or registry.current
@@ -1,18 +1,34 @@
 from pydantic import BaseModel
 import threading
+from resources import registry, snapshot
 
-# Потокобезопасный синглтон
+# Потокобезопасный синглтон. Экземпляры хранятся в реестре поколений ресурсов (resources.py):
+# чтение без блокировки, а внутри запроса возвращается экземпляр из захваченного им поколения
 class SingletonMeta(type):
-    _instance = None
     _rlock = threading.RLock()
 
     def __call__(self, *args, new: bool = False, **kwargs):
         """Возвращает существующий экземпляр или создаёт новый."""
+        if not (new or args or kwargs):
+            instance = snapshot().get(self)
+            if instance is not None:
+                return instance
+
         with self._rlock:
-            if self._instance is None or new or args or kwargs:
+            instance = registry.current.get(self)
+            if instance is None or new or args or kwargs:
                 # Если экземпляр ещё не создан, создаём с использованием аргументов
-                self._instance = super().__call__(*args, **kwargs)
-            return self._instance
+                instance = super().__call__(*args, **kwargs)
+                registry.publish(self, instance)
+            return instance
+
+    def create(self, *args, **kwargs):
+        """Создаёт экземпляр, не публикуя его: загрузчик публикует его после заполнения (publish)."""
+        return super().__call__(*args, **kwargs)
+
+    def publish(self, instance):
+        """Публикует экземпляр новым поколением ресурсов."""
+        registry.publish(self, instance)
 
 class BaseModelSingletonMeta(type(BaseModel), SingletonMeta):
-    pass
\ No newline at end of file
+    pass
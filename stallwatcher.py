@@ -0,0 +1,88 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from aiohttp import web
+from config import Config
+from metrics import metrics
+
+class StallWatcher:
+    """
+    Обнаруживает блокировки цикла событий.
+
+    Цикл событий каждые interval секунд отмечается таймером. Если отметка опаздывает больше чем
+    на threshold секунд, сторожевой поток один раз за блокировку записывает в лог стек потока
+    цикла событий - код, который его блокирует. Когда цикл освобождается, длительность блокировки
+    записывается в лог и в гистограмму meldict_loop_stall_seconds.
+    """
+    def __init__(self, threshold: float, interval: float):
+        assert threshold > 0 and interval > 0
+        self.__threshold = threshold
+        self.__interval = interval
+        self.__loop: asyncio.AbstractEventLoop = None
+        self.__thread_id: int = None
+        self.__expected = 0.0 # время ожидаемой отметки
+        self.__reported = None # ожидаемая отметка, для которой стек уже записан
+        self.__handle: asyncio.TimerHandle = None
+        self.__thread: threading.Thread = None
+        self.__stop = threading.Event()
+
+    def start(self):
+        """Запускает наблюдение за текущим циклом событий; вызывается из потока цикла."""
+        self.__loop = asyncio.get_running_loop()
+        self.__thread_id = threading.get_ident()
+        self.__stop.clear()
+        self.__schedule()
+        self.__thread = threading.Thread(target=self.__watch, name="stallwatcher", daemon=True)
+        self.__thread.start()
+        logging.info(f"Запущено наблюдение за блокировками цикла событий: порог {self.__threshold * 1000:.0f} мс")
+
+    def stop(self):
+        self.__stop.set()
+        if self.__handle:
+            self.__handle.cancel()
+        if self.__thread:
+            self.__thread.join()
+
+    def __schedule(self):
+        self.__expected = time.monotonic() + self.__interval
+        self.__handle = self.__loop.call_later(self.__interval, self.__beat)
+
+    def __beat(self):
+        late = time.monotonic() - self.__expected
+        if late >= self.__threshold:
+            metrics.loop_stall_seconds.observe(late)
+            logging.warning(f"Цикл событий был заблокирован {late * 1000:.0f} мс")
+        self.__schedule()
+
+    def __watch(self):
+        while not self.__stop.wait(self.__interval):
+            expected = self.__expected
+            if expected == self.__reported or time.monotonic() - expected < self.__threshold:
+                continue
+
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is None:
+                continue
+
+            self.__reported = expected
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            logging.warning(f"Цикл событий заблокирован дольше {self.__threshold * 1000:.0f} мс, стек:\n{stack}")
+
+
+def install_stall_watcher(app: web.Application):
+    """Наблюдает за блокировками цикла событий приложения с порогом stall_watcher.threshold."""
+    config = Config().stall_watcher
+    watcher = StallWatcher(config.threshold, config.interval)
+
+    async def on_startup(_):
+        watcher.start()
+
+    async def on_cleanup(_):
+        watcher.stop()
+
+    app.on_startup.insert(0, on_startup) # первым, чтобы застать загрузку звуков при запуске
+    app.on_cleanup.append(on_cleanup)
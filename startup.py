@@ -0,0 +1,65 @@
+import time
+import logging
+from contextlib import contextmanager
+from collections.abc import Callable
+from aiohttp import web
+from metrics import metrics
+
+class StartupPhases:
+    """
+    Этапы запуска сервера и его готовность к работе.
+
+    Длительность каждого этапа (phase) записывается в лог и в метрику meldict_startup_phase_seconds.
+    Готовность складывается из проверок (add_check): сервер готов, когда выполнены все. Время от
+    запуска процесса до первой готовности записывается как этап "ready".
+    """
+    def __init__(self):
+        self.__started = time.monotonic()
+        self.__phases = dict[str, float]()
+        self.__checks = dict[str, Callable[[], bool]]()
+        self.__ready = False
+
+    @property
+    def phases(self) -> dict[str, float]: return self.__phases
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.__record(name, time.perf_counter() - start) # этап с ошибкой не считается выполненным
+
+    def add_check(self, name: str, check: Callable[[], bool]):
+        self.__checks[name] = check
+
+    def checks(self) -> dict[str, bool]:
+        return { name: bool(check()) for name, check in self.__checks.items() }
+
+    def ready(self) -> bool:
+        ready = all(check() for check in self.__checks.values())
+        if ready and not self.__ready:
+            self.__ready = True
+            self.__record("ready", time.monotonic() - self.__started)
+        return ready
+
+    def __record(self, name: str, duration: float):
+        self.__phases[name] = duration
+        metrics.startup_phase_seconds.labels(name).set(duration)
+        logging.info(f"Этап запуска {name}: {duration * 1000:.0f} мс")
+
+
+startup = StartupPhases()
+
+def install_readiness_endpoint(app: web.Application, path: str):
+    """
+    Добавляет GET-обработчик готовности: 200, когда выполнены все проверки startup,
+    иначе 503. В ответе - состояние проверок и длительность этапов запуска в секундах.
+    """
+    async def handle_readiness(request: web.Request) -> web.Response:
+        ready = startup.ready()
+        return web.json_response({ "status": "ready" if ready else "starting",
+                                   "checks": startup.checks(),
+                                   "phases": { name: round(duration, 3) for name, duration in startup.phases.items() } },
+                                 status=200 if ready else 503,
+                                 headers={ "Cache-Control": "no-store" })
+
+    app.router.add_get(path, handle_readiness)
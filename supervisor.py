@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import zlib
+import signal
+import socket
+import asyncio
+import logging
+from collections.abc import Callable
+from aiohttp import web, ClientSession, ClientTimeout, UnixConnector, ClientError
+from metrics import metrics, metrics_response
+from myconstants import *
+
+# заголовок запросов, которые рабочие процессы отправляют друг другу через unix-сокеты
+FORWARDED_HEADER = "X-Meldict-Forwarded"
+
+class Supervisor:
+    """
+    Запускает сервер в нескольких рабочих процессах.
+
+    Процессы создаются через fork, поэтому всё, что загружено до run(), достаётся им без копирования
+    (copy-on-write). Упавший процесс перезапускается с тем же номером, при частых падениях - с
+    нарастающей задержкой: перезапуск назначается на срок и выполняется циклом опроса, который
+    тем временем продолжает принимать завершения других процессов. По SIGTERM или SIGINT процессам отправляется SIGTERM, а не завершившиеся
+    за shutdown_timeout секунд завершаются принудительно.
+    """
+    POLL_INTERVAL = 0.2
+    MAX_RESTART_DELAY = 30.0
+
+    def __init__(self, workers: int, target: Callable[[int], None], shutdown_timeout: float = 10.0):
+        assert workers > 0
+        assert target
+        self.__count = workers
+        self.__target = target
+        self.__shutdown_timeout = shutdown_timeout
+        self.__workers = dict[int, tuple[int, float]]() # pid: (номер процесса, время запуска)
+        self.__crashes = [0] * workers # падения подряд для каждого номера процесса
+        self.__restarts = dict[int, float]() # номер процесса: время перезапуска
+        self.__stop_deadline: float = None
+
+    @property
+    def stopping(self) -> bool: return self.__stop_deadline is not None
+
+    def run(self, on_started: Callable[[], None] = None):
+        """
+        Запускает рабочие процессы и следит за ними до остановки. on_started вызывается в супервизоре
+        после запуска процессов: фоновые потоки, запущенные до fork, процессам не нужны.
+        """
+        signal.signal(signal.SIGTERM, self.__on_stop_signal)
+        signal.signal(signal.SIGINT, self.__on_stop_signal)
+        if hasattr(signal, "SIGUSR1"): # запуск профилирования во всех рабочих процессах
+            signal.signal(signal.SIGUSR1, lambda *_: self.__kill_all(signal.SIGUSR1))
+
+        for index in range(self.__count):
+            self.__spawn(index)
+
+        if on_started:
+            on_started()
+
+        while self.__workers or (self.__restarts and not self.stopping):
+            pid, status = os.waitpid(-1, os.WNOHANG) if self.__workers else (0, 0)
+            if pid == 0:
+                now = time.monotonic()
+                if self.stopping and now > self.__stop_deadline:
+                    self.__kill_all(signal.SIGKILL)
+                self.__spawn_due(now)
+                time.sleep(Supervisor.POLL_INTERVAL)
+                continue
+
+            worker = self.__workers.pop(pid, None)
+            if worker is None:
+                continue
+
+            index, started = worker
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                logging.info(f"Рабочий процесс {index} (pid {pid}) остановлен с кодом {code}")
+                continue
+
+            # процесс, проработавший дольше максимальной задержки, считается стабильным
+            crashes = self.__crashes[index] = 1 if time.monotonic() - started > Supervisor.MAX_RESTART_DELAY \
+                else self.__crashes[index] + 1
+            delay = min(2 ** (crashes - 1) - 1, Supervisor.MAX_RESTART_DELAY)
+            logging.error(f"Рабочий процесс {index} (pid {pid}) завершился с кодом {code}, перезапуск через {delay:.0f} с")
+            self.__restarts[index] = time.monotonic() + delay
+
+        logging.info("Все рабочие процессы остановлены")
+
+    def __spawn_due(self, now: float):
+        """Перезапускает процессы, срок перезапуска которых наступил."""
+        if self.stopping:
+            return
+
+        for index, deadline in list(self.__restarts.items()):
+            if now >= deadline:
+                del self.__restarts[index]
+                self.__spawn(index)
+
+    def __spawn(self, index: int):
+        pid = os.fork()
+        if pid > 0:
+            self.__workers[pid] = (index, time.monotonic())
+            logging.info(f"Запущен рабочий процесс {index} (pid {pid})")
+            return
+
+        # дочерний процесс: обработчики сигналов супервизора ему не нужны
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if hasattr(signal, "SIGUSR1"): # до установки обработчика профилировщиком сигнал не должен завершать процесс
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        code = 0
+        try:
+            self.__target(index)
+        except BaseException as e:
+            logging.fatal(f"Необработанное исключение в рабочем процессе {index}", exc_info=e)
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+    def __on_stop_signal(self, signum, _):
+        if self.stopping:
+            return
+
+        logging.info(f"Получен сигнал {signal.Signals(signum).name}, остановка рабочих процессов")
+        self.__stop_deadline = time.monotonic() + self.__shutdown_timeout
+        self.__kill_all(signal.SIGTERM)
+
+    def __kill_all(self, signum: int):
+        for pid in self.__workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Создаёт слушающий сокет, который рабочие процессы наследуют при fork."""
+    return socket.create_server((host, port), backlog=128)
+
+
+def worker_socket_path(folder: str, index: int) -> str:
+    return os.path.join(folder, f"worker{index}.sock")
+
+
+def session_owner(session_id: str, workers: int) -> int:
+    """Номер рабочего процесса, которому принадлежит сессия."""
+    return zlib.crc32(session_id.encode(UTF8)) % workers
+
+
+class WorkerClients:
+    """HTTP-клиенты к unix-сокетам рабочих процессов, по одному на процесс; закрываются при остановке приложения."""
+    def __init__(self, app: web.Application, socket_paths: list[str], timeout: ClientTimeout):
+        self.__socket_paths = socket_paths
+        self.__timeout = timeout
+        self.__sessions = dict[int, ClientSession]()
+        app.on_cleanup.append(self.__close)
+
+    def get(self, index: int) -> ClientSession:
+        session = self.__sessions.get(index)
+        if session is None or session.closed:
+            session = self.__sessions[index] = ClientSession(connector=UnixConnector(path=self.__socket_paths[index]),
+                                                             timeout=self.__timeout)
+        return session
+
+    async def __close(self, _):
+        for session in self.__sessions.values():
+            await session.close()
+
+
+def install_session_router(app: web.Application, index: int, socket_paths: list[str],
+                           unavailable: Callable[[web.Request], web.StreamResponse]):
+    """
+    Добавляет в приложение промежуточный обработчик, закрепляющий сессии за рабочими процессами.
+
+    Ядро распределяет соединения между процессами без учёта сессии, а состояние сессии хранится
+    в памяти процесса. Поэтому процесс выбирается по хэшу session_id, и запрос чужой сессии
+    пересылается её процессу через его unix-сокет. Если процесс недоступен (например, перезапускается),
+    запрос не обрабатывается на месте: состояния сессии здесь нет, и ответ разошёлся бы с её процессом.
+    Вместо этого возвращается ответ unavailable(request).
+    """
+    clients = WorkerClients(app, socket_paths, ClientTimeout(total=10))
+
+    def owner(body: bytes) -> int:
+        try:
+            update = json.loads(body)
+            update = update.get("body", update)
+            session_id = update["session"]["session_id"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return index
+        return session_owner(session_id, len(socket_paths))
+
+    async def forward(owner_index: int, request: web.Request, body: bytes) -> web.Response:
+        headers = { "Content-Type": request.headers.get("Content-Type", "application/json"), FORWARDED_HEADER: str(index) }
+        async with clients.get(owner_index).post(f"http://worker{request.path_qs}", data=body, headers=headers) as response:
+            return web.Response(body=await response.read(), status=response.status,
+                                headers={ "Content-Type": response.headers.get("Content-Type", "application/json") })
+
+    @web.middleware
+    async def middleware(request: web.Request, handler: Callable) -> web.StreamResponse:
+        if request.method != "POST" or FORWARDED_HEADER in request.headers:
+            return await handler(request)
+
+        body = await request.read() # тело кэшируется и доступно обработчику
+        owner_index = owner(body)
+        if owner_index == index:
+            return await handler(request)
+
+        try:
+            return await forward(owner_index, request, body)
+        except (ClientError, OSError, asyncio.TimeoutError) as e:
+            logging.warning(f"Рабочий процесс {owner_index} недоступен, запрос сессии отклонён процессом {index}: {e}")
+            return unavailable(request)
+
+    app.middlewares.append(middleware)
+
+
+def install_worker_metrics_endpoint(app: web.Application, path: str, index: int, socket_paths: list[str]):
+    """
+    Добавляет GET-обработчик метрик для режима нескольких рабочих процессов.
+
+    Соединение со сборщиком метрик принимает случайный процесс, поэтому он собирает ряды всех
+    процессов через их unix-сокеты и отдаёт их вместе, с меткой worker - номером процесса. Счётчики
+    каждого процесса остаются монотонными (сбрасываются только при его перезапуске). Недоступный
+    процесс (например, перезапускается) пропускается.
+    """
+    clients = WorkerClients(app, socket_paths, ClientTimeout(total=5))
+
+    async def fetch(worker: int) -> dict[str, list[str]]:
+        if worker == index:
+            return metrics.samples(f'worker="{index}"')
+        try:
+            async with clients.get(worker).get(f"http://worker{path}", headers={ FORWARDED_HEADER: str(index) }) as response:
+                response.raise_for_status()
+                return await response.json()
+        except (ClientError, OSError, asyncio.TimeoutError, ValueError) as e:
+            logging.warning(f"Метрики рабочего процесса {worker} недоступны: {e}")
+            return None
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        if FORWARDED_HEADER in request.headers: # запрос другого процесса: только свои ряды
+            return web.json_response(metrics.samples(f'worker="{index}"'))
+
+        parts = await asyncio.gather(*(fetch(worker) for worker in range(len(socket_paths))))
+        return metrics_response(metrics.render_merged(part for part in parts if part is not None))
+
+    app.router.add_get(path, handle_metrics)
+
+
+async def serve_worker(app: web.Application, sock: socket.socket, ssl_context, unix_path: str, shutdown_timeout: float = 10.0):
+    """Обслуживает приложение на общем сокете и на собственном unix-сокете до SIGTERM или SIGINT."""
+    runner = web.AppRunner(app, handle_signals=False, shutdown_timeout=shutdown_timeout)
+    await runner.setup()
+
+    try:
+        await web.SockSite(runner, sock, ssl_context=ssl_context).start()
+        await web.UnixSite(runner, unix_path).start()
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        # не loop.add_signal_handler: при закрытии цикла он возвращает обработчик по умолчанию,
+        # и повторный сигнал прервал бы завершение процесса
+        def on_stop_signal(*_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(stop.set)
+
+        signal.signal(signal.SIGTERM, on_stop_signal)
+        signal.signal(signal.SIGINT, on_stop_signal)
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# модули навыка импортируются из корня репозитория, как при запуске сервера
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from voicemenu import VoiceMenu
+from engine.maindb import MainDB
+from abspath import abs_path
+
+SKILL_ID = "test"
+
+@pytest.fixture(scope="session")
+def resources() -> Config:
+    """Конфигурация, голосовое меню и база трезвучий, загруженные так же, как сервером при запуске."""
+    config = Config.load_default()
+    VoiceMenu.load(abs_path(config.data.voice_menu))
+    MainDB.load()
+    return config
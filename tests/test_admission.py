@@ -0,0 +1,106 @@
+"""Ограничение нагрузки (AdmissionMiddleware): приоритет начатых сессий и предел сессий в памяти."""
+import asyncio
+import pytest
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher, admission
+from engine.alice.alice_sessions import SESSION_TTL
+from metrics import metrics
+from config import Config, AdmissionConfig
+from benchmarks.common import make_update
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+@pytest.fixture
+def skill(resources) -> Skill:
+    config = Config()
+    yield Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+    Config.publish(config)
+    admission.sweep(dispatcher.fsm.storage)
+
+def set_limits(**limits) -> AdmissionConfig:
+    config = AdmissionConfig(**limits)
+    Config.publish(Config().model_copy(update={ "admission": config }))
+    return config
+
+def shed_count(session: str) -> float:
+    return sum(metrics.admission_shed.labels(reason, session).value for reason in ("requests", "new_requests", "sessions"))
+
+def expected_burst(concurrency: int, limits: AdmissionConfig) -> tuple[int, int]:
+    """
+    Количество принятых начатых и новых сессий во всплеске: решения AdmissionMiddleware для запросов
+    в порядке поступления (начатая, новая, начатая, ...), пока ни один принятый запрос не завершился.
+    """
+    inflight = started = new = 0
+    for _ in range(concurrency):
+        if inflight < limits.max_requests:
+            inflight += 1
+            started += 1
+        if inflight < limits.max_requests and inflight < limits.max_new_requests:
+            inflight += 1
+            new += 1
+    return started, new
+
+async def feed(skill: Skill, session_id: str, message_id: int, **update) -> str:
+    result = await dispatcher.feed_webhook_update(skill, make_update(session_id, message_id, user_id=session_id, **update))
+    return result.response.text
+
+
+@pytest.mark.parametrize("concurrency", [8, 30, 61, 200])
+def test_burst(skill: Skill, concurrency: int):
+    """Новые сессии отклоняются раньше начатых, отклонённые получают заранее построенный ответ."""
+    limits = set_limits(max_requests=concurrency // 2, max_new_requests=concurrency // 4)
+    try_later = admission.reply("try_later").response.text
+    busy = admission.reply("too_slow").response.text
+
+    async def run():
+        for index in range(concurrency):
+            await feed(skill, f"started-{concurrency}-{index}", 0, new=True)
+
+        # начатые и новые сессии вперемешку, все запросы попадают в обработку одновременно
+        requests = []
+        for index in range(concurrency):
+            requests.append(feed(skill, f"started-{concurrency}-{index}", 1, payload={ "set_mode": GameMode.DEMO }))
+            requests.append(feed(skill, f"burst-{concurrency}-{index}", 0, new=True))
+        return await asyncio.gather(*requests)
+
+    shed_new, shed_started = shed_count("new"), shed_count("started")
+    results = asyncio.run(run())
+    started, new = results[0::2], results[1::2]
+
+    served_started = sum(text not in (busy, try_later) for text in started)
+    served_new = sum(text not in (busy, try_later) for text in new)
+    assert (served_started, served_new) == expected_burst(concurrency, limits)
+    assert served_new < served_started
+    assert sum(text == try_later for text in new) == concurrency - served_new
+    assert sum(text == busy for text in started) == concurrency - served_started
+    assert shed_count("new") - shed_new == concurrency - served_new
+    assert shed_count("started") - shed_started == concurrency - served_started
+    assert admission.inflight == 0
+
+
+def test_max_sessions(skill: Skill):
+    """Новые сессии сверх max_sessions отклоняются, начатые продолжаются, очистка освобождает место."""
+    max_sessions = 100
+    storage = dispatcher.fsm.storage
+    storage.storage.clear()
+    set_limits(max_sessions=max_sessions)
+    try_later = admission.reply("try_later").response.text
+
+    async def run(prefix: str, count: int) -> list[str]:
+        return [await feed(skill, f"{prefix}-{index}", 0, new=True) for index in range(count)]
+
+    admission.sweep(storage)
+    served = sum(text != try_later for text in asyncio.run(run("first", max_sessions + 50)))
+    assert served == max_sessions
+    assert admission.sessions == max_sessions
+
+    # начатая сессия продолжается и при достигнутом пределе
+    assert asyncio.run(feed(skill, "first-0", 1, payload={ "set_mode": GameMode.DEMO })) != try_later
+
+    # сессии простояли дольше SESSION_TTL: очистка освобождает место
+    for record in storage.storage.values():
+        for session_id, (engine, last_active) in list(record.data.items()):
+            record.data[session_id] = (engine, last_active - SESSION_TTL)
+    admission.sweep(storage)
+    assert admission.sessions == 0
+    assert all(text != try_later for text in asyncio.run(run("second", 10)))
@@ -0,0 +1,21 @@
+"""Холодный запуск: точки входа не импортируют то, что нужно только при сборке звуков."""
+import os
+import sys
+import subprocess
+import pytest
+from abspath import abs_path
+from benchmarks.cold_start import BUILD_TIME, EXCLUDED
+
+def imported_modules(module: str) -> set[str]:
+    """Модули, загруженные после импорта module в новом процессе интерпретатора."""
+    code = f"import sys; import {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=abs_path("."), env=os.environ,
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+@pytest.mark.parametrize("module", ["yandex_function", "main"])
+def test_excluded_imports(module: str):
+    excluded = EXCLUDED.get(module, BUILD_TIME)
+    unexpected = sorted(name for name in imported_modules(module) if name.split(".")[0] in excluded)
+    assert not unexpected, f"{module} импортирует {', '.join(unexpected)}"
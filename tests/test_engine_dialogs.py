@@ -0,0 +1,62 @@
+"""Случайные выборки сессии: диалог AliceEngine зависит только от seed сессии и номера хода."""
+import random
+from collections.abc import Iterator
+from itertools import zip_longest
+from engine.alice.alice_engine import AliceEngine
+from benchmarks.engine_dialogs import SKILL_ID, script
+from myconstants import *
+
+def dialog(engine: AliceEngine, seed: int = 1) -> Iterator[str]:
+    """Ходы сценария benchmarks.engine_dialogs; реплики пользователя выбираются генератором с seed."""
+    engine.mode = GameMode.INIT
+    for _, call in script(engine, random.Random(seed)):
+        engine.begin_turn()
+        reply = call()
+        engine.end_turn()
+        yield engine.create_response(*reply).response.text
+
+
+def test_repeatable(resources):
+    engine = AliceEngine(SKILL_ID, seed=1)
+    replies = list(dialog(engine))
+    assert engine.mode == GameMode.MENU # экзамен завершён, движок в меню
+    assert list(dialog(AliceEngine(SKILL_ID, seed=1))) == replies
+    assert list(dialog(AliceEngine(SKILL_ID, seed=2))) != replies
+
+
+def test_global_random_untouched(resources):
+    random.seed(1)
+    state = random.getstate()
+    for _ in dialog(AliceEngine(SKILL_ID, seed=1)):
+        pass
+    assert random.getstate() == state
+
+
+def test_sessions_independent(resources):
+    """Ходы другой сессии и обращения к глобальному random между ходами не меняют диалог."""
+    alone = list(dialog(AliceEngine(SKILL_ID, seed=1)))
+
+    interleaved = list[str]()
+    for reply, _ in zip_longest(dialog(AliceEngine(SKILL_ID, seed=1)), dialog(AliceEngine(SKILL_ID, seed=2), seed=2)):
+        random.random()
+        if reply is not None:
+            interleaved.append(reply)
+    assert interleaved == alone
+
+
+def test_turn_replay(resources):
+    """Ход повторяется по сохранённому состоянию сессии, без внутреннего состояния генератора."""
+    engine = AliceEngine(SKILL_ID, seed=1)
+    for turn, _ in enumerate(dialog(engine)):
+        if turn % 7 != 0:
+            continue
+
+        copy = AliceEngine(SKILL_ID)
+        copy.load_state(engine.dump_state())
+        replies = []
+        for session in (engine, copy):
+            session.begin_turn()
+            replies.append(session.get_reply())
+            session.end_turn()
+        assert replies[0] == replies[1]
+        assert copy.dump_state() == engine.dump_state()
@@ -0,0 +1,57 @@
+"""Фильтры команд по префиксам слов: CmdFilter и CmdTable."""
+import pytest
+from myfilters import CmdFilter, CmdTable
+
+@pytest.mark.parametrize("command, include, exclude, all_words, expected", [
+    ("начать экзамен", ("экзам",), None, False, True),
+    ("Начать Экзамен", ("экзам",), None, False, True),
+    ("начать экзамен", ("трен",), None, False, False),
+    ("начать экзамен", ("трен", "экзам"), None, False, True),
+    ("начать экзамен", ("нач", "экзам"), None, True, True),
+    ("начать экзамен", ("нач", "трен"), None, True, False),
+    ("не начинай экзамен", ("экзам",), ("не",), False, False),
+    ("экзамен", ("экзам",), ("не",), False, True),
+    # префикс совпадает только с началом слова
+    ("сэкзамен", ("экзам",), None, False, False),
+    # уже разбитая команда
+    (("начать", "экзамен"), ("экзам",), None, False, True),
+    # строка include и exclude разбивается на слова по пробелам
+    ("начать экзамен", "трен экзам", None, False, True),
+    ("не начинай экзамен", "экзам", "нет не", False, False),
+])
+def test_passed(command, include, exclude, all_words, expected):
+    assert CmdFilter.passed(command, include, exclude, all_words) == expected
+    assert CmdFilter(include, exclude, all_words).is_passed(command) == expected
+
+
+@pytest.mark.parametrize("include, exclude", [
+    (("экзам", ""), None),
+    ("трен  экзам", None), # два пробела подряд
+    (("экзам",), ("не", "")),
+    ("экзам", " "),
+])
+def test_empty_word_rejected(include, exclude):
+    with pytest.raises(ValueError):
+        CmdFilter(include, exclude)
+    with pytest.raises(ValueError):
+        CmdFilter.compile(include, exclude)
+    with pytest.raises(ValueError):
+        CmdTable(("action", include, exclude))
+
+
+def test_compile_cached():
+    assert CmdFilter.compile(("экзам",)) is CmdFilter.compile(("экзам",))
+
+
+def test_table_first_match():
+    table = CmdTable(
+        ("exam", ("экзам",), ("не",)),
+        ("train", ("трен", "упраж")),
+        ("both", ("экзам", "трен"), None, True),
+    )
+    assert table.select("начать экзамен") == "exam"
+    assert table.select("тренировка и экзамен") == "exam" # первый подходящий
+    assert table.select("не экзамен, а тренировка") == "train"
+    assert table.select("упражнения") == "train"
+    assert table.select("помощь", default="default") == "default"
+    assert table.select("", default="default") == "default"
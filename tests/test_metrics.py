@@ -0,0 +1,110 @@
+"""Метрики: текстовый формат выгрузки, выгрузка нескольких процессов и ряды сессий."""
+import re
+import random
+import asyncio
+import pytest
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from metrics import metrics
+from benchmarks.common import make_update
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? (\+Inf|-?[0-9.e+-]+)$')
+
+@pytest.fixture
+def skill(resources) -> Skill:
+    return Skill(skill_id=SKILL_ID, oauth_token=resources.skill.oauth_token)
+
+def total(text: str, prefix: str, label: str = "") -> int:
+    return sum(int(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix) and label in line)
+
+def sessions_in_storage() -> int:
+    return sum(len(record.data) for record in dispatcher.fsm.storage.storage.values())
+
+def play(skill: Skill, session_id: str, count: int) -> int:
+    """Проигрывает не меньше count запросов демонстрации и возвращает их количество."""
+    rnd = random.Random(1)
+    sent = 0
+
+    async def run():
+        nonlocal sent
+        async def request(update: dict):
+            nonlocal sent
+            await dispatcher.feed_webhook_update(skill, make_update(session_id, sent, user_id=session_id, **update))
+            sent += 1
+
+        await request({ "new": True })
+        while sent < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    asyncio.run(run())
+    return sent
+
+
+def test_exposition(skill: Skill):
+    before = metrics.render()
+    sent = play(skill, "metrics-exposition", 50)
+    text = metrics.render()
+
+    buckets = dict[str, list[int]]()
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            continue
+        assert SAMPLE.match(line), line
+        name, value = line.rsplit(" ", 1)
+        if "_bucket{" in name:
+            buckets.setdefault(re.sub(r',?le="[^"]*"', "", name), []).append(int(value))
+
+    # корзины гистограмм накопительные
+    for series, counts in buckets.items():
+        assert counts == sorted(counts), (series, counts)
+
+    # каждый запрос учтён один раз и в счётчике, и в гистограмме
+    for prefix in ("meldict_requests_total", "meldict_request_seconds_count"):
+        assert total(text, prefix) - total(before, prefix) == sent, prefix
+
+
+def test_render_merged(skill: Skill):
+    play(skill, "metrics-merged", 20)
+    text = metrics.render()
+    merged = metrics.render_merged(metrics.samples(f'worker="{worker}"') for worker in range(2))
+
+    # один заголовок на метрику, у каждого ряда метка worker
+    headers = [line for line in merged.splitlines() if line.startswith("# HELP ")]
+    assert len(headers) == len(set(headers)) == sum(line.startswith("# HELP ") for line in text.splitlines())
+    for line in merged.splitlines():
+        assert line.startswith("# ") or (SAMPLE.match(line) and re.search(r'[{,]worker="[01]"', line)), line
+    for worker in range(2):
+        assert total(merged, "meldict_requests_total", f'worker="{worker}"') == total(text, "meldict_requests_total")
+
+
+def test_sessions_active(skill: Skill):
+    """Ряд сессий в памяти следует за созданием и удалением сессий в get_engine, а не только за очисткой."""
+    user_id = "metrics-sessions"
+
+    async def new_session(session_id: str, message_id: int = 0):
+        await dispatcher.feed_webhook_update(skill, make_update(session_id, message_id, new=True, user_id=user_id))
+
+    async def run():
+        await new_session("metrics-sessions-0") # первый запрос процесса может запустить очистку
+        evicted = metrics.sessions_evicted.labels().value
+
+        await new_session("metrics-sessions-1")
+        assert metrics.sessions_active.labels().value == sessions_in_storage()
+
+        # повторный запрос новой сессии заменяет её движок, а не добавляет сессию
+        await new_session("metrics-sessions-1", 1)
+        assert metrics.sessions_active.labels().value == sessions_in_storage()
+
+        # неактивная сессия пользователя удаляется при создании его новой сессии
+        for record in dispatcher.fsm.storage.storage.values():
+            if "metrics-sessions-0" in record.data:
+                record.data["metrics-sessions-0"] = (record.data["metrics-sessions-0"][0], 0.0)
+        await new_session("metrics-sessions-2")
+        assert metrics.sessions_evicted.labels().value == evicted + 1
+        assert metrics.sessions_active.labels().value == sessions_in_storage()
+
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+"""Хранилище прогресса пользователей (ProgressDB): сохранение между сессиями и фоновая запись."""
+import random
+import sqlite3
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from engine.alice.alice_engine import AliceEngine
+from engine.maindb import MainDB
+from engine.progressdb import ProgressDB
+from voicemenu import VoiceMenu
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+USER_ID = "progress-user"
+LEVELS = (LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE)
+
+@pytest.fixture
+def file_name(resources, tmp_path) -> str:
+    return str(tmp_path / "progress.sqlite3")
+
+def button(**payload):
+    return SimpleNamespace(payload=payload)
+
+def play_exam(db: ProgressDB) -> AliceEngine:
+    engine = AliceEngine(SKILL_ID, seed=1)
+    engine.progress = db.get(USER_ID)
+    engine.mode = GameMode.INIT
+    engine.get_reply()
+    engine.process_button_pressed(button(set_mode=GameMode.EXAM))
+
+    rnd = random.Random(1)
+    while engine.mode == GameMode.EXAM and not engine._exam.finished:
+        engine.begin_turn()
+        engine.process_button_pressed(button(value=rnd.choice((1, 2, 3))))
+        engine.end_turn()
+    return engine
+
+def exam_score(file_name: str) -> tuple[int, int]:
+    """Проходит экзамен и записывает прогресс в базу; возвращает баллы экзамена."""
+    db = ProgressDB()
+    db.open(file_name)
+    engine = play_exam(db)
+    db.close()
+    return engine._exam.correct_score, engine._exam.incorrect_score
+
+
+def test_exam(file_name: str):
+    """История экзаменов, точность по уровням и ошибки по последовательностям совпадают с баллами экзамена."""
+    db = ProgressDB()
+    db.open(file_name)
+    engine = play_exam(db)
+    exam, progress = engine._exam, engine.progress
+    assert exam.finished
+
+    last = progress.last_exam
+    assert (last.correct, last.incorrect) == (exam.correct_score, exam.incorrect_score)
+    assert progress.accuracy(LevelId.EXAM) == (exam.correct_score, exam.incorrect_score)
+    assert sum(sum(progress.accuracy(level_id)) for level_id in LEVELS) == exam.total_score
+    assert { int(level_id): counts for level_id, counts in last.levels.items() } == \
+        { level_id: list(progress.accuracy(level_id)) for level_id in LEVELS }
+    # каждый неправильный ответ - ошибка одной последовательности
+    assert sum(progress.errors(noteseq.id) for noteseq in MainDB()) == exam.incorrect_score
+    db.close()
+
+
+def test_restart(file_name: str):
+    """Прогресс читается из базы вместе с ответом, данным до чтения."""
+    score = exam_score(file_name)
+    db = ProgressDB()
+    db.open(file_name)
+
+    progress = db.get(USER_ID)
+    assert not progress.loaded and progress.last_exam is None
+    progress.add_answer(LevelId.CADENCE, False, ("C_I",)) # ответ до чтения из базы
+    cadence = progress.accuracy(LevelId.CADENCE)
+    db.flush()
+
+    assert progress.loaded
+    assert (progress.last_exam.correct, progress.last_exam.incorrect) == score
+    assert progress.accuracy(LevelId.EXAM) == score
+    assert progress.accuracy(LevelId.CADENCE)[1] > cadence[1] # сохранённые ответы и ответ до чтения
+    with sqlite3.connect(file_name) as connection:
+        saved = connection.execute("SELECT correct, incorrect FROM levels WHERE user_id = ? AND level_id = ?",
+                                   (USER_ID, LevelId.CADENCE)).fetchone()
+    assert progress.accuracy(LevelId.CADENCE) == saved
+    db.close()
+
+
+def test_returning_user(file_name: str):
+    """Вернувшийся пользователь получает результат прошлого экзамена, пройденные уровни начинаются без вступления."""
+    score = exam_score(file_name)
+    db = ProgressDB()
+    db.open(file_name)
+    db.get(USER_ID)
+    db.flush() # прогресс прочитан из базы
+
+    def first_reply(user_id: str) -> tuple[AliceEngine, str]:
+        engine = AliceEngine(SKILL_ID, seed=2)
+        engine.progress = db.get(user_id)
+        engine.mode = GameMode.TRAIN_MENU
+        text, _ = engine.process_button_pressed(button(set_level=LevelId.PRIMA_LOCATION))
+        return engine, text
+
+    engine, returning = first_reply(USER_ID)
+    _, new = first_reply("new-user")
+    introduction = VoiceMenu().levels.prima_location.greetings.first_run.text.splitlines()[0]
+    assert introduction in new and introduction not in returning
+
+    engine.process_back_action()
+    engine.process_back_action()
+    text, _ = engine.get_stats_reply()
+    assert text != VoiceMenu().root.no_score[0].text and str(score[0]) in text
+    db.close()
+
+
+def test_background(file_name: str):
+    """Новый пользователь читается сразу, а изменения записываются не раньше чем через flush_interval."""
+    db = ProgressDB()
+    db.open(file_name)
+    interval = 0.3
+
+    async def run():
+        task = asyncio.create_task(db.run(interval))
+        await asyncio.sleep(0) # задача запущена и ждёт
+        start = time.monotonic()
+        progress = db.get("background-user")
+        progress.add_answer(LevelId.DEMO, True)
+        while not progress.loaded:
+            await asyncio.sleep(0.005)
+        loaded = time.monotonic() - start
+        assert db.pending == 1 # прочитан, но ещё не записан
+
+        while db.pending > 0:
+            await asyncio.sleep(0.005)
+        written = time.monotonic() - start
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return loaded, written
+
+    loaded, written = asyncio.run(run())
+    assert loaded < interval <= written + 0.05
+    db.close()
+
+
+def test_batch_write(file_name: str):
+    """Пачка изменений записывается целиком: в базе столько же ответов, сколько в памяти."""
+    users, answers = 50, 5
+    db = ProgressDB()
+    db.open(file_name, max_users=users)
+    progresses = [db.get(f"user-{index}") for index in range(users)]
+    db.flush()
+
+    rnd = random.Random(1)
+    noteseq_ids = [noteseq.id for noteseq in MainDB()]
+    for _ in range(2):
+        for progress in progresses:
+            for _ in range(answers):
+                progress.add_answer(rnd.choice(LEVELS), rnd.random() < 0.7, (rnd.choice(noteseq_ids),))
+        assert db.flush() == users * answers
+
+    with sqlite3.connect(file_name) as connection:
+        saved = connection.execute("SELECT sum(correct + incorrect) FROM levels").fetchone()[0]
+    assert saved == sum(sum(progress.accuracy(level_id)) for progress in progresses for level_id in LEVELS)
+    db.close()
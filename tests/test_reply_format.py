@@ -0,0 +1,125 @@
+"""Правила склейки фрагментов ответа: format_text и format_tts."""
+import random
+import pytest
+from types import SimpleNamespace
+from engine.alice.alice_engine import AliceEngine
+from engine.maindb import MainDB
+from engine.musicnotesequence import MusicNoteSequence
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+HAMSTER = "<speaker effect=\"hamster\">"
+
+class TagEngine(AliceEngine):
+    """Движок с коротким тегом звука вместо облачного."""
+    def get_audio_tag(self, nsf: str | MusicNoteSequence) -> str:
+        return f"<{nsf.file_name if isinstance(nsf, MusicNoteSequence) else nsf}>"
+
+
+@pytest.fixture(scope="module")
+def engine(resources) -> TagEngine:
+    return TagEngine(SKILL_ID, seed=1)
+
+@pytest.fixture(scope="module")
+def seq(resources) -> MusicNoteSequence:
+    return next(iter(MainDB()))
+
+
+@pytest.mark.parametrize("args, sep, expected", [
+    # пустые фрагменты
+    ((), " ", ""),
+    ((None,), " ", ""),
+    ((None, "", "a"), " ", "a"),
+    (("a", None, "", "b"), " ", "a b"),
+    # разделитель только перед буквой или цифрой
+    (("a", "b"), " ", "a b"),
+    (("Привет", "!", "мир"), " ", "Привет! мир"),
+    (("a", " пробел"), " ", "a пробел"),
+    (("Ответ", 7), " ", "Ответ 7"),
+    (("a", "b"), "", "ab"),
+    (("a", "b"), "\n", "a\nb"),
+    # после перевода строки разделитель не ставится
+    (("строка\n", "b"), " ", "строка\nb"),
+    (("строка\n", "b"), ".", "строка\nb"),
+    # вложенная коллекция склеивается через пробел и считается одним фрагментом
+    ((("a", "b"), "c"), "\n", "a b\nc"),
+    ((["a", "b"], ["c"]), "\n", "a b\nc"),
+    (("x", ["a", None, "b"]), ".", "x.a b"),
+    ((("a", ("b", ("c",))), "d"), ",", "a b c,d"),
+    (("x", ["!", "a"]), " ", "x! a"),
+    (("x\n", ["a"]), " ", "x\na"),
+    ((["a\n"], "b"), " ", "a\nb"),
+    # пустая вложенная коллекция пропускается
+    (("x", [], "y"), " ", "x y"),
+    (("x", [None, ""], "y"), " ", "x y"),
+    (([], "y"), " ", "y"),
+])
+def test_format_text(engine: TagEngine, args: tuple, sep: str, expected: str):
+    assert engine.format_text(*args, sep=sep) == expected
+
+
+def test_format_text_generator(engine: TagEngine):
+    assert engine.format_text("a", (value for value in ("b", "c"))) == "a b c"
+
+
+@pytest.mark.parametrize("args, sep, expected", [
+    ((), " ", ""),
+    ((None, "Текст"), "", "Текст"),
+    ((HAMSTER, "Текст"), "", HAMSTER + "Текст"),
+    # перед тегом разделитель не ставится, после тега - ставится
+    (("Слушай", "{seq}", "ответ"), " ", "Слушай<{seq}> ответ"),
+    (("{seq}", "a"), " ", "<{seq}> a"),
+    (("a", "{seq}", "{seq}", "b"), ".", "a<{seq}><{seq}>.b"),
+    # тег не меняет признак перевода строки
+    (("a\n", "{seq}", "b"), " ", "a\n<{seq}>b"),
+    # вложенная коллекция, заканчивающаяся тегом, не отделяется разделителем и не меняет признак перевода строки
+    (("a", ["{seq}"]), " ", "a<{seq}>"),
+    (("a", ["{seq}"], "b"), ".", "a<{seq}>.b"),
+    (("a", ["b", "{seq}"], "c"), ".", "ab<{seq}>.c"),
+    ((["x\n", "{seq}"], "y"), " ", "x\n<{seq}> y"),
+    (("a", ["b", "c"]), ".", "a.b c"),
+])
+def test_format_tts(engine: TagEngine, seq: MusicNoteSequence, args: tuple, sep: str, expected: str):
+    def resolve(value):
+        if value == "{seq}":
+            return seq
+        return [resolve(item) for item in value] if isinstance(value, list) else value
+
+    expected = expected.replace("{seq}", seq.file_name)
+    assert engine.format_tts(*(resolve(value) for value in args), sep=sep) == expected
+
+
+def test_exam_complete_fragments(engine: TagEngine, seq: MusicNoteSequence):
+    """Ответ завершения экзамена: ответ уровня, завершение, статистика и меню (AliceEngine.process_user_reply)."""
+    answer = engine.format_text(["Правильно!"], sep="\n")
+    stats = engine.format_text("Всего отвечено на 9 вопросов правильно.", "Пропущенная нота: 3 из 3.", sep="\n")
+    text = engine.format_text(answer, "Экзамен завершён.", stats, "Выбери режим.", sep="\n")
+    assert text == "Правильно!\nЭкзамен завершён.\nВсего отвечено на 9 вопросов правильно.\nПропущенная нота: 3 из 3.\nВыбери режим."
+
+    answer_tts = engine.format_tts(["Правильно!", seq], sep=".")
+    stats_tts = engine.format_text("Всего отвечено на 9 вопросов правильно.", "Пропущенная нота 3 из 3.", sep=".")
+    tts = engine.format_tts(answer_tts, "Экзамен завершён.", stats_tts, None, "Выбери режим.", sep=".")
+    assert tts == (f"Правильно!<{seq.file_name}>.Экзамен завершён..Всего отвечено на 9 вопросов правильно.."
+                   f"Пропущенная нота 3 из 3..Выбери режим.")
+    assert engine.format_tts(HAMSTER, tts, sep="") == HAMSTER + tts
+
+
+def test_exam_complete_reply(resources):
+    """Ответ, завершающий экзамен: фрагменты разделены переводом строки, пустых строк нет."""
+    engine = TagEngine(SKILL_ID, seed=7)
+    rnd = random.Random(7)
+    engine.mode = GameMode.INIT
+    engine.get_reply()
+    engine.begin_turn()
+    engine.process_button_pressed(SimpleNamespace(payload={ "set_mode": GameMode.EXAM }))
+    engine.end_turn()
+
+    while engine.mode == GameMode.EXAM:
+        engine.begin_turn()
+        text, tts = engine.process_button_pressed(SimpleNamespace(payload={ "value": rnd.randint(1, 3) }))
+        engine.end_turn()
+
+    lines = text.split("\n")
+    assert all(line and line == line.strip() for line in lines), text
+    assert any(line.startswith("Всего отвечено на ") for line in lines), text
+    assert tts and tts == tts.strip() and not tts.startswith("."), tts
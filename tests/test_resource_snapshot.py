@@ -0,0 +1,82 @@
+"""Реестр поколений ресурсов: запрос видит одно поколение, даже если ресурсы перезагружаются."""
+import random
+import asyncio
+import pytest
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_snapshot import SnapshotMiddleware
+from engine.maindb import MainDB
+from resources import registry
+from config import Config
+from voicemenu import VoiceMenu
+from benchmarks.common import make_update
+from benchmarks.resource_snapshot import Reloader
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+CONCURRENCY = 20
+
+@pytest.fixture
+def reloads(resources):
+    """После проверки публикуются исходные экземпляры: копии, которые публиковал Reloader, им равны."""
+    config, vm, main_db = Config(), VoiceMenu(), MainDB()
+    yield
+    Config.publish(config)
+    VoiceMenu.publish(vm)
+    MainDB.publish(main_db)
+
+
+def test_middleware_installed():
+    assert any(isinstance(middleware, SnapshotMiddleware) for middleware in dispatcher.update.outer_middleware)
+
+
+def test_consistency(reloads):
+    """Одновременные запросы между переключениями задач читают синглтоны одного поколения."""
+    middleware = SnapshotMiddleware()
+    mixed = 0
+
+    async def handler(*_):
+        nonlocal mixed
+        seen = set()
+        for _ in range(20):
+            seen.add((id(Config()), id(VoiceMenu()), id(MainDB())))
+            await asyncio.sleep(0.001)
+        mixed += len(seen) > 1
+
+    async def run():
+        await asyncio.gather(*(middleware(handler, None, {}) for _ in range(CONCURRENCY)))
+
+    version = registry.current.version
+    with Reloader():
+        asyncio.run(run())
+
+    assert registry.current.version > version + 1
+    assert mixed == 0
+
+
+def test_replies_during_reloads(reloads):
+    """Сессии, играющие демонстрацию во время перезагрузок, получают построенные ответы."""
+    skill = Skill(skill_id=SKILL_ID, oauth_token=Config().skill.oauth_token)
+    replies = list[str]()
+
+    async def session(index: int):
+        rnd = random.Random(index)
+        session_id = f"snapshot-{index}"
+
+        async def request(message_id: int, update: dict):
+            result = await dispatcher.feed_webhook_update(skill, make_update(session_id, message_id, user_id=session_id, **update))
+            replies.append(result.response.text if result is not None else None)
+
+        await request(0, { "new": True })
+        await request(1, { "payload": { "set_mode": GameMode.DEMO } })
+        for message_id in range(2, 12):
+            await request(message_id, { "payload": { "value": rnd.randint(1, 2) } })
+
+    async def run():
+        await asyncio.gather(*(session(index) for index in range(CONCURRENCY)))
+
+    with Reloader():
+        asyncio.run(run())
+
+    assert len(replies) == CONCURRENCY * 12
+    assert all(replies)
@@ -0,0 +1,150 @@
+"""Бюджет времени ответа (ResponseBudget) и кэш повторов (ReplayCacheMiddleware)."""
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from aliceio import Skill
+from aliceio.types import Update
+from config import Config, ResponseConfig
+from engine.alice.alice_handlers import dispatcher, response_budget, replay_cache
+from engine.alice.alice_budget import ResponseBudget
+from engine.alice.alice_engine import AliceEngine
+from metrics import metrics
+from benchmarks.common import make_update
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+BUDGET = 0.05
+
+class SlowStorage:
+    """Задержка update_data хранилища сессий: ожидание внутри обработчика, до изменения движка."""
+    def __init__(self, storage, monkeypatch: pytest.MonkeyPatch):
+        self.__update_data = storage.update_data
+        self.delay = 0.0
+        monkeypatch.setattr(storage, "update_data", self.update_data)
+
+    async def update_data(self, *args, **kwargs):
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        return await self.__update_data(*args, **kwargs)
+
+
+@pytest.fixture
+def skill(resources) -> Skill:
+    config = Config()
+    Config.publish(config.model_copy(update={ "response": ResponseConfig(time_budget=BUDGET) }))
+    yield Skill(skill_id=SKILL_ID, oauth_token=config.skill.oauth_token)
+    Config.publish(config)
+
+@pytest.fixture
+def slow(monkeypatch) -> SlowStorage:
+    return SlowStorage(dispatcher.fsm.storage, monkeypatch)
+
+def find_engine(session_id: str):
+    for record in dispatcher.fsm.storage.storage.values():
+        value = record.data.get(session_id)
+        if value is not None:
+            return value[0]
+    return None
+
+def handler_count(name: str) -> int:
+    return sum(metrics.handler_seconds.labels(name).counts)
+
+async def feed(skill: Skill, session_id: str, message_id: int, **update) -> str:
+    result = await dispatcher.feed_webhook_update(skill, make_update(session_id, message_id, user_id=session_id, **update))
+    return result.response.text
+
+async def feed_direct(skill: Skill, session_id: str, message_id: int, **update) -> str:
+    """Обработка запроса в контексте вызывающей задачи, без копии контекста feed_webhook_update."""
+    update = Update.model_validate(make_update(session_id, message_id, user_id=session_id, **update), context={ "skill": skill })
+    result = await dispatcher.feed_update(skill, update)
+    return result.response.text
+
+
+def test_fallback_not_cached(skill: Skill, slow: SlowStorage):
+    """Резервный ответ не сохраняется: повтор запроса обрабатывается заново, следующий повтор берётся из кэша."""
+    session_id = "budget-fallback"
+    fallback = response_budget.fallback.response.text
+
+    async def run():
+        await feed(skill, session_id, 0, new=True)
+        engine = find_engine(session_id)
+        mode, turn = engine.mode, engine.turn
+
+        slow.delay = BUDGET * 4
+        fallbacks = metrics.handler_fallbacks.labels("button_pressed_handler").value
+        start = time.perf_counter()
+        assert await feed(skill, session_id, 1, payload={ "set_mode": GameMode.DEMO }) == fallback
+        assert time.perf_counter() - start < BUDGET * 3
+        assert metrics.handler_fallbacks.labels("button_pressed_handler").value == fallbacks + 1
+        await asyncio.sleep(slow.delay * 2) # отменённый обработчик не дорабатывает в фоне
+        assert (engine.mode, engine.turn) == (mode, turn)
+
+        slow.delay = 0.0
+        state = engine.dump_state()
+        text = await feed(skill, session_id, 1, payload={ "set_mode": GameMode.DEMO })
+        assert text != fallback
+        assert (engine.mode, engine.turn) == (GameMode.DEMO, turn + 1)
+
+        # ход воспроизводится: тот же ответ движком, восстановленным из состояния до хода
+        copy = AliceEngine(SKILL_ID)
+        copy.load_state(state)
+        copy.begin_turn()
+        assert copy.process_button_pressed(SimpleNamespace(payload={ "set_mode": GameMode.DEMO }))[0] == text
+
+        hits = replay_cache.hits
+        assert await feed(skill, session_id, 1, payload={ "set_mode": GameMode.DEMO }) == text
+        assert engine.turn == turn + 1 and replay_cache.hits == hits + 1
+
+    asyncio.run(run())
+
+
+def test_fallback_does_not_leak(skill: Skill, slow: SlowStorage):
+    """После резервного ответа следующие запросы, поданные в том же контексте, снова сохраняются в кэше повторов."""
+    session_id = "budget-leak"
+
+    async def run():
+        await feed_direct(skill, session_id, 0, new=True)
+        slow.delay = BUDGET * 4
+        assert await feed_direct(skill, session_id, 1, payload={ "set_mode": GameMode.DEMO }) == response_budget.fallback.response.text
+        slow.delay = 0.0
+
+        engine = find_engine(session_id)
+        for message_id in (2, 3):
+            text = await feed_direct(skill, session_id, message_id, payload={ "set_mode": GameMode.DEMO })
+            turn, hits = engine.turn, replay_cache.hits
+            assert await feed_direct(skill, session_id, message_id, payload={ "set_mode": GameMode.DEMO }) == text
+            assert engine.turn == turn and replay_cache.hits == hits + 1
+
+    asyncio.run(run())
+
+
+def test_nested_handlers_counted_once(skill: Skill):
+    """Завершение в режиме игры (finish_message_handler вызывает back_message_handler) учитывается один раз."""
+    session_id = "budget-nested"
+
+    async def run():
+        await feed(skill, session_id, 0, new=True)
+        await feed(skill, session_id, 1, payload={ "set_mode": GameMode.DEMO })
+        names = ("finish_message_handler", "back_message_handler", "route_message")
+        before = { name: handler_count(name) for name in names }
+        await feed(skill, session_id, 2, command="хватит", intents={ "finish": { "slots": {} } })
+        return { name: handler_count(name) - before[name] for name in names }
+
+    assert asyncio.run(run()) == { "finish_message_handler": 1, "back_message_handler": 0, "route_message": 0 }
+
+
+def test_overrun_counted():
+    """Ответ, построенный без точки ожидания позже бюджета, отправляется и учитывается как превышение."""
+    budget = ResponseBudget(BUDGET)
+
+    @budget
+    async def blocking_handler():
+        time.sleep(BUDGET * 2)
+        return "ответ"
+
+    overruns = metrics.handler_overruns.labels("blocking_handler").value
+    assert asyncio.run(blocking_handler()) == "ответ"
+    assert metrics.handler_overruns.labels("blocking_handler").value == overruns + 1
+    assert metrics.handler_fallbacks.labels("blocking_handler").value == 0
+    assert handler_count("blocking_handler") == 1
@@ -0,0 +1,105 @@
+"""FastResponse (response.fast_json): тело ответа совпадает с тем, что aliceio строит из AliceResponse."""
+import json
+import random
+import pytest
+from aliceio import Skill
+from aliceio.types import AliceResponse, Response, TextButton
+from engine.alice.alice_engine import AliceEngine
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_response import FastResponse, FastAiohttpRequestHandler, FastYandexFunctionsRequestHandler
+from engine.buttonsets import FrozenTextButton
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+FROZEN = FrozenTextButton(title="Кнопка \"1\"", payload={ "value": 1 })
+NESTED = FrozenTextButton(title="Вложенный payload", payload={ "a": { "b": [1, 2.5, None, True] }, "c": "ё" })
+PLAIN = TextButton(title="Обычная", payload={ "set_mode": 1 })
+URL = TextButton(title="Ссылка", url="https://example.com/?a=1&b=\"2\"", hide=False)
+
+@pytest.fixture(scope="module")
+def skill(resources) -> Skill:
+    return Skill(skill_id=SKILL_ID, oauth_token=resources.skill.oauth_token)
+
+def model_response(text: str, tts: str, buttons: tuple, end_session: bool) -> AliceResponse:
+    return AliceResponse(response=Response(text=text, tts=tts, end_session=end_session,
+                                           buttons=list(buttons) if buttons is not None else None))
+
+def assert_same(skill: Skill, text: str, tts: str, buttons: tuple, end_session: bool):
+    fast = FastResponse(text, tts, buttons, end_session)
+    model = model_response(text, tts, buttons, end_session)
+
+    aiohttp_handler = FastAiohttpRequestHandler(dispatcher=dispatcher, skill=skill)
+    fast_body = aiohttp_handler._build_json_response(fast)
+    model_body = aiohttp_handler._build_json_response(model)
+    assert fast_body._value == model_body._value # побайтно
+    assert (fast_body.content_type, fast_body.encoding) == (model_body.content_type, model_body.encoding)
+
+    function_handler = FastYandexFunctionsRequestHandler(dispatcher, skill)
+    fast_dict = function_handler._build_response(fast)
+    model_dict = function_handler._build_response(model)
+    assert fast_dict == model_dict
+    assert json.dumps(fast_dict) == json.dumps(model_dict)
+
+
+@pytest.mark.parametrize("text, tts, buttons, end_session", [
+    ("Привет", "Привет", (FROZEN,), False),
+    # экранирование и не-ASCII
+    ("Кавычки \" и \\ слэш /", "<speaker audio=\"dialogs-upload/x/y.opus\">", (FROZEN,), False),
+    ("Управляющие \n\t\r\x00\x1f символы", "ёЁ 😀 ♪ # <>&", (NESTED,), False),
+    ("", "", (), False),
+    # без TTS
+    ("Текст без TTS", None, (FROZEN,), False),
+    # без кнопок и с пустым списком кнопок
+    ("Без кнопок", "без кнопок", None, False),
+    ("Пустые кнопки", "пустые кнопки", (), False),
+    # обычные кнопки aliceio, не FrozenTextButton
+    ("Обычная кнопка", "обычная кнопка", (PLAIN,), False),
+    ("Ссылка", "ссылка", (URL, TextButton(title="Пустая")), False),
+    ("Смешанные", "смешанные", (FROZEN, PLAIN, NESTED, URL), False),
+    # завершение сессии
+    ("До свидания", "до свидания", None, True),
+    ("До свидания", None, (FROZEN,), True),
+])
+def test_fast_response_matches_model(skill: Skill, text: str, tts: str, buttons: tuple, end_session: bool):
+    assert_same(skill, text, tts, buttons, end_session)
+
+
+def test_to_model(skill: Skill):
+    fast = FastResponse("Текст", "тест", (FROZEN, PLAIN), True)
+    assert fast.to_model() == model_response("Текст", "тест", (FROZEN, PLAIN), True)
+
+
+def test_dialog_replies(skill: Skill):
+    """Все ответы сценария диалога: меню, помощь, демонстрация, экзамен и тренировка с хомяком."""
+    rnd = random.Random(0)
+    engine = AliceEngine(SKILL_ID, seed=1)
+    engine.mode = GameMode.INIT
+    count = 0
+
+    def check(reply: tuple[str, str]):
+        nonlocal count
+        text, tts = reply
+        assert_same(skill, text, engine.format_tts(engine.get_hamster_tag(), tts, sep=""), tuple(engine.get_buttons()), False)
+        count += 1
+
+    def press(**payload):
+        engine.begin_turn()
+        check(engine.process_button_pressed(TextButton(title="", payload=payload)))
+        engine.end_turn()
+
+    check(engine.get_reply())
+    press(help=True)
+    for mode in (GameMode.DEMO, GameMode.EXAM):
+        press(set_mode=mode)
+        while engine.mode == mode:
+            press(value=rnd.randint(0, 3))
+
+    engine.hamster = True
+    press(set_mode=GameMode.TRAIN_MENU)
+    for level_id in (LevelId.MISSED_NOTE, LevelId.PRIMA_LOCATION, LevelId.CADENCE):
+        press(set_level=level_id)
+        for _ in range(3):
+            press(value=rnd.randint(0, 3))
+        check(engine.process_back_action())
+
+    assert count > 10
@@ -0,0 +1,84 @@
+"""Сохранение и восстановление таблицы сессий при перезапуске сервера."""
+import os
+import time
+import random
+import asyncio
+from aiohttp import web
+from aliceio.fsm.storage.base import StorageKey
+from aliceio.fsm.storage.memory import MemoryStorage
+from engine.alice.alice_engine import AliceEngine
+from engine.alice.alice_sessions import SESSION_TTL, dump_sessions, restore_sessions, session_files, \
+    worker_session_file, install_session_persistence
+from benchmarks.session_persistence import SKILL_ID, button, create_session, create_storage
+from myconstants import *
+
+def test_round_trip(resources, tmp_path):
+    """
+    Простаивающие дольше SESSION_TTL сессии отброшены, остальные восстановлены с тем же временем
+    последней активности и состоянием движка и продолжают диалог так же, как исходные: случайные
+    выборки хода зависят только от сохранённых seed сессии и номера хода.
+    """
+    storage, alive = create_storage(400)
+    file_name = str(tmp_path / "sessions.json")
+    restored_storage = MemoryStorage()
+    assert dump_sessions(storage, file_name) == restore_sessions(restored_storage, file_name) == alive
+
+    pairs = dict[int, tuple[AliceEngine, AliceEngine]]()
+    for key, record in storage.storage.items():
+        for session_id, (engine, last_active) in record.data.items():
+            copy = restored_storage.storage[key].data.get(session_id)
+            if time.time() - last_active >= SESSION_TTL:
+                assert copy is None, session_id
+                continue
+
+            assert copy is not None and copy[1] == last_active, session_id
+            assert copy[0].dump_state() == engine.dump_state(), session_id
+            pairs.setdefault(id(engine), (engine, copy[0]))
+
+    assert len(pairs) > 0
+    for engine, copy in pairs.values():
+        replies = []
+        for session in (engine, copy):
+            session.begin_turn()
+            replies.append(session.process_button_pressed(button(value=1)))
+            session.end_turn()
+        assert replies[0] == replies[1]
+        assert copy.dump_state() == engine.dump_state()
+
+
+def test_stale_file(resources, tmp_path):
+    """Сессия из более старого файла рабочего процесса не заменяет ту же сессию из нового."""
+    file_name = str(tmp_path / "sessions.json")
+    stale_file = worker_session_file(file_name, 1)
+    key = StorageKey(skill_id=SKILL_ID, user_id="user", session_id=None, application_id="app")
+    engine = create_session(random.Random(2))
+    now = time.time()
+
+    storage = MemoryStorage()
+    storage.storage[key].data["session"] = (engine, now - 120)
+    dump_sessions(storage, stale_file)
+    stale_state = engine.dump_state()
+
+    engine.begin_turn()
+    engine.process_button_pressed(button(set_mode=GameMode.DEMO))
+    engine.end_turn()
+    storage.storage[key].data["session"] = (engine, now - 60)
+    dump_sessions(storage, file_name)
+    os.utime(stale_file, (now - 60, now - 60))
+    assert engine.dump_state() != stale_state
+
+    # в каком бы порядке ни читались файлы
+    assert session_files(file_name) == [file_name, stale_file]
+    for names in ([file_name, stale_file], [stale_file, file_name]):
+        restored_storage = MemoryStorage()
+        assert sum(restore_sessions(restored_storage, name) for name in names) == 1
+        copy, last_active = restored_storage.storage[key].data["session"]
+        assert last_active == now - 60 and copy.dump_state() == engine.dump_state(), names
+
+    # запуск в одном процессе: чужой файл прочитан и удалён, собственный остаётся до сохранения
+    app = web.Application()
+    restored_storage = MemoryStorage()
+    install_session_persistence(app, restored_storage, file_name)
+    asyncio.run(app.on_startup[-1](app))
+    assert restored_storage.storage[key].data["session"][0].dump_state() == engine.dump_state()
+    assert session_files(file_name) == [file_name]
@@ -0,0 +1,65 @@
+"""Закрепление сессий за рабочими процессами: install_session_router."""
+import json
+import shutil
+import asyncio
+import tempfile
+from aiohttp import web, ClientSession
+from aiohttp.test_utils import TestServer
+from supervisor import install_session_router, session_owner, worker_socket_path
+
+WORKERS = 2
+
+def session_of(worker: int) -> str:
+    return next(session_id for session_id in (f"session-{i}" for i in range(100))
+                if session_owner(session_id, WORKERS) == worker)
+
+
+def worker_app(index: int, socket_paths: list[str], handled: list[tuple[int, str]]) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        session_id = (await request.json())["session"]["session_id"]
+        handled.append((index, session_id))
+        return web.json_response({ "worker": index })
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    install_session_router(app, index, socket_paths, lambda _: web.json_response({ "worker": None }))
+    return app
+
+
+async def post(server: TestServer, session_id: str) -> dict:
+    async with ClientSession() as client:
+        async with client.post(server.make_url("/"), data=json.dumps({ "session": { "session_id": session_id } }),
+                               headers={ "Content-Type": "application/json" }) as response:
+            assert response.status == 200
+            return await response.json()
+
+
+def test_session_router():
+    async def run():
+        folder = tempfile.mkdtemp(prefix="meldict-test-")
+        socket_paths = [worker_socket_path(folder, index) for index in range(WORKERS)]
+        handled = list[tuple[int, str]]()
+
+        front = TestServer(worker_app(0, socket_paths, handled))
+        await front.start_server()
+
+        owner = web.AppRunner(worker_app(1, socket_paths, handled))
+        await owner.setup()
+        site = web.UnixSite(owner, socket_paths[1])
+        try:
+            # своя сессия обрабатывается на месте
+            assert await post(front, session_of(0)) == { "worker": 0 }
+            # владелец ещё не слушает сокет: запрос не обрабатывается чужим процессом
+            assert await post(front, session_of(1)) == { "worker": None }
+            assert handled == [(0, session_of(0))]
+
+            await site.start()
+            # чужая сессия пересылается владельцу
+            assert await post(front, session_of(1)) == { "worker": 1 }
+            assert handled == [(0, session_of(0)), (1, session_of(1))]
+        finally:
+            await owner.cleanup()
+            await front.close()
+            shutil.rmtree(folder, ignore_errors=True)
+
+    asyncio.run(run())
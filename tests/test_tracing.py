@@ -0,0 +1,81 @@
+"""Трассировка запросов: порядок промежуточных обработчиков и файл трасс."""
+import json
+import random
+import asyncio
+import pytest
+from aliceio import Skill
+from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_tracing import install_tracing, TracingMiddleware, TRACED
+from tracing import Tracer
+from config import Config, TracingConfig
+from benchmarks.common import make_update
+from myconstants import *
+from tests.conftest import SKILL_ID
+
+@pytest.fixture
+def tracer(resources, tmp_path, monkeypatch) -> Tracer:
+    """Трассировка всех запросов во временный файл; обёртки этапов и промежуточные обработчики восстанавливаются."""
+    for owner, attr in TRACED:
+        monkeypatch.setattr(owner, attr, getattr(owner, attr))
+    middlewares = list(dispatcher.update.outer_middleware)
+    config = Config()
+    Config.publish(config.model_copy(update={ "tracing": TracingConfig(enabled=True, sample_rate=1.0,
+                                                                        file=str(tmp_path / "trace.json")) }))
+    tracer = install_tracing(dispatcher)
+    yield tracer
+
+    tracer.close()
+    Config.publish(config)
+    for middleware in list(dispatcher.update.outer_middleware):
+        dispatcher.update.outer_middleware.unregister(middleware)
+    for middleware in middlewares:
+        dispatcher.update.outer_middleware(middleware)
+
+def play(skill: Skill, session_id: str, count: int) -> int:
+    """Проигрывает не меньше count запросов демонстрации и возвращает их количество."""
+    rnd = random.Random(1)
+    sent = 0
+
+    async def run():
+        nonlocal sent
+        async def request(update: dict):
+            nonlocal sent
+            await dispatcher.feed_webhook_update(skill, make_update(session_id, sent, user_id=session_id, **update))
+            sent += 1
+
+        await request({ "new": True })
+        while sent < count:
+            await request({ "payload": { "set_mode": GameMode.DEMO } })
+            for _ in range(10):
+                await request({ "payload": { "value": rnd.randint(1, 2) } })
+
+    asyncio.run(run())
+    return sent
+
+
+def test_install_tracing(tracer: Tracer):
+    # интервал запроса включает все остальные промежуточные обработчики
+    assert isinstance(dispatcher.update.outer_middleware[0], TracingMiddleware)
+    assert all(getattr(getattr(owner, attr), "__traced__", False) for owner, attr in TRACED)
+
+
+def test_trace_file(tracer: Tracer):
+    requests = play(Skill(skill_id=SKILL_ID, oauth_token=Config().skill.oauth_token), "tracing", 30)
+    tracer.close() # дожидается записи очереди
+
+    with open(tracer.file, "r", encoding=UTF8) as file:
+        content = file.read()
+
+    # файл - JSON-массив событий Chrome trace-event без закрывающей скобки
+    assert content.startswith("[\n")
+    events = json.loads(content.rstrip().rstrip(",") + "]")
+    assert all(event["ph"] == "X" and event["dur"] >= 1 for event in events)
+
+    # каждый запрос - отдельный поток, интервалы этапов вложены в интервал запроса
+    roots = { event["tid"]: event for event in events if event["name"] == "request" }
+    assert len(roots) == requests
+    for event in events:
+        root = roots[event["tid"]]
+        # округление до микросекунд может сдвинуть границу на 1 мкс
+        assert root["ts"] - 1 <= event["ts"] and event["ts"] + event["dur"] <= root["ts"] + root["dur"] + 1, (event, root)
+    assert { "get_engine", "AliceEngine.create_response" } <= { event["name"] for event in events }
@@ -0,0 +1,66 @@
+"""Отрисовка шаблонов голосового меню: Template и Format."""
+import itertools
+import pytest
+from voicemenu import Template, Format, FormatButton, TextTTS
+
+def counter():
+    """Вызываемый аргумент, возвращающий при каждом вызове новое значение."""
+    calls = itertools.count(1)
+    return lambda tts: f"{'tts' if tts else 'text'}{next(calls)}"
+
+
+@pytest.mark.parametrize("source, kwargs, expected", [
+    ("", {"a": 1}, ""),
+    ("без полей", {"a": 1}, "без полей"),
+    ("{a}", {}, "{a}"),
+    ("{a} и {b}", {"a": 1, "b": "два"}, "1 и два"),
+    ("{a!u} {a!l} {a!c}", {"a": "сЛоВо"}, "СЛОВО слово Слово"),
+    ("{a:>3}|{b:.1f}", {"a": 7, "b": 0.25}, "  7|0.2"),
+    ("{{a}} {a}", {"a": 1}, "{a} 1"),
+    # сложные поля отрисовываются через ExtendedFormatter
+    ("{a[0]} {a[1]!u}", {"a": ("x", "y")}, "x Y"),
+    ("{a:{w}}", {"a": 1, "w": 3}, "  1"),
+])
+def test_render(source, kwargs, expected):
+    assert Template(source).render(kwargs, lambda key, value: value) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("{a} {a}", "text1 text1"),
+    ("{a!u}-{a:>6}-{a}", "TEXT1- text1-text1"),
+    # сложное поле: шаблон отрисовывается через ExtendedFormatter
+    ("{a[0]}{a}{a}", "ttext1text1"),
+])
+def test_callable_resolved_once(text, expected):
+    fmt = Format(text=text, tts="{a}. {a}")
+    # текст и tts отрисовываются отдельно, но каждый вызывает аргумент один раз
+    assert fmt.format(a=counter()) == (expected, "tts2. tts2")
+    assert fmt.format_text(a=counter()) == expected
+    assert FormatButton(text="", button=text).btn(a=counter()) == expected
+
+
+def test_callable_resolved_once_complex():
+    calls = list[bool]()
+    value = lambda tts: calls.append(tts) or "xy"
+    assert Format(text="{a[0]}{a[1]}{a}").format_text(a=value) == "xyxy"
+    assert calls == [False]
+
+
+def test_unused_callable_not_resolved():
+    calls = list[bool]()
+    fmt = Format(text="{a}", tts="{a}")
+    assert fmt.format(a="x", b=lambda tts: calls.append(tts)) == ("x", "x")
+    assert calls == []
+
+
+def test_arguments_mapping():
+    fmt = Format(text="{level} уровень", tts="{level} уровень",
+                 arguments={"level": {"1": TextTTS(text="первый", tts="п+ервый")}})
+    assert fmt.format(level=1) == ("первый уровень", "п+ервый уровень")
+    assert fmt.format(level=TextTTS(text="т", tts="ттс")) == ("т уровень", "ттс уровень")
+
+
+def test_tts_falls_back_to_text():
+    fmt = Format(text="{a}")
+    assert fmt.format(a="x") == ("x", "x")
+    assert fmt.format_tts(a="x") == "x"
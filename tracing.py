@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import random
+import logging
+import functools
+import inspect
+import itertools
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Any
+from queuelogging import BoundedQueueHandler
+from myconstants import *
+
+class TraceFileHandler(RotatingFileHandler):
+    """
+    Файл событий в формате Chrome trace-event (JSON Array Format).
+
+    Каждая запись - события одного запроса, по событию в строке с запятой в конце. Новый файл
+    начинается с "[", а закрывающая скобка не пишется: формат это допускает, и файл можно открыть
+    в chrome://tracing или Perfetto в любой момент, в том числе после ротации.
+    """
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write("[\n")
+        return stream
+
+
+class Trace:
+    """События одного запроса. Запросы показываются отдельными потоками (tid) процесса."""
+    __slots__ = ("tid", "events")
+    __ids = itertools.count(1)
+
+    def __init__(self):
+        self.tid = next(Trace.__ids)
+        self.events = list[str]()
+
+    def add(self, name: str, start: int, end: int, args: dict[str, Any] = None):
+        """Добавляет завершённый интервал; start и end - time.perf_counter_ns()."""
+        event = { "name": name, "ph": "X", "ts": start // 1000, "dur": max((end - start) // 1000, 1),
+                  "pid": os.getpid(), "tid": self.tid }
+        if args:
+            event["args"] = args
+        self.events.append(json.dumps(event, ensure_ascii=False, default=str))
+
+
+current_trace = ContextVar[Trace]("current_trace", default=None)
+
+
+class Tracer:
+    """
+    Выборочная трассировка запросов.
+
+    Трассируется доля sample_rate запросов; интервалы внутри запроса записываются функциями,
+    обёрнутыми через instrument(). Обёртки устанавливаются только при включённой трассировке,
+    поэтому выключенная трассировка ничего не стоит. Для выборки используется собственный
+    генератор случайных чисел, чтобы не сдвигать случайные последовательности навыка.
+
+    Трассы записываются в файл потоком очереди (BoundedQueueHandler), а не потоком цикла событий.
+    Очередь не ждёт места: при переполнении трасса отбрасывается (метрика meldict_log_records_dropped),
+    а сообщение о пропуске в файл трасс не пишется, чтобы не нарушить формат.
+    """
+    def __init__(self, file_name: str, max_bytes: int, backup_count: int, queue_size: int = 10000):
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        self.__handler = TraceFileHandler(file_name, maxBytes=max_bytes, backupCount=backup_count, encoding=UTF8)
+        self.__handler.setFormatter(logging.Formatter("%(message)s"))
+        self.__queue = BoundedQueueHandler([self.__handler], queue_size, report=False)
+        self.__logger = logging.getLogger("meldict.trace")
+        self.__logger.propagate = False
+        self.__logger.setLevel(logging.INFO)
+        self.__logger.addHandler(self.__queue)
+        self.__rnd = random.Random()
+
+    @property
+    def file(self) -> str: return self.__handler.baseFilename
+
+    def sample(self, rate: float) -> Trace:
+        """Возвращает новую трассу с вероятностью rate, иначе None."""
+        return Trace() if rate > 0 and self.__rnd.random() < rate else None
+
+    def write(self, trace: Trace):
+        if trace.events:
+            self.__logger.info(",\n".join(trace.events) + ",")
+
+    def close(self):
+        """Дожидается записи трасс из очереди и закрывает файл."""
+        self.__logger.removeHandler(self.__queue)
+        self.__queue.close()
+        self.__handler.close()
+
+    @staticmethod
+    def instrument(owner: Any, attr: str, name: str = None):
+        """Заменяет функцию или метод owner.attr обёрткой, записывающей интервал name в текущую трассу."""
+        func = getattr(owner, attr)
+        if getattr(func, "__traced__", False):
+            return
+
+        name = name or getattr(func, "__qualname__", attr)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                trace = current_trace.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    trace.add(name, start, time.perf_counter_ns())
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                trace = current_trace.get()
+                if trace is None:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    trace.add(name, start, time.perf_counter_ns())
+
+        wrapper.__traced__ = True
+        setattr(owner, attr, wrapper)
@@ -1,8 +1,8 @@
 import random
 import logging
 import json
-from typing import Optional, TypeVar, Generic, ClassVar
-from pydantic import RootModel, BaseModel, Field
+from typing import Any, Optional, TypeVar, Generic, ClassVar
+from pydantic import RootModel, BaseModel, Field, PrivateAttr
 from collections.abc import Callable
 from singleton import BaseModelSingletonMeta
 from extended_formatter import ExtendedFormatter
@@ -12,20 +12,30 @@ from myconstants import *
 T = TypeVar('T')
 
 class RandomCollection(RootModel[list[T]], Generic[T]):
+    """Варианты реплики. Вариант выбирается генератором rng сессии, без него - модулем random."""
     root: list[T]
 
-    def rnd(self) -> T:
-        return random.choice(self.root) \
+    def rnd(self, rng: random.Random = None) -> T:
+        return (rng or random).choice(self.root) \
             if isinstance(self.root, list) and len(self.root) > 0 else None
 
+    def rnd_index(self, rng: random.Random = None) -> int:
+        """Возвращает индекс случайного элемента в variants(); расходует случайные числа так же, как rnd()."""
+        return (rng or random).randrange(len(self.root)) \
+            if isinstance(self.root, list) and len(self.root) > 0 else 0
+
+    def variants(self) -> list[T]:
+        """Все элементы коллекции; для пустой - пустой список."""
+        return self.root if isinstance(self.root, list) else []
+
     def __iter__(self):
         return iter(self.root)
 
     def __getitem__(self, index):
         return self.root[index] if isinstance(self.root, list) else None
 
-    def __call__(self):
-        return self.rnd()
+    def __call__(self, rng: random.Random = None):
+        return self.rnd(rng)
 
 
 class TextTTS(BaseModel):
@@ -48,35 +58,102 @@ class TextTTS(BaseModel):
         return self.text, self.tts
 
 
-class Format(TextTTS):
+class Template:
+    """
+    Шаблон строки, разобранный один раз при загрузке голосового меню.
+
+    Хранит литералы и поля с заранее найденными функциями преобразования (!c, !u, !l и т.д.),
+    поэтому при отрисовке остаётся только подставить значения и склеить готовые куски.
+    Шаблоны со сложными полями (атрибуты, индексы, вложенные спецификации) отрисовываются
+    через ExtendedFormatter.
+    """
     __formatter: ClassVar[ExtendedFormatter] = ExtendedFormatter()
-    arguments: Optional[dict[str, dict[str, TextTTS]]] = Field(default_factory=lambda: dict())
 
-    def _format(self, source: str, tts: bool, **kwargs):
-        if not isinstance(source, str) or len(source) == 0:
+    def __init__(self, source: str):
+        self.__source = source if isinstance(source, str) else ""
+        self.__pieces = list[tuple[str, str, Callable, str]]()
+        self.__compiled = True
+
+        for literal, name, spec, conversion in Template.__formatter.parse(self.__source):
+            if name is not None and (not name.isidentifier() or "{" in spec):
+                self.__compiled = False
+                break
+            self.__pieces.append((literal, name,
+                                  Template.__formatter.converter(conversion) if name is not None else None,
+                                  spec))
+
+        # шаблон без полей отрисовывается в константу
+        self.__const = "".join(piece[0] for piece in self.__pieces) \
+            if self.__compiled and all(piece[1] is None for piece in self.__pieces) else None
+
+    @property
+    def source(self) -> str: return self.__source
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return tuple(piece[1] for piece in self.__pieces if piece[1] is not None)
+
+    def render(self, kwargs: dict[str, Any], resolve: Callable[[str, Any], Any]) -> str:
+        if len(self.__source) == 0:
             return ""
+        if len(kwargs) == 0:
+            return self.__source
+        if self.__const is not None:
+            return self.__const
+        if not self.__compiled:
+            return Template.__formatter.format(self.__source,
+                                               **{ key: resolve(key, value) for key, value in kwargs.items() })
+
+        # каждое поле разрешается один раз за отрисовку: вызываемый аргумент,
+        # использованный в шаблоне несколько раз, должен дать одно и то же значение
+        resolved = dict[str, Any]()
+        parts = list[str]()
+        for literal, name, convert, spec in self.__pieces:
+            if literal:
+                parts.append(literal)
+            if name is not None:
+                if name not in resolved:
+                    resolved[name] = resolve(name, kwargs[name])
+                value = convert(resolved[name])
+                parts.append(value if isinstance(value, str) and not spec else format(value, spec))
+
+        return "".join(parts)
+
+
+class Format(TextTTS):
+    arguments: Optional[dict[str, dict[str, TextTTS]]] = Field(default_factory=lambda: dict())
+    _text_template: Template = PrivateAttr(default=None)
+    _tts_template: Template = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        super().model_post_init(__context)
+        self._text_template = Template(self.text)
+        self._tts_template = Template(self.original_tts) \
+            if isinstance(self.original_tts, str) and len(self.original_tts) > 0 else self._text_template
+
+    def _resolve(self, key: str, value: Any, tts: bool) -> Any:
+        arg = self.arguments.get(key) if self.arguments else None
 
-        for key, value in kwargs.items():
-            arg = self.arguments.get(key)
-            arg_value = None
+        if arg:
+            value = arg.get(str(value), value)
+        elif not isinstance(value, TextTTS):
+            return value(tts) if isinstance(value, Callable) else value
 
-            if arg:
-                arg_value = arg.get(str(value), value)
-            else:
-                if not isinstance(value, TextTTS):
-                    if isinstance(value, Callable):
-                        value = value(tts)
-                        kwargs[key] = value
-                    continue
-                arg_value = value
+        return value.tts if tts else value.text
 
-            kwargs[key] = arg_value.tts if tts else arg_value.text
+    def _render(self, template: Template, tts: bool, kwargs: dict[str, Any]) -> str:
+        return template.render(kwargs, lambda key, value: self._resolve(key, value, tts))
 
-        return Format.__formatter.format(source, **kwargs) if len(kwargs) > 0 else source
+    def format_text(self, **kwargs) -> str:
+        return self._render(self._text_template, False, kwargs)
+
+    def format_tts(self, **kwargs) -> str:
+        tts = self._render(self._tts_template, True, kwargs)
+        return tts if tts else self.format_text(**kwargs)
 
     def format(self, **kwargs) -> tuple[str, str]:
-        text = self._format(self.text, False, **kwargs)
-        tts = self._format(self.tts, True, **kwargs)
+        text = self._render(self._text_template, False, kwargs)
+        tts = self._render(self._tts_template, True, kwargs)
         return text, tts if tts else text
 
     def __call__(self, **kwargs) -> tuple[str, str]:
@@ -85,52 +162,56 @@ class Format(TextTTS):
 
 class FormatButton(Format):
     button: str = Field(default=None)
+    _button_template: Template = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        super().model_post_init(__context)
+        self._button_template = Template(self.button)
 
     def btn(self, **kwargs) -> str:
-        text = self._format(self.button, False, **kwargs)
-        return text
+        return self._render(self._button_template, False, kwargs)
 
 
 class TextTTSRndCollection(RandomCollection[TextTTS]):
     DEFAULT: ClassVar[TextTTS] = TextTTS(text="")
 
-    def rnd(self) -> TextTTS:
-        return random.choice(self.root) \
+    def rnd(self, rng: random.Random = None) -> TextTTS:
+        return (rng or random).choice(self.root) \
             if isinstance(self.root, list) and len(self.root) > 0 else TextTTSRndCollection.DEFAULT
 
     def __getitem__(self, index) -> TextTTS:
         return self.root[index] if isinstance(self.root, list) else TextTTSRndCollection.DEFAULT
     
-    def __call__(self) -> TextTTS:
-        return self.rnd()
+    def __call__(self, rng: random.Random = None) -> TextTTS:
+        return self.rnd(rng)
 
 
 class FormatRndCollection(RandomCollection[Format]):
     DEFAULT: ClassVar[Format] = Format(text="")
 
-    def rnd(self) -> Format:
-        return random.choice(self.root) \
+    def rnd(self, rng: random.Random = None) -> Format:
+        return (rng or random).choice(self.root) \
             if isinstance(self.root, list) and len(self.root) > 0 else FormatRndCollection.DEFAULT
 
     def __getitem__(self, index) -> Format:
         return self.root[index] if isinstance(self.root, list) else FormatRndCollection.DEFAULT
     
-    def __call__(self) -> Format:
-        return self.rnd()
+    def __call__(self, rng: random.Random = None) -> Format:
+        return self.rnd(rng)
 
 
 class FormatButtonRndCollection(RandomCollection[FormatButton]):
     DEFAULT: ClassVar[FormatButton] = FormatButton(text="")
 
-    def rnd(self) -> FormatButton:
-        return random.choice(self.root) \
+    def rnd(self, rng: random.Random = None) -> FormatButton:
+        return (rng or random).choice(self.root) \
             if isinstance(self.root, list) and len(self.root) > 0 else FormatButtonRndCollection.DEFAULT
 
     def __getitem__(self, index) -> FormatButton:
         return self.root[index] if isinstance(self.root, list) else FormatButtonRndCollection.DEFAULT
     
-    def __call__(self) -> FormatButton:
-        return self.rnd()
+    def __call__(self, rng: random.Random = None) -> FormatButton:
+        return self.rnd(rng)
 
 
 class Greetings(BaseModel):
@@ -151,10 +232,13 @@ class Replies(BaseModel):
 class RootLevel(BaseModel):
     dont_understand: TextTTSRndCollection = Field()
     something_went_wrong: TextTTSRndCollection = Field()
+    too_slow: TextTTSRndCollection = Field(default_factory=lambda: TextTTSRndCollection([TextTTS(text="Ой, я задумалась. Повтори, пожалуйста.")]))
+    try_later: TextTTSRndCollection = Field(default_factory=lambda: TextTTSRndCollection([TextTTS(text="Сейчас у меня очень много учеников. Приходи через пару минут!")]))
     byebye: TextTTSRndCollection = Field()
     hamster_on: TextTTSRndCollection = Field()
     hamster_off: TextTTSRndCollection = Field()
     no_score: TextTTSRndCollection = Field()
+    last_exam: FormatRndCollection = Field(default_factory=lambda: FormatRndCollection([Format(text="В прошлый раз на экзамене ты ответил правильно на {correct} {questions} из {total}. Выбери режим ЭКЗАМЕН в меню, чтобы пройти его снова.")]))
     level_not_scored: TextTTSRndCollection = Field()
     level_complete: TextTTSRndCollection = Field()
     exam_complete: TextTTSRndCollection = Field()
@@ -211,8 +295,9 @@ class VoiceMenu(BaseModel, metaclass=BaseModelSingletonMeta):
             with open(file_name, "r", encoding=UTF8) as file:
                 json_data = json.load(file)
 
-            instance = self(**json_data)
+            instance = self.create(**json_data)
             instance.__file = file_name
+            self.publish(instance)
             logging.info("Голосовое меню загружено")
 
             return instance
@@ -2,9 +2,12 @@ import logging
 from typing import Any
 from pythonjsonlogger import jsonlogger
 from aliceio import Skill
-from aliceio.webhook.yandex_functions import OneSkillYandexFunctionsRequestHandler, RuntimeContext
+from aliceio.webhook.yandex_functions import RuntimeContext
 from engine.alice.alice_handlers import dispatcher
+from engine.alice.alice_response import FastYandexFunctionsRequestHandler
+from engine.alice.alice_tracing import install_tracing
 from config import Config
+from queuelogging import BoundedQueueHandler, configure_log_queue
 from myconstants import *
 
 class YcLoggingFormatter(jsonlogger.JsonFormatter):
@@ -19,15 +22,19 @@ def configure_logger() -> logging.Logger:
 
     logger = logging.getLogger()
     logger.propagate = False
-    logger.addHandler(logHandler)
+    logger.addHandler(BoundedQueueHandler([logHandler]))
     logger.setLevel(logging.INFO)
     return logger
 
 configure_logger().info("*** Запуск навыка ***")
 config = Config.load_default()
+configure_log_queue(config.logging.queue_size, config.logging.block, config.logging.block_timeout)
+
+if config.tracing.enabled:
+    install_tracing(dispatcher)
 
 skill = Skill(skill_id=config.skill.id, oauth_token=config.skill.oauth_token)
-requests_handler = OneSkillYandexFunctionsRequestHandler(dispatcher, skill)
+requests_handler = FastYandexFunctionsRequestHandler(dispatcher, skill)
 
 async def handler(event: dict[str, Any], context: RuntimeContext) -> Any:
     return await requests_handler(event, context)